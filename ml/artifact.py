@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Model Artifact Format
+A versioned directory per trained model under <model_dir>/artifacts/:
+    manifest.json   feature list, scaler params, metrics, training data hash
+    *.npy           flattened forest node arrays, opened with mmap_mode='r'
+so predictor processes share one copy of the pages and load in milliseconds.
+<model_dir>/artifacts/LATEST names the current version.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+from pathlib import Path
+
+from flat_forest import FlatForest
+
+ARTIFACT_FORMAT_VERSION = 1
+ARTIFACTS_DIR = 'artifacts'
+LATEST_FILE = 'LATEST'
+MANIFEST_FILE = 'manifest.json'
+
+# FlatForest node arrays stored as <name>.npy
+ARRAY_NAMES = ('feature', 'threshold', 'children', 'value', 'roots')
+
+# Older versions kept next to LATEST (for rollback and for readers still mapping them)
+KEEP_VERSIONS = 3
+
+
+def training_data_hash(X, y):
+    """SHA-256 of the training matrix and targets"""
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def _write_atomic(path, text):
+    """Write a small file so readers see either the old or the new content"""
+    tmp_path = Path(f'{path}.tmp-{os.getpid()}')
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def save_artifact(model_dir, flat_forest, feature_names, scaler, metrics=None, data_hash=None):
+    """
+    Write a new artifact version and point LATEST at it
+    The version directory is fully written under a temporary name and renamed
+    into place, so a reader never opens a half-written artifact.
+    Returns: path of the new version directory
+    """
+    root = Path(model_dir) / ARTIFACTS_DIR
+    root.mkdir(parents=True, exist_ok=True)
+
+    version = time.strftime('%Y%m%dT%H%M%S') + (f'-{data_hash[:8]}' if data_hash else '')
+    if (root / version).exists():
+        version = f'{version}-{os.getpid()}'
+
+    tmp_dir = root / f'.tmp-{version}'
+    tmp_dir.mkdir()
+
+    arrays = {}
+    for name in ARRAY_NAMES:
+        array = np.ascontiguousarray(getattr(flat_forest, name))
+        np.save(tmp_dir / f'{name}.npy', array)
+        arrays[name] = {'dtype': str(array.dtype), 'shape': list(array.shape)}
+
+    manifest = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'version': version,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'feature_names': list(feature_names),
+        'scaler': {
+            'with_mean': bool(scaler.with_mean),
+            'with_std': bool(scaler.with_std),
+            'mean': scaler.mean_.tolist() if scaler.with_mean else None,
+            'scale': scaler.scale_.tolist() if scaler.with_std else None
+        },
+        'forest': {
+            'n_trees': flat_forest.n_trees,
+            'n_nodes': int(len(flat_forest.value)),
+            'max_depth': flat_forest.max_depth,
+            'n_features': flat_forest.n_features,
+            'thresholds': 'raw'  # Scaler already folded in
+        },
+        'arrays': arrays,
+        'metrics': metrics or {},
+        'training_data_hash': data_hash
+    }
+    with open(tmp_dir / MANIFEST_FILE, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    os.replace(tmp_dir, root / version)
+    _write_atomic(root / LATEST_FILE, version)
+
+    _prune_versions(root, keep=KEEP_VERSIONS)
+    return root / version
+
+
+def _prune_versions(root, keep):
+    """Remove all but the newest `keep` versions (never the one LATEST names)"""
+    latest = (root / LATEST_FILE).read_text().strip()
+    versions = sorted(
+        (p for p in root.iterdir() if p.is_dir() and not p.name.startswith('.')),
+        key=lambda p: p.name
+    )
+    for path in versions[:-keep]:
+        if path.name != latest:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def latest_artifact_path(model_dir):
+    """Directory of the current artifact version, or None if there is none"""
+    root = Path(model_dir) / ARTIFACTS_DIR
+    try:
+        version = (root / LATEST_FILE).read_text().strip()
+    except FileNotFoundError:
+        return None
+
+    path = root / version
+    return path if (path / MANIFEST_FILE).exists() else None
+
+
+def load_artifact(path, mmap=True):
+    """
+    Open an artifact version
+    Returns: (FlatForest backed by read-only memory maps, manifest dict)
+    """
+    path = Path(path)
+    with open(path / MANIFEST_FILE, 'r') as f:
+        manifest = json.load(f)
+
+    if manifest.get('format_version') != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format: {manifest.get('format_version')}")
+
+    mmap_mode = 'r' if mmap else None
+    arrays = {name: np.load(path / f'{name}.npy', mmap_mode=mmap_mode) for name in ARRAY_NAMES}
+
+    forest = FlatForest(
+        max_depth=manifest['forest']['max_depth'],
+        n_features=manifest['forest']['n_features'],
+        **arrays
+    )
+    return forest, manifest
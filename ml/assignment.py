@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Capacitated Assignment Engine
+Optimal student -> internship assignment over a sparse score matrix, replacing
+the greedy sort-and-fill in allocationService. Each student gets at most one
+internship, each internship at most its capacity, total score is maximized.
+
+Solvers:
+  lsa     dense linear_sum_assignment over capacity-expanded slots (small instances)
+  sparse  min_weight_full_bipartite_matching over expanded slots (exact, sparse)
+  auction capacitated auction with epsilon scaling (large instances, time budget)
+  auto    picks one of the above from the instance size and time budget
+
+Usage:
+  echo '{"nStudents": 3, "rows": [...], "cols": [...], "scores": [...], "capacities": [...]}' \\
+      | python3 ml/assignment.py
+"""
+
+import sys
+import json
+import time
+import heapq
+import argparse
+from collections import deque
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+
+METHODS = ('auto', 'lsa', 'sparse', 'auction', 'greedy')
+
+# auto: dense matrix cells / expanded sparse edges beyond which the next solver is used
+DENSE_LIMIT = 4_000_000
+SPARSE_EDGE_LIMIT = 5_000_000
+
+# auto: sparse solver seconds per (expanded edge * sqrt(students + slots)); about twice
+# what it took on random instances of 2k-20k students (0.1 s to 7.6 s), to err on the slow side
+SPARSE_SECONDS_PER_UNIT = 1e-8
+
+# Auction bid increment (total score is within n_students * eps of optimal)
+AUCTION_EPS = 1e-3
+
+
+def greedy_assignment(n_students, rows, cols, scores, capacities):
+    """Baseline: global sort by score, then fill (same as allocationService)"""
+    assignment = np.full(n_students, -1, dtype=np.int64)
+    remaining = np.array(capacities, dtype=np.int64).copy()
+
+    for p in np.argsort(-scores, kind='stable'):
+        s, j = rows[p], cols[p]
+        if assignment[s] == -1 and remaining[j] > 0:
+            assignment[s] = j
+            remaining[j] -= 1
+
+    return assignment
+
+
+def _expand_slots(capacities):
+    """One slot per open position: slot owner internship and first slot of each internship"""
+    capacities = np.maximum(np.asarray(capacities, dtype=np.int64), 0)
+    slot_owner = np.repeat(np.arange(len(capacities)), capacities)
+    first_slot = np.concatenate([[0], np.cumsum(capacities)[:-1]]) if len(capacities) else capacities
+    return slot_owner, first_slot, capacities
+
+
+def lsa_assignment(n_students, rows, cols, scores, capacities):
+    """Exact, dense: linear_sum_assignment on the students x slots score matrix"""
+    slot_owner, first_slot, capacities = _expand_slots(capacities)
+    assignment = np.full(n_students, -1, dtype=np.int64)
+    if len(slot_owner) == 0:
+        return assignment
+
+    # Per (student, internship) score broadcast to all of the internship's slots
+    dense = np.zeros((n_students, len(capacities)), dtype=np.float64)
+    dense[rows, cols] = np.maximum(scores, 0)
+    weights = dense[:, slot_owner]
+
+    row_ind, col_ind = linear_sum_assignment(weights, maximize=True)
+    chosen = weights[row_ind, col_ind] > 0
+    assignment[row_ind[chosen]] = slot_owner[col_ind[chosen]]
+    return assignment
+
+
+def sparse_assignment(n_students, rows, cols, scores, capacities):
+    """
+    Exact, sparse: full bipartite matching over expanded slots plus one
+    'unassigned' column per student, with costs C - score (C > max score)
+    """
+    slot_owner, first_slot, capacities = _expand_slots(capacities)
+    n_slots = len(slot_owner)
+    assignment = np.full(n_students, -1, dtype=np.int64)
+
+    keep = (scores > 0) & (capacities[cols] > 0)
+    rows, cols, scores = rows[keep], cols[keep], scores[keep]
+    if len(rows) == 0:
+        return assignment
+
+    # Expand every edge to each slot of its internship
+    edge_caps = capacities[cols]
+    edge_rows = np.repeat(rows, edge_caps)
+    edge_scores = np.repeat(scores, edge_caps)
+    offsets = np.arange(edge_caps.sum()) - np.repeat(np.cumsum(edge_caps) - edge_caps, edge_caps)
+    edge_cols = np.repeat(first_slot[cols], edge_caps) + offsets
+
+    big = float(scores.max()) + 1.0
+    students = np.arange(n_students)
+    graph = csr_matrix(
+        (
+            np.concatenate([big - edge_scores, np.full(n_students, big)]),
+            (np.concatenate([edge_rows, students]), np.concatenate([edge_cols, n_slots + students]))
+        ),
+        shape=(n_students, n_slots + n_students)
+    )
+
+    row_ind, col_ind = min_weight_full_bipartite_matching(graph)
+    real = col_ind < n_slots
+    assignment[row_ind[real]] = slot_owner[col_ind[real]]
+    return assignment
+
+
+def auction_assignment(n_students, rows, cols, scores, capacities, deadline=None, eps=AUCTION_EPS):
+    """
+    Capacitated forward auction (Gauss-Seidel, one bid at a time)
+    Each internship keeps a min-heap of the bids of its current holders; its
+    price is the lowest held bid once full. Students bid for their best net
+    value (score - price) and drop out when nothing beats staying unassigned.
+    The result is within n_students * eps of the optimal total score.
+    On deadline, the current (feasible, partial) assignment is topped up greedily.
+    """
+    capacities = np.maximum(np.asarray(capacities, dtype=np.int64), 0)
+    keep = scores > 0
+    rows, cols, scores = rows[keep], cols[keep], scores[keep]
+
+    # CSR by student
+    order = np.argsort(rows, kind='stable')
+    row_cols, row_scores = cols[order], scores[order]
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=n_students))])
+
+    prices = np.where(capacities > 0, 0.0, np.inf)
+    assignment = np.full(n_students, -1, dtype=np.int64)
+    holders = [[] for _ in range(len(capacities))]
+    queue = deque(s for s in range(n_students) if indptr[s + 1] > indptr[s])
+    bids = 0
+
+    while queue:
+        bids += 1
+        if deadline is not None and bids % 256 == 0 and time.perf_counter() > deadline:
+            return _fill_greedily(assignment, rows, cols, scores, capacities)
+
+        s = queue.popleft()
+        lo, hi = indptr[s], indptr[s + 1]
+        targets = row_cols[lo:hi]
+        values = row_scores[lo:hi] - prices[targets]
+
+        best = int(np.argmax(values))
+        best_value = values[best]
+        if best_value <= 0:
+            continue  # Staying unassigned is at least as good
+
+        values[best] = -np.inf
+        second_value = max(float(values.max()), 0.0) if hi - lo > 1 else 0.0
+
+        j = targets[best]
+        heapq.heappush(holders[j], (prices[j] + best_value - second_value + eps, s))
+        assignment[s] = j
+
+        if len(holders[j]) > capacities[j]:
+            _, outbid = heapq.heappop(holders[j])
+            assignment[outbid] = -1
+            queue.append(outbid)
+        if len(holders[j]) >= capacities[j]:
+            prices[j] = holders[j][0][0]
+
+    return assignment
+
+
+def _fill_greedily(assignment, rows, cols, scores, capacities):
+    """Top up a feasible partial assignment with the greedy rule"""
+    assignment = assignment.copy()
+    used = np.bincount(assignment[assignment >= 0], minlength=len(capacities))
+    remaining = capacities - used
+
+    for p in np.argsort(-scores, kind='stable'):
+        s, j = rows[p], cols[p]
+        if assignment[s] == -1 and remaining[j] > 0:
+            assignment[s] = j
+            remaining[j] -= 1
+    return assignment
+
+
+def _objective(assignment, rows, cols, scores):
+    """Total score of an assignment over the given pairs"""
+    n_internships = int(cols.max()) + 1 if len(cols) else 1
+    pair_keys = rows * n_internships + cols
+    order = np.argsort(pair_keys)
+
+    students = np.flatnonzero(assignment >= 0)
+    keys = students * n_internships + assignment[students]
+    found = np.searchsorted(pair_keys[order], keys)
+    found = np.minimum(found, len(order) - 1)
+    hit = pair_keys[order][found] == keys if len(order) else np.zeros(len(keys), dtype=bool)
+    return float(scores[order][found][hit].sum())
+
+
+def estimate_sparse_seconds(n_students, cols, capacities):
+    """Rough runtime of sparse_assignment (see SPARSE_SECONDS_PER_UNIT)"""
+    capacities = np.maximum(np.asarray(capacities, dtype=np.int64), 0)
+    edges = float(capacities[cols].sum())
+    return edges * np.sqrt(n_students + capacities.sum()) * SPARSE_SECONDS_PER_UNIT
+
+
+def choose_method(n_students, cols, capacities, time_budget=None):
+    """
+    Exact dense for small, exact sparse for medium, auction beyond
+    The exact solvers cannot be interrupted, so sparse is only picked when its
+    estimated runtime fits the time budget; otherwise the auction runs against it
+    """
+    capacities = np.maximum(np.asarray(capacities, dtype=np.int64), 0)
+    if n_students * capacities.sum() <= DENSE_LIMIT:
+        return 'lsa'
+    if capacities[cols].sum() <= SPARSE_EDGE_LIMIT and (
+            time_budget is None or estimate_sparse_seconds(n_students, cols, capacities) <= time_budget):
+        return 'sparse'
+    return 'auction'
+
+
+def solve_assignment(n_students, rows, cols, scores, capacities, method='auto', time_budget=None):
+    """
+    Solve the capacitated assignment and compare with the greedy baseline
+    rows/cols/scores: sparse score matrix (student index, internship index, score)
+    time_budget: seconds for the solver; the auction stops at it (then tops up
+    greedily), 'auto' only picks sparse when its estimated runtime fits, and an
+    explicitly requested lsa / sparse ignores it
+    Returns: dict with per-student assignment (-1 = unassigned), objective, runtime
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    scores = np.asarray(scores, dtype=np.float64)
+    capacities = np.asarray(capacities, dtype=np.int64)
+
+    if method not in METHODS:
+        raise ValueError(f"Unknown method: {method} (expected one of {', '.join(METHODS)})")
+
+    start = time.perf_counter()
+    baseline = greedy_assignment(n_students, rows, cols, scores, capacities)
+    greedy_ms = (time.perf_counter() - start) * 1000
+
+    if method == 'auto':
+        method = choose_method(n_students, cols, capacities, time_budget)
+
+    start = time.perf_counter()
+    if method == 'greedy':
+        assignment = baseline
+    elif method == 'lsa':
+        assignment = lsa_assignment(n_students, rows, cols, scores, capacities)
+    elif method == 'sparse':
+        assignment = sparse_assignment(n_students, rows, cols, scores, capacities)
+    else:
+        deadline = start + time_budget if time_budget is not None else None
+        assignment = auction_assignment(n_students, rows, cols, scores, capacities, deadline=deadline)
+    runtime_ms = (time.perf_counter() - start) * 1000
+
+    objective = _objective(assignment, rows, cols, scores)
+    greedy_objective = _objective(baseline, rows, cols, scores)
+
+    # A timed-out auction can end up below the baseline; never return worse than greedy
+    fallback = objective < greedy_objective
+    if fallback:
+        assignment, objective = baseline, greedy_objective
+
+    return {
+        'method': method,
+        'fallback_to_greedy': fallback,
+        'assignment': assignment,
+        'objective': objective,
+        'assigned': int((assignment >= 0).sum()),
+        'runtime_ms': runtime_ms,
+        'greedy': {
+            'objective': greedy_objective,
+            'assigned': int((baseline >= 0).sum()),
+            'runtime_ms': greedy_ms
+        },
+        'improvement': objective - greedy_objective
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Capacitated student-internship assignment')
+    parser.add_argument('--method', choices=METHODS, default=None,
+                        help='Solver (default: request "method", else auto)')
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help='Seconds allowed for the solver (default: request "timeBudget")')
+    return parser.parse_args(argv)
+
+
+def main():
+    """Solve an assignment request from stdin"""
+    args = parse_args()
+
+    try:
+        request = json.loads(sys.stdin.read())
+
+        rows = request.get('rows', [])
+        cols = request.get('cols', [])
+        scores = request.get('scores', [])
+        capacities = request.get('capacities', [])
+        n_students = request.get('nStudents', (max(rows) + 1) if rows else 0)
+
+        if not (len(rows) == len(cols) == len(scores)):
+            raise ValueError('rows, cols and scores must have the same length')
+
+        result = solve_assignment(
+            n_students, rows, cols, scores, capacities,
+            method=args.method or request.get('method', 'auto'),
+            time_budget=args.time_budget if args.time_budget is not None else request.get('timeBudget')
+        )
+
+        # Index of the chosen pair for each assigned student (input order)
+        pair_index = {(int(s), int(j)): p for p, (s, j) in enumerate(zip(rows, cols))}
+        assignment = result.pop('assignment')
+        selected = sorted(pair_index[(s, int(j))] for s, j in enumerate(assignment) if j >= 0)
+
+        print(json.dumps({
+            'success': True,
+            'assignment': assignment.tolist(),
+            'selected': selected,
+            **result
+        }))
+
+    except Exception as e:
+        print(json.dumps({
+            'success': False,
+            'error': str(e)
+        }))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
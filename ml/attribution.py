@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Per-pair Feature Attributions
+Explains ML scores by decomposing each pair's prediction into a baseline plus
+one contribution per feature, computed for a whole batch at once:
+
+    score = baseline + sum of contributions   (before clipping to [0, 1])
+
+- forest backends (sklearn / flat): tree-path decomposition over every tree
+  (FlatForest.contributions); sklearn models are flattened once per model load
+- distilled backend: the bin table values themselves (exact for that model)
+
+Only each pair's top_k features by absolute contribution are returned:
+
+    {"baseline": 0.41, "contributions": [{"feature": "skill_overlap_ratio", "value": 0.12}, ...]}
+"""
+
+import numpy as np
+
+# Features reported per pair when a request asks for explanations without a count
+DEFAULT_TOP_K = 3
+
+
+def top_contributions(contributions, top_k=DEFAULT_TOP_K):
+    """
+    Columns of each row's top_k contributions by absolute value, largest first
+    Returns: (n_rows, k) int64 feature indices
+    """
+    contributions = np.asarray(contributions, dtype=np.float64)
+    k = max(0, min(int(top_k), contributions.shape[1]))
+    if k == 0:
+        return np.empty((contributions.shape[0], 0), dtype=np.int64)
+
+    magnitude = np.abs(contributions)
+    if k < contributions.shape[1]:
+        top = np.argpartition(-magnitude, k - 1, axis=1)[:, :k]
+    else:
+        top = np.tile(np.arange(k, dtype=np.int64), (contributions.shape[0], 1))
+    order = np.argsort(-np.take_along_axis(magnitude, top, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1)
+
+
+def attribution_payload(baseline, contributions, feature_names, top_k=DEFAULT_TOP_K):
+    """JSON-ready explanation of every row: baseline plus its top_k {feature, value} contributions"""
+    top = top_contributions(contributions, top_k)
+    values = np.take_along_axis(np.asarray(contributions, dtype=np.float64), top, axis=1).tolist()
+    return [
+        {
+            'baseline': baseline,
+            'contributions': [
+                {'feature': feature_names[f], 'value': value}
+                for f, value in zip(columns, row_values)
+            ]
+        }
+        for columns, row_values in zip(top.tolist(), values)
+    ]
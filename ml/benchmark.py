@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+ML Pipeline Benchmark
+Synthesizes students and internships with generate_full_sample_data.py at
+several scales and measures the Python pipeline on its own: training time,
+model load time, feature preparation, predict / predict_with_confidence
+throughput (pairs/sec) per backend, and peak RSS. Results are written as JSON
+so runs can be compared; --compare flags regressions against a previous run.
+
+Usage:
+  python3 ml/benchmark.py --output bench.json
+  python3 ml/benchmark.py --scale 1000:100 --scale 50000:2000 --pairs 200000
+  python3 ml/benchmark.py --compare bench.json --tolerance 0.2
+  python3 ml/benchmark.py --backends flat --workers 2 4 8
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import numpy as np
+
+from features import build_feature_matrix
+from profiles import pair_features
+from train_model import MatchingModelTrainer
+from predict import MatchingPredictor, BACKENDS
+from profiling import peak_rss_mb
+from sharded import DEFAULT_SHARD_SIZE
+from generate_full_sample_data import generate_students, generate_internships
+
+DEFAULT_SCALES = ('1000:100', '10000:500', '50000:2000')
+
+# Metrics where larger is better; every other timing metric is lower-is-better
+THROUGHPUT_SUFFIX = '_pairs_per_sec'
+
+
+def best_time(fn, repeat):
+    """Best wall time of `repeat` calls, and the last result"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def sample_pairs(students, internships, n_pairs, rng):
+    """Random (student, internship) pairs, as the allocation loop would score them"""
+    s_idx = rng.integers(0, len(students), n_pairs)
+    i_idx = rng.integers(0, len(internships), n_pairs)
+    return [(students[s], internships[i]) for s, i in zip(s_idx, i_idx)]
+
+
+def synthetic_training_data(records, rng):
+    """
+    Feature records with a targetScore shaped like the rating-derived targets
+    (skill overlap, domain and location dominate, plus noise)
+    """
+    data = []
+    for record in records:
+        target = (
+            0.45 * record['skillOverlapRatio'] +
+            0.20 * record['domainMatch'] +
+            0.20 * record['locationMatch'] +
+            0.15 * record['gpa'] / 10 +
+            rng.normal(0, 0.05)
+        )
+        data.append({**record, 'targetScore': float(np.clip(target, 0, 1))})
+    return data
+
+
+def bench_scale(n_students, n_internships, args, rng):
+    """All pipeline measurements for one population size"""
+    result = {'students': n_students, 'internships': n_internships}
+
+    start = time.perf_counter()
+    students = generate_students(n_students)
+    internships = generate_internships(n_internships)
+    result['generate_s'] = time.perf_counter() - start
+
+    pairs = sample_pairs(students, internships, args.pairs, rng)
+    result['pairs'] = len(pairs)
+
+    # Feature preparation: raw profiles -> records -> model matrix
+    records_s, records = best_time(
+        lambda: [pair_features(student, internship) for student, internship in pairs], args.repeat
+    )
+    matrix_s, _ = best_time(lambda: build_feature_matrix(records), args.repeat)
+    result['feature_records_s'] = records_s
+    result['feature_matrix_s'] = matrix_s
+    result['feature_prep_pairs_per_sec'] = len(pairs) / (records_s + matrix_s)
+
+    # Training on a slice of the same pairs
+    train_records = records[:args.train_samples]
+    training_data = synthetic_training_data(train_records, rng)
+    model_dir = tempfile.mkdtemp(prefix='ml-bench-')
+    try:
+        trainer = MatchingModelTrainer()
+        start = time.perf_counter()
+        trainer.train(training_data)
+        result['train_s'] = time.perf_counter() - start
+        result['train_samples'] = len(training_data)
+
+        start = time.perf_counter()
+        trainer.save_model(model_dir)
+        result['save_s'] = time.perf_counter() - start
+
+        for backend in args.backends:
+            load_s, predictor = best_time(lambda: MatchingPredictor(model_dir, backend=backend), args.repeat)
+            predict_s, _ = best_time(lambda: predictor.predict(records), args.repeat)
+            confidence_s, _ = best_time(lambda: predictor.predict_with_confidence(records), args.repeat)
+
+            result[backend] = {
+                'load_s': load_s,
+                'predict_s': predict_s,
+                'predict_pairs_per_sec': len(records) / predict_s,
+                'confidence_s': confidence_s,
+                'confidence_pairs_per_sec': len(records) / confidence_s
+            }
+
+            # Sharded prediction: scaling with the worker count. Batches of at most
+            # shard_size rows are scored in-process, so the shard size is capped to
+            # give every worker a shard of this run's pairs
+            for workers in [w for w in args.workers if w > 1]:
+                shard_size = min(args.shard_size, -(-len(records) // workers))
+                if len(records) <= shard_size:
+                    result[backend][f'workers_{workers}'] = {'skipped': 'too few pairs to shard'}
+                    continue
+
+                sharded = MatchingPredictor(model_dir, backend=backend, workers=workers, shard_size=shard_size)
+                sharded.predict(records)  # starts the pool; workers load the model once
+                sharded_s, _ = best_time(lambda: sharded.predict(records), args.repeat)
+                sharded.close()
+
+                result[backend][f'workers_{workers}'] = {
+                    'shard_size': shard_size,
+                    'predict_s': sharded_s,
+                    'predict_pairs_per_sec': len(records) / sharded_s,
+                    'speedup': predict_s / sharded_s
+                }
+    finally:
+        shutil.rmtree(model_dir, ignore_errors=True)
+
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def flatten(result, prefix=''):
+    """{'a': {'b': 1}} -> {'a.b': 1} for numeric leaves"""
+    flat = {}
+    for key, value in result.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{name}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(current, baseline, tolerance):
+    """
+    Regressions of `current` vs `baseline` beyond the relative tolerance
+    Timings and RSS regress when they grow, throughputs when they shrink
+    """
+    baseline_runs = {(r['students'], r['internships']): r for r in baseline.get('results', [])}
+    regressions = []
+
+    for run in current['results']:
+        base = baseline_runs.get((run['students'], run['internships']))
+        if base is None:
+            continue
+
+        current_flat, base_flat = flatten(run), flatten(base)
+        for metric, value in current_flat.items():
+            old = base_flat.get(metric)
+            if not old or metric in ('students', 'internships', 'pairs', 'train_samples'):
+                continue
+
+            if metric.endswith(THROUGHPUT_SUFFIX):
+                change = (old - value) / old
+            elif metric.endswith('_s') or metric.endswith('_mb'):
+                change = (value - old) / old
+            else:
+                continue
+
+            if change > tolerance:
+                regressions.append({
+                    'scale': f"{run['students']}:{run['internships']}",
+                    'metric': metric,
+                    'baseline': old,
+                    'current': value,
+                    'change': change
+                })
+
+    return regressions
+
+
+def parse_scale(text):
+    students, _, internships = text.partition(':')
+    try:
+        return int(students), int(internships)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Expected STUDENTS:INTERNSHIPS, got {text!r}')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the InternMatch AI ML pipeline')
+    parser.add_argument('--scale', type=parse_scale, action='append',
+                        help=f"STUDENTS:INTERNSHIPS population, repeatable (default: {' '.join(DEFAULT_SCALES)})")
+    parser.add_argument('--pairs', type=int, default=100000,
+                        help='Sampled pairs to score per scale')
+    parser.add_argument('--train-samples', type=int, default=5000,
+                        help='Labelled pairs to train on per scale')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS),
+                        help='Prediction backends to measure')
+    parser.add_argument('--workers', type=int, nargs='+', default=[],
+                        help='Worker counts to measure sharded prediction with (each > 1)')
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE,
+                        help='Rows per worker shard in sharded prediction '
+                             '(capped at pairs / workers so every worker gets a shard)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per measurement (best time is reported)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', type=str, default=None,
+                        help='Write results JSON here (default: stdout)')
+    parser.add_argument('--compare', type=str, default=None,
+                        help='Previous results JSON to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Relative slowdown allowed before a metric counts as a regression')
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+
+    try:
+        random.seed(args.seed)
+        rng = np.random.default_rng(args.seed)
+        scales = args.scale or [parse_scale(s) for s in DEFAULT_SCALES]
+
+        report = {
+            'success': True,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'environment': {
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count()
+            },
+            'config': {
+                'pairs': args.pairs,
+                'train_samples': args.train_samples,
+                'backends': args.backends,
+                'repeat': args.repeat,
+                'seed': args.seed
+            },
+            'results': [bench_scale(s, i, args, rng) for s, i in scales]
+        }
+
+        if args.compare:
+            with open(args.compare, 'r') as f:
+                report['regressions'] = compare(report, json.load(f), args.tolerance)
+
+        output = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(output + '\n')
+        else:
+            print(output)
+
+        if report.get('regressions'):
+            sys.exit(1)
+
+    except Exception as e:
+        print(json.dumps({
+            'success': False,
+            'error': str(e)
+        }))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Candidate Generation for Batch Allocation
+Instead of scoring every student against every internship, keep an inverted
+index from skill to internship plus sector/location buckets and return only
+the top-K plausible internships per student for full ML scoring.
+
+Usage:
+  echo '{"students": [...], "internships": [...], "k": 20}' | python3 ml/candidates.py
+  python3 ml/candidates.py --data sample_data.json --k 10 20 50 --evaluate
+"""
+
+import sys
+import json
+import argparse
+import numpy as np
+
+from profiles import (
+    student_skills, student_gpa, student_domains, student_locations,
+    internship_skills, internship_sector, internship_location, internship_min_gpa
+)
+from fusion import ML_WEIGHT, RULE_WEIGHT, MATCH_CUTOFF
+
+# Plausibility weights, same proportions as the rule-based score in allocationService
+SKILL_WEIGHT = 0.45
+DOMAIN_WEIGHT = 0.20
+LOCATION_WEIGHT = 0.20
+
+
+class CandidateIndex:
+    """Inverted skill index and sector/location buckets over the open internships"""
+
+    def __init__(self, internships):
+        self.n_internships = len(internships)
+
+        skill_postings = {}
+        required_counts = np.zeros(self.n_internships, dtype=np.float64)
+        for j, internship in enumerate(internships):
+            required = internship_skills(internship)
+            required_counts[j] = len(required)
+            for name in {name for name, _ in required}:
+                skill_postings.setdefault(name, []).append(j)
+
+        self.skill_index = {name: np.array(ids, dtype=np.int64) for name, ids in skill_postings.items()}
+        self.sector_buckets = self._bucket(internship_sector(i) for i in internships)
+        self.location_buckets = self._bucket(internship_location(i) for i in internships)
+        # Remote internships match every student's location, as in profiles.pair_features
+        self.remote = np.array([internship_location(i) == 'remote' for i in internships], dtype=bool)
+
+        # Per-skill credit toward the overlap ratio (0 for internships with no requirements)
+        self.skill_credit = np.divide(
+            SKILL_WEIGHT, required_counts,
+            out=np.zeros(self.n_internships), where=required_counts > 0
+        )
+        self.min_gpa = np.array([internship_min_gpa(i) for i in internships], dtype=np.float64)
+
+    @staticmethod
+    def _bucket(keys):
+        buckets = {}
+        for j, key in enumerate(keys):
+            buckets.setdefault(key, []).append(j)
+        return {key: np.array(ids, dtype=np.int64) for key, ids in buckets.items()}
+
+    def plausibility(self, student):
+        """Cheap plausibility score of every internship for one student (-inf = ineligible)"""
+        scores = np.zeros(self.n_internships, dtype=np.float64)
+
+        for name in {name for name, _, _ in student_skills(student)}:
+            postings = self.skill_index.get(name)
+            if postings is not None:
+                scores[postings] += self.skill_credit[postings]
+
+        for domain in student_domains(student):
+            bucket = self.sector_buckets.get(domain)
+            if bucket is not None:
+                scores[bucket] += DOMAIN_WEIGHT
+
+        location_match = self.remote.copy()
+        for location in student_locations(student):
+            bucket = self.location_buckets.get(location)
+            if bucket is not None:
+                location_match[bucket] = True
+        scores[location_match] += LOCATION_WEIGHT
+
+        # Hard constraint, same as the pre-filter in runBatchAllocation
+        scores[student_gpa(student) < self.min_gpa] = -np.inf
+        return scores
+
+    def candidates_for(self, student, k):
+        """Indices of the top-K eligible internships for one student, best first"""
+        scores = self.plausibility(student)
+        eligible = np.flatnonzero(np.isfinite(scores))
+
+        if len(eligible) > k:
+            top = np.argpartition(-scores[eligible], k - 1)[:k]
+            eligible = eligible[top]
+
+        # Stable order: plausibility descending, then internship index
+        return eligible[np.lexsort((eligible, -scores[eligible]))]
+
+    def candidates(self, students, k):
+        """Top-K candidate internship indices for every student"""
+        return [self.candidates_for(student, k) for student in students]
+
+
+def exhaustive_scores(students, internships, predictor, block_pairs=65536,
+                      ml_weight=ML_WEIGHT, rule_weight=RULE_WEIGHT):
+    """
+    Hybrid score of every eligible pair (the path candidate generation replaces):
+    ML_WEIGHT * ml score + RULE_WEIGHT * rule score, which allocationService ranks
+    and cuts pairs on. ML features come from the vectorized engine and rule
+    scores from rule_scores.py, one block of students at a time
+    Returns: (n_students x n_internships) matrix, -inf where the GPA filter fails
+    """
+    from feature_tensor import PairFeatureEngine
+    from rule_scores import RuleScoreEngine
+
+    engine = PairFeatureEngine(students, internships, predictor.feature_names, predictor.current_history())
+    rules = RuleScoreEngine(students, internships)
+    scores = np.full((len(students), len(internships)), -np.inf)
+
+    for rows, cols, X in engine.iter_eligible(block_pairs):
+        scores[rows, cols] = predictor.score_matrix(X) * ml_weight + rules.pairs(rows, cols) * rule_weight
+
+    return scores
+
+
+def evaluate_recall(candidate_lists, scores, cutoff=MATCH_CUTOFF):
+    """
+    Recall of the candidate lists against exhaustive hybrid scoring
+    best_match_recall: students whose highest-scoring internship is kept
+    pair_recall: pairs whose hybrid score is above the cutoff that are kept
+    """
+    n_students = scores.shape[0]
+    kept = np.zeros(scores.shape, dtype=bool)
+    for s, ids in enumerate(candidate_lists):
+        kept[s, ids] = True
+
+    has_eligible = np.isfinite(scores).any(axis=1)
+    best = np.argmax(scores, axis=1)
+    best_kept = kept[np.arange(n_students), best][has_eligible]
+
+    above_cutoff = scores > cutoff
+    n_above = int(above_cutoff.sum())
+
+    return {
+        'students': n_students,
+        'pairs_scored': int(kept.sum()),
+        'pairs_exhaustive': int(np.isfinite(scores).sum()),
+        'best_match_recall': float(best_kept.mean()) if len(best_kept) else 1.0,
+        'pair_recall': float((kept & above_cutoff).sum() / n_above) if n_above else 1.0
+    }
+
+
+def recall_report(students, internships, k_values, model_dir='ml/models', cutoff=MATCH_CUTOFF):
+    """Recall for several K against the exhaustive hybrid-score path, to pick K safely"""
+    from predict import MatchingPredictor
+
+    predictor = MatchingPredictor(model_dir)
+    try:
+        scores = exhaustive_scores(students, internships, predictor)
+    finally:
+        predictor.close()
+    index = CandidateIndex(internships)
+
+    report = []
+    for k in k_values:
+        result = evaluate_recall(index.candidates(students, k), scores, cutoff)
+        result['k'] = k
+        report.append(result)
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Top-K candidate internships per student')
+    parser.add_argument('--data', type=str,
+                        help='JSON file with "students" and "internships" (default: request on stdin)')
+    parser.add_argument('--k', type=int, nargs='+', default=[20],
+                        help='Candidates per student (several values with --evaluate)')
+    parser.add_argument('--evaluate', action='store_true',
+                        help='Report recall against exhaustive hybrid (ML + rule) scoring instead of candidates')
+    parser.add_argument('--cutoff', type=float, default=MATCH_CUTOFF,
+                        help='Hybrid score above which a pair counts as a match for pair_recall')
+    parser.add_argument('--model-dir', type=str, default='ml/models',
+                        help='Directory containing the trained model files')
+    return parser.parse_args(argv)
+
+
+def main():
+    """Candidates for a {students, internships, k} request (stdin or --data)"""
+    args = parse_args()
+
+    try:
+        if args.data:
+            with open(args.data, 'r') as f:
+                request = json.load(f)
+        else:
+            request = json.loads(sys.stdin.read())
+
+        students = request.get('students', [])
+        internships = request.get('internships', [])
+        if not students or not internships:
+            raise ValueError('Students and internships are required')
+
+        if args.evaluate:
+            result = {
+                'success': True,
+                'recall': recall_report(students, internships, args.k, args.model_dir, args.cutoff)
+            }
+        else:
+            k = request.get('k', args.k[0])
+            index = CandidateIndex(internships)
+            result = {
+                'success': True,
+                'k': k,
+                'candidates': [ids.tolist() for ids in index.candidates(students, k)]
+            }
+
+        print(json.dumps(result))
+
+    except Exception as e:
+        print(json.dumps({
+            'success': False,
+            'error': str(e)
+        }))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Distilled Scorer
+A compact additive approximation of the forest for latency-critical single
+pair requests. Every feature is cut into at most MAX_BINS bins on its raw
+(unscaled) value and each bin holds one learned contribution, so a score is
+an intercept plus one table lookup per feature:
+
+    score(x)   = score_intercept + sum_f score_table[f][bin_f(x_f)]
+    std_dev(x) = std_intercept   + sum_f std_table[f][bin_f(x_f)]
+
+The tables are fitted by ridge least squares on the forest's own outputs
+(mean and tree std-dev), not on the labels. The result is a GAM with
+piecewise-constant shape functions, written to <model_dir>/distilled.json.
+The file is small enough for mlService.js to evaluate in-process as well.
+Fidelity against the full forest is measured on held-out training rows.
+"""
+
+import os
+import json
+import time
+import numpy as np
+from pathlib import Path
+
+from confidence import tree_mean_std
+
+DISTILLED_FILE = 'distilled.json'
+DISTILLED_FORMAT_VERSION = 1
+
+# Bins per feature: low-cardinality features get one bin per distinct value
+MAX_BINS = 32
+
+# Ridge penalty of the least-squares fit (keeps sparsely populated bins near 0)
+RIDGE = 1e-3
+
+# Share of the rows held out to measure fidelity
+FIDELITY_HOLDOUT = 0.2
+
+# Training rows the tables are fitted on (a uniform sample beyond this)
+DISTILL_MAX_ROWS = 200000
+
+
+def bin_edges(column, max_bins=MAX_BINS):
+    """Interior cut points of one feature: midpoints between distinct values, else quantiles"""
+    values = np.unique(column)
+    if len(values) <= max_bins:
+        return (values[:-1] + values[1:]) / 2
+    return np.unique(np.quantile(column, np.linspace(0, 1, max_bins + 1)[1:-1]))
+
+
+class DistilledScorer:
+    """Per-feature bin tables evaluated with one searchsorted per feature"""
+
+    def __init__(self, feature_names, edges, score_table, std_table, score_intercept, std_intercept,
+                 fidelity=None):
+        self.feature_names = list(feature_names)
+        self.edges = [np.asarray(e, dtype=np.float64) for e in edges]
+        self.score_table = np.asarray(score_table, dtype=np.float64)
+        self.std_table = np.asarray(std_table, dtype=np.float64)
+        self.score_intercept = float(score_intercept)
+        self.std_intercept = float(std_intercept)
+        self.fidelity = fidelity or {}
+
+        # Offset of each feature's bins within the flat tables
+        sizes = np.array([len(e) + 1 for e in self.edges], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    @property
+    def n_bins(self):
+        return len(self.score_table)
+
+    def bins(self, X):
+        """(n_rows, n_features) flat-table index of each value's bin"""
+        X = np.asarray(X, dtype=np.float64)
+        index = np.empty(X.shape, dtype=np.int64)
+        for f, edges in enumerate(self.edges):
+            index[:, f] = np.searchsorted(edges, X[:, f], side='right') + self.offsets[f]
+        return index
+
+    def predict(self, X):
+        """Approximate forest scores (unclipped)"""
+        return self.score_intercept + self.score_table[self.bins(X)].sum(axis=1)
+
+    def predict_mean_std(self, X):
+        """Approximate forest scores and tree std-devs"""
+        index = self.bins(X)
+        scores = self.score_intercept + self.score_table[index].sum(axis=1)
+        std_dev = np.maximum(self.std_intercept + self.std_table[index].sum(axis=1), 0)
+        return scores, std_dev
+
+    def contributions(self, X):
+        """Exact per-feature decomposition of predict(): (score_intercept, (n_rows, n_features) table values)"""
+        return self.score_intercept, self.score_table[self.bins(X)]
+
+    @classmethod
+    def fit(cls, feature_names, X, scores, std_dev, max_bins=MAX_BINS, ridge=RIDGE):
+        """Fit both tables on raw features X against the forest's scores and std-devs"""
+        # Training only: predict.py imports this module and should not pay for scipy at start-up
+        from scipy import sparse
+        from scipy.sparse.linalg import lsqr
+
+        X = np.asarray(X, dtype=np.float64)
+        edges = [bin_edges(X[:, f], max_bins) for f in range(X.shape[1])]
+        n_bins = sum(len(e) + 1 for e in edges)
+        scorer = cls(feature_names, edges, np.zeros(n_bins), np.zeros(n_bins), 0, 0)
+
+        # One-hot bin membership: n_rows x n_bins with one 1 per feature per row
+        index = scorer.bins(X)
+        n_rows, n_features = index.shape
+        design = sparse.csr_matrix(
+            (np.ones(index.size), index.ravel(), np.arange(0, index.size + 1, n_features)),
+            shape=(n_rows, scorer.n_bins)
+        )
+
+        damp = np.sqrt(ridge * n_rows)
+        for target, table_name, intercept_name in ((scores, 'score_table', 'score_intercept'),
+                                                   (std_dev, 'std_table', 'std_intercept')):
+            intercept = float(np.mean(target))
+            table = lsqr(design, target - intercept, damp=damp, atol=1e-10, btol=1e-10)[0]
+            setattr(scorer, table_name, table)
+            setattr(scorer, intercept_name, intercept)
+        return scorer
+
+    def to_dict(self):
+        return {
+            'format_version': DISTILLED_FORMAT_VERSION,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'feature_names': self.feature_names,
+            'edges': [e.tolist() for e in self.edges],
+            'score_intercept': self.score_intercept,
+            'score_table': self.score_table.tolist(),
+            'std_intercept': self.std_intercept,
+            'std_table': self.std_table.tolist(),
+            'fidelity': self.fidelity
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('format_version') != DISTILLED_FORMAT_VERSION:
+            raise ValueError(f"Unsupported distilled model format: {data.get('format_version')}")
+        return cls(data['feature_names'], data['edges'], data['score_table'], data['std_table'],
+                   data['score_intercept'], data['std_intercept'], data.get('fidelity'))
+
+
+def fidelity_report(scorer, X, forest_scores, forest_std):
+    """How closely the distilled scorer tracks the forest on rows X"""
+    scores, std_dev = scorer.predict_mean_std(X)
+    scores = np.clip(scores, 0, 1)
+    error = scores - forest_scores
+    total = forest_scores - forest_scores.mean()
+
+    # Rank agreement matters most: allocation orders candidates by score
+    rank_distilled = np.argsort(np.argsort(scores))
+    rank_forest = np.argsort(np.argsort(forest_scores))
+
+    return {
+        'r2': float(1 - (error @ error) / (total @ total)) if total @ total > 0 else None,
+        'mae': float(np.mean(np.abs(error))),
+        'max_abs_error': float(np.max(np.abs(error))),
+        'rank_correlation': float(np.corrcoef(rank_distilled, rank_forest)[0, 1]) if len(X) > 1 else None,
+        'std_mae': float(np.mean(np.abs(std_dev - forest_std))),
+        'n_rows': int(len(X))
+    }
+
+
+def distill(model, scaler, feature_names, X, seed=42):
+    """
+    Distilled scorer for a fitted forest, trained on X (raw feature rows)
+    Fidelity is measured on a held-out FIDELITY_HOLDOUT of X; the returned
+    scorer is then refitted on all of X (at most DISTILL_MAX_ROWS rows).
+    """
+    X = np.asarray(X, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    if len(X) > DISTILL_MAX_ROWS:
+        X = X[np.sort(rng.permutation(len(X))[:DISTILL_MAX_ROWS])]
+    forest_scores, forest_std = tree_mean_std(model, scaler.transform(X))
+    forest_scores = np.clip(forest_scores, 0, 1)
+
+    order = rng.permutation(len(X))
+    n_holdout = int(len(X) * FIDELITY_HOLDOUT)
+    holdout, fit_rows = order[:n_holdout], order[n_holdout:]
+
+    fidelity = None
+    if n_holdout >= 2:
+        scorer = DistilledScorer.fit(feature_names, X[fit_rows], forest_scores[fit_rows], forest_std[fit_rows])
+        fidelity = fidelity_report(scorer, X[holdout], forest_scores[holdout], forest_std[holdout])
+
+    scorer = DistilledScorer.fit(feature_names, X, forest_scores, forest_std)
+    scorer.fidelity = fidelity or {}
+    return scorer
+
+
+def save_distilled(model_dir, scorer):
+    """Write <model_dir>/distilled.json atomically; returns its path"""
+    path = Path(model_dir) / DISTILLED_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'.{DISTILLED_FILE}.tmp-{os.getpid()}')
+    with open(tmp_path, 'w') as f:
+        json.dump(scorer.to_dict(), f)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_distilled(model_dir):
+    """Distilled scorer saved in model_dir"""
+    path = Path(model_dir) / DISTILLED_FILE
+    if not path.exists():
+        raise FileNotFoundError(f"Distilled model not found: {path} (retrain to create it)")
+    with open(path, 'r') as f:
+        return DistilledScorer.from_dict(json.load(f))
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Vectorized Pair Feature Engine
+Computes model features for every student x internship pair straight from raw
+profiles (either shape read by profiles.py) with sparse matrix products instead
+of one mlService.extractFeatures call per pair:
+
+    present   students x skills   1 where the student has the skill
+    levels    students x skills   the student's level
+    required  internships x skills number of requirement entries for the skill
+
+    overlap count = present @ required.T
+    total level   = levels @ required.T
+    max level     = largest v with (levels >= v) @ required.T > 0
+
+Output matches build_feature_matrix(pair_features(student, internship)) exactly.
+
+Usage:
+  echo '{"students": [...], "internships": [...], "includeConfidence": true}' \\
+      | python3 ml/feature_tensor.py
+"""
+
+import sys
+import json
+import argparse
+import numpy as np
+from scipy.sparse import csr_matrix
+from contextlib import nullcontext
+
+from features import FEATURE_NAMES, FEATURE_SPECS, FLAG
+from profiles import (
+    student_id, student_skills, student_gpa, student_preferred_domain, student_preferred_location,
+    internship_skills, internship_sector, internship_location, internship_min_gpa
+)
+from predict import MatchingPredictor, BACKENDS
+from sharded import DEFAULT_SHARD_SIZE
+from prediction_cache import DEFAULT_MAX_ENTRIES
+from history import HistoryIndex
+from confidence import format_confidence_results, confidence_from_std
+from rule_scores import RuleScoreEngine
+from fusion import fusion_options, fuse, fused_payload, TopNPerStudent
+from profiling import StageTimer
+
+# Pairs per feature block (bounds the block's n_rows x n_features matrix)
+DEFAULT_BLOCK_PAIRS = 65536
+
+
+class PairFeatureEngine:
+    """Encoded profiles for one allocation batch; features are computed per student block"""
+
+    def __init__(self, students, internships, feature_names=None, history=None):
+        """history: optional HistoryIndex joined on student id for the past_* features"""
+        self.feature_names = list(feature_names or FEATURE_NAMES)
+        self.n_students = len(students)
+        self.n_internships = len(internships)
+
+        # Skill vocabulary from the student side; skills nobody has can never overlap
+        vocabulary = {}
+        rows, cols, levels = [], [], []
+        verified = np.zeros(self.n_students, dtype=np.float64)
+        total_skills = np.zeros(self.n_students, dtype=np.float64)
+
+        for s, student in enumerate(students):
+            skills = student_skills(student)
+            total_skills[s] = len(skills)
+            verified[s] = sum(1 for _, _, is_verified in skills if is_verified)
+
+            # Later entries win for a repeated skill, like the Map in extractFeatures
+            for name, level in {name: level for name, level, _ in skills}.items():
+                rows.append(s)
+                cols.append(vocabulary.setdefault(name, len(vocabulary)))
+                levels.append(level)
+
+        n_skills = max(len(vocabulary), 1)
+        self.levels = csr_matrix(
+            (np.array(levels, dtype=np.float64), (rows, cols)), shape=(self.n_students, n_skills)
+        )
+        self.present = csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (rows, cols)), shape=(self.n_students, n_skills)
+        )
+
+        # Requirement counts (a repeated requirement counts twice, as in extractFeatures)
+        rows, cols = [], []
+        n_required = np.zeros(self.n_internships, dtype=np.float64)
+        for j, internship in enumerate(internships):
+            required = internship_skills(internship)
+            n_required[j] = len(required)
+            for name, _ in required:
+                col = vocabulary.get(name)
+                if col is not None:
+                    rows.append(j)
+                    cols.append(col)
+
+        # Duplicate (row, col) entries are summed on construction
+        self.required = csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (rows, cols)), shape=(self.n_internships, n_skills)
+        )
+        self.required_t = self.required.T.tocsr()
+        self.required_any_t = (self.required_t > 0).astype(np.float64)
+        self.n_required = n_required
+        self.level_values = np.unique(self.levels.data[self.levels.data > 0])
+
+        # Per-student and per-internship columns
+        self.gpa = np.array([student_gpa(s) for s in students], dtype=np.float64)
+        self.total_skills = total_skills
+        self.verified = verified
+        if history is not None:
+            self.past_allocations, self.past_avg_rating = history.lookup([student_id(s) for s in students])
+        else:
+            self.past_allocations = np.zeros(self.n_students, dtype=np.float64)
+            self.past_avg_rating = np.zeros(self.n_students, dtype=np.float64)
+        self.min_gpa = np.array([internship_min_gpa(i) for i in internships], dtype=np.float64)
+        self.duration = np.array([i.get('duration') or 0 for i in internships], dtype=np.float64)
+        self.stipend = np.array([i.get('stipend') or 0 for i in internships], dtype=np.float64)
+
+        # Categorical matches compare integer codes over a shared value table
+        codes = {}
+        encode = lambda values: np.array([codes.setdefault(v, len(codes)) for v in values], dtype=np.int64)
+        self.student_domain = encode(student_preferred_domain(s) for s in students)
+        self.student_location = encode(student_preferred_location(s) for s in students)
+        self.sector = encode(internship_sector(i) for i in internships)
+        self.location = encode(internship_location(i) for i in internships)
+        self.remote_code = codes.setdefault('remote', len(codes))
+
+    def _columns(self, s_idx, overlap, total_level, max_level, domain_match, location_match, i_idx):
+        """Input-record columns (keyed like pair_features) for the rows being built"""
+        n_required = self.n_required[i_idx]
+        return {
+            'skillOverlapCount': overlap,
+            'skillOverlapRatio': np.divide(overlap, n_required, out=np.zeros_like(overlap), where=n_required > 0),
+            'avgSkillLevel': np.divide(total_level, overlap, out=np.zeros_like(overlap), where=overlap > 0),
+            'maxSkillLevel': max_level,
+            'gpa': self.gpa[s_idx],
+            'domainMatch': domain_match,
+            'locationMatch': location_match,
+            'locationPreference': location_match.astype(np.float64),
+            'duration': self.duration[i_idx],
+            'stipend': self.stipend[i_idx],
+            'totalSkills': self.total_skills[s_idx],
+            'verifiedSkills': self.verified[s_idx],
+            'pastAllocations': self.past_allocations[s_idx],
+            'pastAvgRating': self.past_avg_rating[s_idx]
+        }
+
+    def _assemble(self, columns, n_rows):
+        """Model matrix from input-record columns, same transforms as build_feature_matrix"""
+        specs = {name: (key, transform) for name, key, transform in FEATURE_SPECS}
+        X = np.zeros((n_rows, len(self.feature_names)), dtype=np.float64)
+
+        for j, name in enumerate(self.feature_names):
+            spec = specs.get(name)
+            if spec is None:
+                continue
+
+            key, transform = spec
+            column = columns[key]
+            if transform == FLAG:
+                X[:, j] = column != 0
+            else:
+                X[:, j] = column / transform if transform else column
+        return X
+
+    def block(self, start, stop):
+        """
+        Features of students [start, stop) against every internship
+        Returns: ((stop - start) * n_internships, n_features), student-major
+        """
+        levels = self.levels[start:stop]
+        overlap = (self.present[start:stop] @ self.required_t).toarray()
+        total_level = (levels @ self.required_t).toarray()
+
+        # Max shared level: highest threshold at which some required skill is still covered
+        max_level = np.zeros_like(overlap)
+        for value in self.level_values:
+            covered = ((levels >= value).astype(np.float64) @ self.required_any_t).toarray() > 0
+            max_level[covered] = value
+
+        domain = self.student_domain[start:stop, None] == self.sector[None, :]
+        student_location = self.student_location[start:stop, None]
+        location = (
+            (student_location == self.location[None, :]) |
+            (student_location == self.remote_code) |
+            (self.location[None, :] == self.remote_code)
+        )
+
+        n_block = stop - start
+        s_idx = np.repeat(np.arange(start, stop), self.n_internships)
+        i_idx = np.tile(np.arange(self.n_internships), n_block)
+        columns = self._columns(
+            s_idx, overlap.ravel(), total_level.ravel(), max_level.ravel(),
+            domain.ravel(), location.ravel(), i_idx
+        )
+        return self._assemble(columns, len(s_idx))
+
+    def pairs(self, s_idx, i_idx):
+        """Features of arbitrary (student, internship) pairs, row-aligned with the index arrays"""
+        return self._assemble(self.pair_columns(s_idx, i_idx), len(s_idx))
+
+    def pair_columns(self, s_idx, i_idx):
+        """Input-record columns (pair_features keys) of arbitrary pairs, before the model transforms"""
+        s_idx = np.asarray(s_idx, dtype=np.int64)
+        i_idx = np.asarray(i_idx, dtype=np.int64)
+        required = self.required[i_idx]
+
+        overlap = np.asarray(self.present[s_idx].multiply(required).sum(axis=1)).ravel()
+        total_level = np.asarray(self.levels[s_idx].multiply(required).sum(axis=1)).ravel()
+        max_level = self.levels[s_idx].multiply(required > 0).max(axis=1).toarray().ravel()
+
+        student_location = self.student_location[s_idx]
+        location = (
+            (student_location == self.location[i_idx]) |
+            (student_location == self.remote_code) |
+            (self.location[i_idx] == self.remote_code)
+        )
+        domain = self.student_domain[s_idx] == self.sector[i_idx]
+
+        return self._columns(s_idx, overlap, total_level, max_level, domain, location, i_idx)
+
+    def tensor(self):
+        """Full (n_students, n_internships, n_features) feature tensor"""
+        X = self.block(0, self.n_students)
+        return X.reshape(self.n_students, self.n_internships, len(self.feature_names))
+
+    def eligible(self, start, stop):
+        """GPA hard constraint for students [start, stop) x internships (runBatchAllocation pre-filter)"""
+        return self.gpa[start:stop, None] >= self.min_gpa[None, :]
+
+    def iter_eligible(self, block_pairs=DEFAULT_BLOCK_PAIRS, candidate_lists=None):
+        """
+        Eligible pairs in runBatchAllocation order, in blocks
+        candidate_lists: optional internship indices per student (top-K mode)
+        Yields: (student indices, internship indices, feature matrix)
+        """
+        if candidate_lists is not None:
+            s_idx = np.repeat(np.arange(self.n_students), [len(c) for c in candidate_lists])
+            i_idx = np.concatenate([np.asarray(c, dtype=np.int64) for c in candidate_lists]) \
+                if len(s_idx) else np.zeros(0, dtype=np.int64)
+            keep = self.gpa[s_idx] >= self.min_gpa[i_idx]
+            s_idx, i_idx = s_idx[keep], i_idx[keep]
+
+            for start in range(0, len(s_idx), block_pairs):
+                rows, cols = s_idx[start:start + block_pairs], i_idx[start:start + block_pairs]
+                yield rows, cols, self.pairs(rows, cols)
+            return
+
+        block_students = max(1, block_pairs // max(self.n_internships, 1))
+        for start in range(0, self.n_students, block_students):
+            stop = min(start + block_students, self.n_students)
+            mask = self.eligible(start, stop).ravel()
+            if not mask.any():
+                continue
+
+            flat = np.flatnonzero(mask)
+            yield start + flat // self.n_internships, flat % self.n_internships, self.block(start, stop)[mask]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Score raw student/internship profiles with vectorized features')
+    parser.add_argument('--model-dir', type=str, default='ml/models',
+                        help='Directory containing the trained model files')
+    parser.add_argument('--backend', choices=BACKENDS, default='sklearn',
+                        help='Inference backend (flat = flattened forest engine)')
+    parser.add_argument('--cache', type=str, default=None,
+                        help='SQLite file for the persistent prediction cache (disabled if omitted)')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_ENTRIES,
+                        help='Maximum cached predictions before least-recently-used eviction')
+    parser.add_argument('--block-pairs', type=int, default=DEFAULT_BLOCK_PAIRS,
+                        help='Pairs featurized and scored per output batch')
+    parser.add_argument('--confidence', action='store_true',
+                        help='Include tree-variance confidence (also set by "includeConfidence")')
+    parser.add_argument('--features-only', action='store_true',
+                        help='Emit feature rows instead of scores')
+    parser.add_argument('--profile', action='store_true',
+                        help='Attach a per-stage timing breakdown ("profile") to the summary line')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes for blocks larger than --shard-size (0 = one per CPU, 1 = in-process)')
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE,
+                        help='Rows per worker shard in sharded prediction')
+    return parser.parse_args(argv)
+
+
+def main():
+    """
+    Score every eligible pair of a {students, internships, candidates?} request.
+    One NDJSON line per block, then a summary line:
+        {"success": true, "offset": 0, "rows": [...], "cols": [...], "predictions": [...]}
+        {"success": true, "done": true, "count": 123}
+    With "fusion": {mlWeight, ruleWeight, cutoff, topN}, the rule-based scores are
+    computed here too (rule_scores.py) and each line carries only the fused
+    survivors (fusion.py); the summary line adds how many were kept:
+        {"success": true, "offset": 0, "rows": [...], "cols": [...], "scores": [...],
+         "mlScores": [...], "confidence": [...]}
+        {"success": true, "done": true, "count": 123, "kept": 45}
+    """
+    args = parse_args()
+    timer = StageTimer() if args.profile else None
+
+    def stage(name, rows=None):
+        return timer.stage(name, rows) if timer is not None else nullcontext()
+
+    predictor = None
+    try:
+        with stage('parse'):
+            request = json.loads(sys.stdin.read())
+        students = request.get('students', [])
+        internships = request.get('internships', [])
+        if not students or not internships:
+            raise ValueError('Students and internships are required')
+
+        include_confidence = args.confidence or request.get('includeConfidence', False)
+        fusion = fusion_options(request['fusion']) if request.get('fusion') is not None else None
+        if fusion is not None and args.features_only:
+            raise ValueError('Fusion needs model scores (not available with --features-only)')
+
+        if args.features_only:
+            engine = PairFeatureEngine(students, internships, history=HistoryIndex.from_model_dir(args.model_dir))
+        else:
+            predictor = MatchingPredictor(args.model_dir, backend=args.backend,
+                                          cache_path=args.cache, cache_size=args.cache_size, timer=timer,
+                                          workers=args.workers, shard_size=args.shard_size)
+            with stage('build_engine'):
+                engine = PairFeatureEngine(students, internships, predictor.feature_names,
+                                           predictor.current_history())
+                rules = RuleScoreEngine(students, internships) if fusion is not None else None
+
+        def emit(batch):
+            with stage('serialize'):
+                text = json.dumps(batch)
+            sys.stdout.write(text + '\n')
+            sys.stdout.flush()
+
+        top_n = TopNPerStudent(fusion['top_n'] if fusion is not None else None)
+        offset = 0
+        kept = 0
+        blocks = engine.iter_eligible(max(1, args.block_pairs), request.get('candidates'))
+        while True:
+            with stage('prepare_features'):
+                rows, cols, X = next(blocks, (None, None, None))
+            if rows is None:
+                break
+
+            if fusion is not None:
+                confidence = None
+                if include_confidence:
+                    scores, std_dev = predictor.score_matrix_with_std(X)
+                    confidence = confidence_from_std(std_dev)
+                else:
+                    scores = predictor.score_matrix(X)
+                with stage('rule_scores', len(rows)):
+                    rule_scores = rules.pairs(rows, cols)
+                survivors = top_n.push(fuse(rows, cols, scores, rule_scores, confidence, fusion['ml_weight'],
+                                            fusion['rule_weight'], fusion['cutoff']))
+                if len(survivors['rows']):
+                    emit({'success': True, 'offset': offset, **fused_payload(survivors)})
+                    kept += len(survivors['rows'])
+                offset += len(rows)
+                continue
+
+            batch = {'success': True, 'offset': offset, 'rows': rows.tolist(), 'cols': cols.tolist()}
+            if predictor is None:
+                batch['features'] = X.tolist()
+            elif include_confidence:
+                batch['predictions'] = format_confidence_results(*predictor.score_matrix_with_std(X))
+            else:
+                batch['predictions'] = [{'score': score} for score in predictor.score_matrix(X).tolist()]
+
+            emit(batch)
+            offset += len(rows)
+
+        done = {
+            'success': True,
+            'done': True,
+            'count': offset
+        }
+        if fusion is not None:
+            # The last student's pairs are only final once the input is exhausted
+            survivors = top_n.flush()
+            if survivors is not None and len(survivors['rows']):
+                emit({'success': True, 'offset': offset, **fused_payload(survivors)})
+                kept += len(survivors['rows'])
+            done['kept'] = kept
+        if timer is not None:
+            done['profile'] = timer.report()
+        print(json.dumps(done))
+
+    except Exception as e:
+        print(json.dumps({
+            'success': False,
+            'error': str(e)
+        }))
+        sys.exit(1)
+    finally:
+        if predictor is not None:
+            predictor.close()
+
+
+if __name__ == '__main__':
+    main()
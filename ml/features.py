@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Feature Engineering for the Matching Model
+Columnar feature construction shared by training and prediction:
+input records go straight to a contiguous NumPy matrix, one column at a time
+"""
+
+import numpy as np
+
+# Marks a boolean input that becomes a 0/1 feature
+FLAG = 'flag'
+
+# (feature name, input key, transform)
+# transform: None = raw value, FLAG = 0/1, number = divide by it
+FEATURE_SPECS = [
+    # Skills matching features
+    ('skill_overlap_count', 'skillOverlapCount', None),
+    ('skill_overlap_ratio', 'skillOverlapRatio', None),
+    ('avg_skill_level', 'avgSkillLevel', None),
+    ('max_skill_level', 'maxSkillLevel', None),
+
+    # Academic features
+    ('gpa', 'gpa', None),
+    ('gpa_normalized', 'gpa', 10.0),  # Assuming 10-point scale
+
+    # Domain/interest alignment
+    ('domain_match', 'domainMatch', FLAG),
+
+    # Location features
+    ('location_match', 'locationMatch', FLAG),
+    ('location_preference', 'locationPreference', None),
+
+    # Internship characteristics
+    ('internship_duration', 'duration', None),
+    ('stipend_amount', 'stipend', 1000.0),  # Normalize
+
+    # Student experience
+    ('total_skills', 'totalSkills', None),
+    ('verified_skills', 'verifiedSkills', None),
+
+    # Historical performance (if available)
+    ('past_allocation_count', 'pastAllocations', None),
+    ('past_avg_rating', 'pastAvgRating', None),
+]
+
+FEATURE_NAMES = [name for name, _, _ in FEATURE_SPECS]
+
+_SPEC_BY_NAME = {name: (key, transform) for name, key, transform in FEATURE_SPECS}
+
+
+def _read_column(data, key):
+    """Read one input key from every record as float64 (missing/None -> 0)"""
+    n = len(data)
+    try:
+        return np.fromiter((item.get(key, 0) for item in data), dtype=np.float64, count=n)
+    except (TypeError, ValueError):
+        # Slow path for None or numeric strings in the input
+        return np.array(
+            [0.0 if item.get(key) is None else float(item.get(key)) for item in data],
+            dtype=np.float64
+        )
+
+
+def _read_flag(data, key):
+    """Read one boolean input key from every record as 0.0 / 1.0"""
+    return np.fromiter(
+        (1.0 if item.get(key, False) else 0.0 for item in data),
+        dtype=np.float64,
+        count=len(data)
+    )
+
+
+def build_feature_matrix(data, feature_names=None, dtype=np.float64):
+    """
+    Build the (n_pairs x n_features) feature matrix for a list of input records
+    Columns follow feature_names (the order saved in features.json);
+    features unknown to FEATURE_SPECS are left at 0, missing values become 0
+    """
+    feature_names = feature_names or FEATURE_NAMES
+    X = np.zeros((len(data), len(feature_names)), dtype=dtype)
+
+    raw_columns = {}
+    for j, name in enumerate(feature_names):
+        spec = _SPEC_BY_NAME.get(name)
+        if spec is None:
+            continue
+
+        key, transform = spec
+        if transform == FLAG:
+            X[:, j] = _read_flag(data, key)
+            continue
+
+        if key not in raw_columns:
+            raw_columns[key] = _read_column(data, key)
+
+        column = raw_columns[key]
+        X[:, j] = column / transform if transform else column
+
+    # Handle missing values
+    nan_mask = np.isnan(X)
+    if nan_mask.any():
+        X[nan_mask] = 0
+
+    return X
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Flattened Forest Inference Engine
+Exports a fitted RandomForestRegressor into flat NumPy node arrays
+(feature, threshold, children, value) with the StandardScaler folded into the
+thresholds, and evaluates all trees over a batch with vectorized traversal
+"""
+
+import numpy as np
+
+# Rows traversed at once: 100 trees x 4096 rows of int64 node ids = ~3 MB
+DEFAULT_CHUNK_SIZE = 4096
+
+
+class FlatForest:
+    """
+    All trees of a forest laid out in one set of node arrays
+    Leaves point back to themselves, so every row can be stepped exactly
+    max_depth times without checking which trees have finished
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth, n_features):
+        self.feature = feature        # (n_nodes,) int64 split feature, 0 for leaves
+        self.threshold = threshold    # (n_nodes,) float64 split threshold in raw feature units
+        self.children = children      # (n_nodes, 2) int64 [left, right] node ids
+        self.value = value            # (n_nodes,) float64 leaf prediction
+        self.roots = roots            # (n_trees,) int64 root node id of each tree
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_sklearn(cls, model, scaler=None):
+        """
+        Flatten a fitted RandomForestRegressor
+        If a fitted StandardScaler is given, it is folded into the thresholds
+        so the forest consumes unscaled features:
+            (x - mean) / scale <= t   <=>   x <= t * scale + mean   (see fold_scaler)
+        """
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(offset, offset + n_nodes, dtype=np.int64)
+            is_leaf = tree.children_left == -1
+
+            feature = np.where(is_leaf, 0, tree.feature).astype(np.int64)
+            threshold = np.where(is_leaf, np.inf, tree.threshold).astype(np.float64)
+            left = np.where(is_leaf, node_ids, tree.children_left + offset)
+            right = np.where(is_leaf, node_ids, tree.children_right + offset)
+
+            features.append(feature)
+            thresholds.append(threshold)
+            children.append(np.stack([left, right], axis=1).astype(np.int64))
+            values.append(tree.value[:, 0, 0].astype(np.float64))
+            roots.append(offset)
+
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        feature = np.concatenate(features)
+        threshold = np.concatenate(thresholds)
+
+        # Always refined: even unscaled, sklearn compares float32(x) <= t
+        threshold = fold_scaler(feature, threshold, scaler)
+
+        return cls(
+            feature=feature,
+            threshold=threshold,
+            children=np.concatenate(children),
+            value=np.concatenate(values),
+            roots=np.array(roots, dtype=np.int64),
+            max_depth=max_depth,
+            n_features=model.n_features_in_
+        )
+
+    def tree_predictions(self, X):
+        """
+        Leaf values of every tree for every row of X
+        X: (n_rows, n_features) unscaled features
+        Returns: (n_trees, n_rows) float64
+        """
+        X = np.asarray(X, dtype=np.float64)
+        n_rows = X.shape[0]
+
+        # Column-major copy so (feature, row) lookups are one flat take()
+        X_flat = np.ascontiguousarray(X.T).ravel()
+        rows = np.arange(n_rows, dtype=np.int64)
+
+        node = np.repeat(self.roots[:, None], n_rows, axis=1)
+        children_flat = self.children.ravel()
+
+        for _ in range(self.max_depth):
+            split_values = np.take(X_flat, self.feature[node] * n_rows + rows)
+            go_right = split_values > self.threshold[node]
+            node = np.take(children_flat, node * 2 + go_right)
+
+        return self.value[node]
+
+    def predict_mean_std(self, X, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Mean and standard deviation over trees for every row of X
+        Rows are traversed in chunks to bound the (n_trees x rows) buffers
+        """
+        X = np.asarray(X, dtype=np.float64)
+        n_rows = X.shape[0]
+        mean = np.empty(n_rows, dtype=np.float64)
+        std = np.empty(n_rows, dtype=np.float64)
+
+        for start in range(0, n_rows, chunk_size):
+            tree_predictions = self.tree_predictions(X[start:start + chunk_size])
+            mean[start:start + chunk_size] = np.mean(tree_predictions, axis=0)
+            std[start:start + chunk_size] = np.std(tree_predictions, axis=0)
+
+        return mean, std
+
+    def predict(self, X, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Forest prediction (mean over trees) for every row of X"""
+        X = np.asarray(X, dtype=np.float64)
+        n_rows = X.shape[0]
+        mean = np.empty(n_rows, dtype=np.float64)
+
+        for start in range(0, n_rows, chunk_size):
+            tree_predictions = self.tree_predictions(X[start:start + chunk_size])
+            mean[start:start + chunk_size] = np.mean(tree_predictions, axis=0)
+
+        return mean
+
+    def contributions(self, X, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Tree-path decomposition of every row's prediction (Saabas):
+            prediction = bias + sum_f contributions[:, f]
+        Each split a row passes through moves its tree's value from the node
+        mean to the child mean; that step is credited to the split feature and
+        averaged over trees. bias is the mean root value (the training mean).
+        Same traversal as tree_predictions, so the cost per row is bounded by
+        n_trees x max_depth whatever the forest's size.
+        X: (n_rows, n_features) unscaled features
+        Returns: (bias, (n_rows, n_features) float64)
+        """
+        X = np.asarray(X, dtype=np.float64)
+        n_rows = X.shape[0]
+        contributions = np.empty((n_rows, self.n_features), dtype=np.float64)
+        children_flat = self.children.ravel()
+
+        for start in range(0, n_rows, chunk_size):
+            chunk = X[start:start + chunk_size]
+            n_chunk = chunk.shape[0]
+            X_flat = np.ascontiguousarray(chunk.T).ravel()
+            rows = np.arange(n_chunk, dtype=np.int64)
+            cells = np.zeros(n_chunk * self.n_features, dtype=np.float64)
+
+            node = np.repeat(self.roots[:, None], n_chunk, axis=1)
+            for _ in range(self.max_depth):
+                feature = self.feature[node]
+                go_right = np.take(X_flat, feature * n_chunk + rows) > self.threshold[node]
+                child = np.take(children_flat, node * 2 + go_right)
+                # Leaves step to themselves, adding 0
+                cells += np.bincount((rows * self.n_features + feature).ravel(),
+                                     weights=(self.value[child] - self.value[node]).ravel(),
+                                     minlength=len(cells))
+                node = child
+
+            contributions[start:start + n_chunk] = cells.reshape(n_chunk, self.n_features) / self.n_trees
+
+        return float(np.mean(self.value[self.roots])), contributions
+
+
+def fold_scaler(feature, threshold, scaler=None):
+    """
+    Map thresholds on scaled features back to raw feature units
+    sklearn decides float32((x - mean) / scale) <= t, so the naive
+    t * scale + mean can flip rows that sit exactly on a threshold. That
+    decision is monotone in x, so each raw threshold is refined by bisection
+    to the largest float64 x that still goes left: x <= t_raw is then the
+    exact same decision as sklearn's.
+    """
+    threshold = threshold.copy()
+    split = np.isfinite(threshold)
+    t = threshold[split]
+    f = feature[split]
+
+    mean = scaler.mean_[f] if scaler is not None and scaler.with_mean else np.zeros_like(t)
+    scale = scaler.scale_[f] if scaler is not None and scaler.with_std else np.ones_like(t)
+
+    def goes_left(x):
+        return ((x - mean) / scale).astype(np.float32) <= t
+
+    # Bracket the cutoff around the naive fold, widening until lo goes left and hi does not
+    guess = t * scale + mean
+    width = np.maximum(np.abs(guess), 1.0) * 1e-6
+    lo, hi = guess - width, guess + width
+    for _ in range(64):
+        bad_lo = ~goes_left(lo)
+        bad_hi = goes_left(hi)
+        if not (bad_lo.any() or bad_hi.any()):
+            break
+        width = width * 2
+        lo = np.where(bad_lo, guess - width, lo)
+        hi = np.where(bad_hi, guess + width, hi)
+
+    # Bisect until lo and hi are adjacent doubles
+    for _ in range(128):
+        mid = lo + (hi - lo) / 2
+        active = (mid > lo) & (mid < hi)
+        if not active.any():
+            break
+        left = goes_left(mid)
+        lo = np.where(active & left, mid, lo)
+        hi = np.where(active & ~left, mid, hi)
+
+    threshold[split] = lo
+    return threshold
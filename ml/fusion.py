@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Hybrid Score Fusion
+Combines ML scores with rule-based scores inside the predictor, the way
+allocationService does it, and keeps only the pairs that can be allocated:
+
+    hybrid = ML_WEIGHT * ml score + RULE_WEIGHT * rule score, kept when > cutoff
+    optionally only each student's top-N pairs by hybrid score
+
+Survivors are returned as parallel arrays instead of one object per pair:
+
+    {"rows": [...], "cols": [...], "scores": [...], "mlScores": [...], "confidence": [...]}
+
+rows / cols are student / internship indices (or, for plain prediction
+requests without them, the pair's position in the request).
+"""
+
+import numpy as np
+
+# allocationService defaults
+ML_WEIGHT = 0.6
+RULE_WEIGHT = 0.4
+MATCH_CUTOFF = 0.3
+
+FUSED_FIELDS = ('rows', 'cols', 'scores', 'mlScores', 'confidence')
+
+
+def fusion_options(options):
+    """Normalized {mlWeight, ruleWeight, cutoff, topN} from a request's "fusion" object"""
+    options = options or {}
+    top_n = options.get('topN')
+    return {
+        'ml_weight': float(options.get('mlWeight', ML_WEIGHT)),
+        'rule_weight': float(options.get('ruleWeight', RULE_WEIGHT)),
+        'cutoff': float(options.get('cutoff', MATCH_CUTOFF)),
+        'top_n': int(top_n) if top_n else None
+    }
+
+
+def fuse(rows, cols, ml_scores, rule_scores, confidence=None, ml_weight=ML_WEIGHT, rule_weight=RULE_WEIGHT,
+         cutoff=MATCH_CUTOFF):
+    """
+    Hybrid scores of a block of pairs, keeping those above the cutoff
+    Returns: dict of FUSED_FIELDS arrays (confidence is None when not computed)
+    """
+    ml_scores = np.asarray(ml_scores, dtype=np.float64)
+    hybrid = ml_scores * ml_weight + np.asarray(rule_scores, dtype=np.float64) * rule_weight
+    keep = np.flatnonzero(hybrid > cutoff)
+    return {
+        'rows': np.asarray(rows, dtype=np.int64)[keep],
+        'cols': np.asarray(cols, dtype=np.int64)[keep],
+        'scores': hybrid[keep],
+        'mlScores': ml_scores[keep],
+        'confidence': None if confidence is None else np.asarray(confidence, dtype=np.float64)[keep]
+    }
+
+
+def _take(pairs, index):
+    return {name: None if values is None else values[index] for name, values in pairs.items()}
+
+
+def _concat(first, second):
+    return {
+        name: None if first[name] is None else np.concatenate([first[name], second[name]])
+        for name in FUSED_FIELDS
+    }
+
+
+def top_n_per_student(pairs, top_n):
+    """Each student's top_n pairs by hybrid score (ties keep input order); input order is preserved"""
+    rows = pairs['rows']
+    if top_n is None or len(rows) == 0:
+        return pairs
+
+    order = np.lexsort((-pairs['scores'], rows))
+    sorted_rows = rows[order]
+    group_start = np.searchsorted(sorted_rows, sorted_rows, side='left')
+    rank = np.arange(len(order)) - group_start
+    return _take(pairs, np.sort(order[rank < top_n]))
+
+
+class TopNPerStudent:
+    """
+    top_n_per_student over a stream of blocks whose rows never decrease
+    (students in order). The last student of a block may continue in the next
+    one, so its pairs are held back until the student is complete.
+    """
+
+    def __init__(self, top_n=None):
+        self.top_n = top_n
+        self.pending = None
+
+    def push(self, pairs):
+        """Final pairs of every student completed by this block"""
+        if self.top_n is None:
+            return pairs
+        if self.pending is not None:
+            pairs = _concat(self.pending, pairs)
+        if len(pairs['rows']) == 0:
+            self.pending = None
+            return pairs
+
+        last = pairs['rows'] == pairs['rows'][-1]
+        self.pending = _take(pairs, last)
+        return top_n_per_student(_take(pairs, ~last), self.top_n)
+
+    def flush(self):
+        """Pairs of the last student"""
+        pending, self.pending = self.pending, None
+        return top_n_per_student(pending, self.top_n) if pending is not None else None
+
+
+def fused_payload(pairs):
+    """JSON-ready parallel lists (confidence omitted when not computed)"""
+    return {name: values.tolist() for name, values in pairs.items() if values is not None}
@@ -3,11 +3,29 @@
 Enhanced Sample Data Generator
 Generates realistic students and internships for scalability testing
 Usage: python3 ml/generate_full_sample_data.py --students 1000 --internships 200
+
+Sharded mode for million-scale load tests: draws are vectorized with a seeded
+NumPy Generator, student shards are built in parallel worker processes (each
+shard has its own seed, so the output does not depend on --workers), and
+records are streamed as NDJSON (optionally gzip) shards instead of one
+indented JSON file:
+  python3 ml/generate_full_sample_data.py --students 1000000 --internships 20000 \
+      --output-dir loadtest/ --pairs 2000000 --gzip --workers 8
+
+  loadtest/students/part-00000.ndjson.gz ...
+  loadtest/internships/part-00000.ndjson.gz ...
+  loadtest/pairs/part-00000.ndjson.gz ...    labelled pairs: python3 ml/train_model.py --data loadtest/pairs
+  loadtest/metadata.json
 """
 
+import os
+import gzip
 import json
 import random
 import argparse
+import numpy as np
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 
 # Sample data pools
@@ -172,14 +190,337 @@ def generate_internships(count):
     
     return internships
 
+# Sharded mode: students per shard file, and rows built at once inside a shard
+DEFAULT_SHARD_SIZE = 100000
+BLOCK_ROWS = 10000
+
+# Internship start dates are offsets from this day, so a seed always yields the same shards
+DEFAULT_BASE_DATE = '2025-01-01'
+
+# Stream tags mixed into the per-shard seeds
+STUDENT_STREAM = 1
+INTERNSHIP_STREAM = 2
+
+STUDENT_DURATIONS = [8, 12, 16, 24]
+STIPENDS = [5000, 8000, 10000, 12000, 15000, 20000, 25000]
+INSTITUTION_CITIES = ['Mumbai', 'Delhi', 'Bangalore']
+
+
+def _pick(rng, pool, size):
+    """Uniform choices from a list, as a Python list"""
+    return np.asarray(pool, dtype=object)[rng.integers(len(pool), size=size)].tolist()
+
+
+def _sample_rows(rng, pool, counts):
+    """Per row, counts[r] distinct items of pool (random.sample for every row at once)"""
+    order = np.argsort(rng.random((len(counts), len(pool))), axis=1)[:, :max(counts.max(), 1)]
+    items = np.asarray(pool, dtype=object)[order]
+    return [row[:k].tolist() for row, k in zip(items, counts.tolist())]
+
+
+def student_block(rng, start, count):
+    """Students start .. start + count - 1, same distributions as generate_students"""
+    first = _pick(rng, FIRST_NAMES, count)
+    last = _pick(rng, LAST_NAMES, count)
+    email_suffix = rng.integers(1, 1000, size=count).tolist()
+
+    num_skills = rng.integers(3, 9, size=count)
+    skill_names = _sample_rows(rng, SKILLS, num_skills)
+    levels = rng.integers(1, 6, size=(count, 8)).tolist()
+    verified = (rng.random((count, 8)) < 0.5).tolist()
+
+    gpa = np.round(rng.uniform(6.5, 9.5, size=count), 2).tolist()
+    degree = _pick(rng, DEGREES, count)
+    institution = _pick(rng, INSTITUTION_CITIES, count)
+    year = rng.integers(2, 5, size=count).tolist()
+    locations = _sample_rows(rng, CITIES, rng.integers(1, 4, size=count))
+    domains = _sample_rows(rng, DOMAINS, rng.integers(1, 4, size=count))
+    duration = _pick(rng, STUDENT_DURATIONS, count)
+    remote = (rng.random(count) < 0.5).tolist()
+
+    phone = rng.integers(7000000000, 10000000000, size=count).tolist()
+    birth = np.stack([
+        rng.integers(2000, 2005, size=count),
+        rng.integers(1, 13, size=count),
+        rng.integers(1, 29, size=count)
+    ], axis=1).tolist()
+
+    students = []
+    for k in range(count):
+        students.append({
+            "id": f"S{start + k:09d}",
+            "personal": {
+                "firstName": first[k],
+                "lastName": last[k],
+                "email": f"{first[k].lower()}.{last[k].lower()}{email_suffix[k]}@student.edu",
+                "phone": f"+91{phone[k]}",
+                "dateOfBirth": f"{birth[k][0]}-{birth[k][1]:02d}-{birth[k][2]:02d}"
+            },
+            "academic": {
+                "degree": degree[k],
+                "institution": f"Institute of Technology {institution[k]}",
+                "year": year[k],
+                "gpa": gpa[k]
+            },
+            "skills": [
+                {"name": name, "level": levels[k][j], "isVerified": verified[k][j]}
+                for j, name in enumerate(skill_names[k])
+            ],
+            "preferences": {
+                "locations": locations[k],
+                "domains": domains[k],
+                "duration": duration[k],
+                "remote": remote[k]
+            },
+            "availability": True,
+            "allocationStatus": "PENDING"
+        })
+    return students
+
+
+def internship_block(rng, start, count, base_date):
+    """Internships start .. start + count - 1, same distributions as generate_internships"""
+    org = rng.integers(len(ORGANIZATIONS), size=count).tolist()
+    title_draw = rng.integers(1 << 30, size=count).tolist()
+    skill_names = _sample_rows(rng, SKILLS, rng.integers(3, 7, size=count))
+    min_levels = rng.integers(2, 5, size=(count, 6)).tolist()
+    start_days = rng.integers(30, 181, size=count).tolist()
+    duration = _pick(rng, STUDENT_DURATIONS, count)
+    location = _pick(rng, CITIES, count)
+    remote = (rng.random(count) < 0.5).tolist()
+    stipend = _pick(rng, STIPENDS, count)
+    capacity = rng.integers(1, 11, size=count).tolist()
+    min_gpa = np.round(rng.uniform(6.0, 7.5, size=count), 1).tolist()
+    eligible_years = _sample_rows(rng, [2, 3, 4], rng.integers(1, 4, size=count))
+
+    internships = []
+    for k in range(count):
+        organization = ORGANIZATIONS[org[k]]
+        sector = organization["sector"]
+        titles = JOB_TITLES.get(sector, ["General Intern"])
+        start_date = base_date + timedelta(days=start_days[k])
+        internships.append({
+            "id": f"I{start + k:08d}",
+            "title": titles[title_draw[k] % len(titles)],
+            "organization": organization["name"],
+            "sector": sector,
+            "description": f"Exciting opportunity to work on {sector.lower()} projects and gain hands-on experience.",
+            "skillsRequired": [
+                {"name": name, "minLevel": min_levels[k][j]}
+                for j, name in enumerate(skill_names[k])
+            ],
+            "location": location[k],
+            "remote": remote[k],
+            "duration": duration[k],
+            "stipend": stipend[k],
+            "capacity": capacity[k],
+            "startDate": start_date.strftime("%Y-%m-%d"),
+            "applicationDeadline": (start_date - timedelta(days=15)).strftime("%Y-%m-%d"),
+            "status": "OPEN",
+            "requirements": {
+                "minGPA": min_gpa[k],
+                "eligibleYears": eligible_years[k]
+            }
+        })
+    return internships
+
+
+def labelled_pairs(rng, students, internships, n_pairs, pair_prefix):
+    """
+    Training records for random (student, internship) pairs: features as
+    pair_features computes them, targetScore from the generate_sample_data.py formula
+    """
+    # Imported here so plain JSON generation does not load the ML stack
+    from feature_tensor import PairFeatureEngine
+
+    engine = PairFeatureEngine(students, internships)
+    s_idx = rng.integers(len(students), size=n_pairs)
+    i_idx = rng.integers(len(internships), size=n_pairs)
+    columns = engine.pair_columns(s_idx, i_idx)
+
+    # Per-student history, drawn like generate_sample_data.py
+    past_allocations = rng.integers(0, 4, size=len(students)).astype(np.float64)
+    past_rating = np.where(rng.random(len(students)) > 0.3,
+                           np.round(rng.uniform(3.0, 5.0, size=len(students)), 2), 0.0)
+    columns['pastAllocations'] = past_allocations[s_idx]
+    columns['pastAvgRating'] = past_rating[s_idx]
+
+    base_score = (
+        columns['skillOverlapRatio'] * 0.4 +
+        (columns['avgSkillLevel'] / 5) * 0.2 +
+        (columns['gpa'] / 10) * 0.15 +
+        columns['domainMatch'] * 0.15 +
+        columns['locationMatch'] * 0.1
+    )
+    target = np.round(np.clip(base_score + rng.uniform(-0.1, 0.1, size=n_pairs), 0.0, 1.0), 3)
+
+    keys = list(columns)
+    values = [columns[key].tolist() for key in keys]
+    flags = {'domainMatch', 'locationMatch'}
+    student_ids = [students[s]["id"] for s in s_idx.tolist()]
+    internship_ids = [internships[i]["id"] for i in i_idx.tolist()]
+    target = target.tolist()
+
+    records = []
+    for k in range(n_pairs):
+        record = {key: (bool(column[k]) if key in flags else column[k]) for key, column in zip(keys, values)}
+        record['targetScore'] = target[k]
+        record['studentId'] = student_ids[k]
+        record['internshipId'] = internship_ids[k]
+        record['allocationId'] = f"{pair_prefix}-{k}"
+        records.append(record)
+    return records
+
+
+def _shard_path(directory, shard, compress):
+    return Path(directory) / f"part-{shard:05d}.ndjson{'.gz' if compress else ''}"
+
+
+def _write_ndjson(f, records):
+    f.write(''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records))
+
+
+def _open_shard(path, compress):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Level 1: gzip is there to save disk, not to be maximally small
+    return gzip.open(path, 'wt', compresslevel=1) if compress else open(path, 'w')
+
+
+def write_internships(output_dir, count, shard_size, seed, compress, base_date):
+    """Generate and write every internship (they are needed by all pair shards)"""
+    internships = []
+    for shard, start in enumerate(range(0, count, shard_size)):
+        rng = np.random.default_rng([seed, INTERNSHIP_STREAM, shard])
+        block = internship_block(rng, start, min(shard_size, count - start), base_date)
+        with _open_shard(_shard_path(Path(output_dir) / 'internships', shard, compress), compress) as f:
+            _write_ndjson(f, block)
+        internships.extend(block)
+    return internships
+
+
+def write_student_shard(output_dir, shard, start, count, seed, compress, internships, n_pairs):
+    """
+    One student shard (and its share of labelled pairs), in a worker process
+    Rows are built BLOCK_ROWS at a time, so memory does not grow with the shard
+    Returns: shard statistics
+    """
+    rng = np.random.default_rng([seed, STUDENT_STREAM, shard])
+    output_dir = Path(output_dir)
+    stats = {'students': 0, 'pairs': 0, 'skills': 0}
+
+    pairs_file = None
+    with _open_shard(_shard_path(output_dir / 'students', shard, compress), compress) as students_file:
+        try:
+            if n_pairs:
+                pairs_file = _open_shard(_shard_path(output_dir / 'pairs', shard, compress), compress)
+
+            for block_start in range(0, count, BLOCK_ROWS):
+                block_count = min(BLOCK_ROWS, count - block_start)
+                students = student_block(rng, start + block_start, block_count)
+                _write_ndjson(students_file, students)
+                stats['students'] += block_count
+                stats['skills'] += sum(len(s['skills']) for s in students)
+
+                # This block's share of the shard's pairs
+                block_pairs = n_pairs * (block_start + block_count) // count - n_pairs * block_start // count
+                if block_pairs:
+                    _write_ndjson(pairs_file, labelled_pairs(
+                        rng, students, internships, block_pairs, f"P{shard:05d}-{block_start // BLOCK_ROWS}"
+                    ))
+                    stats['pairs'] += block_pairs
+        finally:
+            if pairs_file is not None:
+                pairs_file.close()
+
+    return stats
+
+
+def generate_shards(output_dir, n_students, n_internships, shard_size=DEFAULT_SHARD_SIZE, n_pairs=0,
+                    workers=None, seed=42, compress=False, base_date=DEFAULT_BASE_DATE):
+    """
+    Sharded NDJSON generation (see module docstring)
+    base_date: ISO date internship start dates are drawn relative to
+    Returns: metadata dict (also written to <output_dir>/metadata.json)
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    internships = write_internships(output_dir, n_internships, shard_size, seed, compress,
+                                   datetime.fromisoformat(base_date))
+
+    bounds = [(shard, start, min(shard_size, n_students - start))
+              for shard, start in enumerate(range(0, n_students, shard_size))]
+    # Pairs spread over shards in proportion to their students
+    shard_pairs = [n_pairs * (start + count) // n_students - n_pairs * start // n_students
+                   for _, start, count in bounds]
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(bounds)))
+    tasks = [(output_dir, shard, start, count, seed, compress, internships, pairs)
+             for (shard, start, count), pairs in zip(bounds, shard_pairs)]
+
+    if workers == 1:
+        results = [write_student_shard(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(write_student_shard, *zip(*tasks)))
+
+    metadata = {
+        "generated_at": datetime.now().isoformat(),
+        "seed": seed,
+        "base_date": base_date,
+        "student_count": sum(r['students'] for r in results),
+        "internship_count": len(internships),
+        "pair_count": sum(r['pairs'] for r in results),
+        "student_shards": len(bounds),
+        "internship_shards": -(-n_internships // shard_size),
+        "workers": workers,
+        "compressed": compress,
+        "total_capacity": sum(i["capacity"] for i in internships),
+        "avg_skills_per_student": sum(r['skills'] for r in results) / max(n_students, 1),
+        "avg_skills_required": sum(len(i["skillsRequired"]) for i in internships) / max(len(internships), 1)
+    }
+    with open(output_dir / 'metadata.json', 'w') as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+
 def main():
     parser = argparse.ArgumentParser(description='Generate sample data for InternMatch AI')
     parser.add_argument('--students', type=int, default=1000, help='Number of students to generate')
     parser.add_argument('--internships', type=int, default=200, help='Number of internships to generate')
     parser.add_argument('--output', type=str, default='sample_data.json', help='Output file name')
+    parser.add_argument('--output-dir', type=str, default=None,
+                        help='Sharded mode: write NDJSON shards to this directory instead of --output')
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE,
+                        help='Students (and internships) per shard file in sharded mode')
+    parser.add_argument('--pairs', type=int, default=0,
+                        help='Labelled training pairs to generate in sharded mode')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes in sharded mode (default: CPU count)')
+    parser.add_argument('--gzip', action='store_true', help='Gzip the shards')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for sharded mode')
+    parser.add_argument('--base-date', type=str, default=DEFAULT_BASE_DATE,
+                        help='Sharded mode: ISO date internship start dates are drawn relative to')
     
     args = parser.parse_args()
     
+    if args.output_dir:
+        print(f"🔄 Generating {args.students:,} students, {args.internships:,} internships "
+              f"and {args.pairs:,} labelled pairs into {args.output_dir}...")
+        metadata = generate_shards(
+            args.output_dir, args.students, args.internships,
+            shard_size=max(1, args.shard_size),
+            n_pairs=args.pairs,
+            workers=args.workers,
+            seed=args.seed,
+            compress=args.gzip,
+            base_date=args.base_date
+        )
+        print(f"✅ Generated {metadata['student_count']:,} students in {metadata['student_shards']} shards "
+              f"with {metadata['workers']} workers")
+        print(f"📊 Total internship capacity: {metadata['total_capacity']:,} positions")
+        print(f"💾 Saved to: {args.output_dir}")
+        return
+    
     print(f"🔄 Generating {args.students} students and {args.internships} internships...")
     
     students = generate_students(args.students)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Student History Index
+Per-student past_allocation_count / past_avg_rating, aggregated in bulk by
+mlService.js and stored as one sorted structured array (<model_dir>/history.npy).
+Readers open it with mmap_mode='r' and join on student id with a binary search,
+so no per-pair lookups are needed at training or prediction time.
+
+Usage:
+  echo '{"students": [{"id": "...", "pastAllocations": 2, "pastAvgRating": 4.5}]}' \\
+      | python3 ml/history.py
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import numpy as np
+from pathlib import Path
+
+HISTORY_FILE = 'history.npy'
+
+# Sorted by key; key = 64-bit hash of the student id
+HISTORY_DTYPE = np.dtype([
+    ('key', '<u8'),
+    ('past_allocations', '<f8'),
+    ('past_avg_rating', '<f8')
+])
+
+
+def student_key(student_id):
+    """64-bit key for a student id (ObjectId hex string or any id)"""
+    digest = hashlib.blake2b(str(student_id).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def save_history(model_dir, records):
+    """
+    Write the index atomically
+    records: iterable of (student id, past allocations, past average rating)
+    Returns: path of the index file
+    """
+    rows = {}
+    for student_id, allocations, avg_rating in records:
+        rows[student_key(student_id)] = (allocations or 0, avg_rating or 0)
+
+    table = np.zeros(len(rows), dtype=HISTORY_DTYPE)
+    table['key'] = np.fromiter(rows.keys(), dtype=np.uint64, count=len(rows))
+    values = np.array(list(rows.values()), dtype=np.float64).reshape(-1, 2)
+    table['past_allocations'] = values[:, 0]
+    table['past_avg_rating'] = values[:, 1]
+    table.sort(order='key')
+
+    path = Path(model_dir) / HISTORY_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Readers keep mapping the previous file until they reopen
+    tmp_path = path.with_name(f'.{HISTORY_FILE}.tmp-{os.getpid()}.npy')
+    np.save(tmp_path, table)
+    os.replace(tmp_path, path)
+    return path
+
+
+class HistoryIndex:
+    """Memory-mapped history table with vectorized lookups"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        stat = os.stat(self.path)
+        self.signature = (stat.st_mtime_ns, stat.st_size)
+        self.table = np.load(self.path, mmap_mode='r')
+
+    @classmethod
+    def from_model_dir(cls, model_dir):
+        """Index in model_dir, or None if no history has been written"""
+        path = Path(model_dir) / HISTORY_FILE
+        return cls(path) if path.exists() else None
+
+    def is_stale(self):
+        """True when the file was replaced since it was opened"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        return (stat.st_mtime_ns, stat.st_size) != self.signature
+
+    def lookup(self, student_ids):
+        """
+        History of each student id (unknown or missing ids -> 0)
+        Returns: (past allocations, past average rating) float64 arrays
+        """
+        n = len(student_ids)
+        allocations = np.zeros(n, dtype=np.float64)
+        avg_rating = np.zeros(n, dtype=np.float64)
+        if n == 0 or len(self.table) == 0:
+            return allocations, avg_rating
+
+        known = np.array([student_id is not None for student_id in student_ids], dtype=bool)
+        keys = np.fromiter(
+            (student_key(student_id) if student_id is not None else 0 for student_id in student_ids),
+            dtype=np.uint64, count=n
+        )
+
+        table_keys = self.table['key']
+        pos = np.minimum(np.searchsorted(table_keys, keys), len(table_keys) - 1)
+        hit = known & (table_keys[pos] == keys)
+
+        allocations[hit] = self.table['past_allocations'][pos[hit]]
+        avg_rating[hit] = self.table['past_avg_rating'][pos[hit]]
+        return allocations, avg_rating
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Write the per-student history index')
+    parser.add_argument('--model-dir', type=str, default='ml/models',
+                        help='Directory the index is written to')
+    return parser.parse_args(argv)
+
+
+def main():
+    """Write the index from a {students: [{id, pastAllocations, pastAvgRating}]} request"""
+    args = parse_args()
+
+    try:
+        request = json.loads(sys.stdin.read())
+        students = request.get('students', [])
+
+        path = save_history(args.model_dir, (
+            (s.get('id'), s.get('pastAllocations'), s.get('pastAvgRating')) for s in students
+        ))
+
+        print(json.dumps({
+            'success': True,
+            'students': len(students),
+            'path': str(path)
+        }))
+
+    except Exception as e:
+        print(json.dumps({
+            'success': False,
+            'error': str(e)
+        }))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,93 +4,367 @@ ML Model Prediction Service
 Loads trained model and makes match quality predictions
 """
 
+import os
 import sys
 import json
+import time
+import hashlib
+import argparse
 import numpy as np
-import pandas as pd
 import joblib
 from pathlib import Path
+from contextlib import nullcontext
+
+from features import build_feature_matrix
+from confidence import tree_mean_std, format_confidence_results, confidence_from_std
+from flat_forest import FlatForest
+from artifact import ARTIFACTS_DIR, LATEST_FILE, latest_artifact_path, load_artifact
+from prediction_cache import PredictionCache, DEFAULT_MAX_ENTRIES, KIND_SCORE, KIND_CONFIDENCE
+from history import HistoryIndex
+from distill import DISTILLED_FILE, load_distilled
+from profiling import StageTimer, ServerCounters, Profiler, process_age_ms
+from sharded import ShardedScorer, DEFAULT_SHARD_SIZE
+from fusion import fusion_options, fuse, top_n_per_student, fused_payload
+from attribution import DEFAULT_TOP_K, attribution_payload
+import wire
+
+# Files written by train_model.py that make up one model version
+MODEL_FILES = ('matching_model.pkl', 'scaler.pkl', 'features.json', f'{ARTIFACTS_DIR}/{LATEST_FILE}',
+               DISTILLED_FILE)
+
+# Inference backends: sklearn's per-tree predict, the flattened forest engine,
+# or the distilled additive scorer (approximate, for latency-critical single pairs)
+BACKENDS = ('sklearn', 'flat', 'distilled')
+
+# Reads of the model files before giving up on a consistent snapshot (training in progress)
+LOAD_ATTEMPTS = 3
 
 class MatchingPredictor:
-    def __init__(self, model_dir='ml/models'):
-        """Load trained model, scaler, and feature names"""
+    # Attributes replaced together by load_model()
+    MODEL_STATE = ('model', 'scaler', 'flat_forest', 'distilled', 'manifest', 'feature_names',
+                   'model_signature', 'loaded_at', 'path_forest')
+    
+    def __init__(self, model_dir='ml/models', backend='sklearn', cache_path=None,
+                 cache_size=DEFAULT_MAX_ENTRIES, timer=None, workers=1, shard_size=DEFAULT_SHARD_SIZE):
+        """
+        Load trained model, scaler, and feature names
+        cache_path: optional SQLite file for the persistent prediction cache
+        timer: optional profiling.StageTimer that records the hot-path stages
+        workers: processes for batches larger than shard_size (see sharded.py); 1 = in-process
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend} (expected one of {', '.join(BACKENDS)})")
+        
         self.model_dir = model_dir
+        self.backend = backend
         self.model = None
         self.scaler = None
+        self.flat_forest = None
+        self.distilled = None
+        self.manifest = None
         self.feature_names = None
+        self.model_signature = None
+        self.loaded_at = None
+        self.path_forest = None
+        self.history = None
+        self.timer = timer
+        self.cache = PredictionCache(cache_path, cache_size) if cache_path else None
+        workers = workers if workers else (os.cpu_count() or 1)
+        self.sharded = ShardedScorer(model_dir, backend, workers, shard_size) if workers > 1 else None
         self.load_model()
     
+    def stage(self, name, rows=None):
+        """Timing context for one hot-path stage (no-op unless profiling)"""
+        return self.timer.stage(name, rows) if self.timer is not None else nullcontext()
+    
     def load_model(self):
-        """Load the trained model from disk"""
+        """
+        Load the trained model from disk
+        Training renames each file into place, so if the files change while they
+        are being read (a mix of two versions), the load is repeated.
+        """
+        with self.stage('load_model'):
+            for _ in range(LOAD_ATTEMPTS):
+                signature = self._load_files()
+                if self.get_model_signature() == signature:
+                    return
+            
+            # Still changing: keep what was loaded; the next reload_if_changed() retries
+            self.model_signature = None
+    
+    def _load_files(self):
+        """
+        Read the model files once; returns the file signature taken before reading
+        Every file is read before any attribute is replaced, so a file that fails
+        to load leaves the previous model in place as a whole
+        """
         try:
             model_path = Path(self.model_dir)
             
             if not model_path.exists():
                 raise FileNotFoundError(f"Model directory not found: {self.model_dir}")
             
-            self.model = joblib.load(f'{self.model_dir}/matching_model.pkl')
-            self.scaler = joblib.load(f'{self.model_dir}/scaler.pkl')
+            # Read the signature first so a model written mid-load is picked up next time
+            signature = self.get_model_signature()
+            artifact_path = latest_artifact_path(self.model_dir) if self.backend == 'flat' else None
+            state = dict.fromkeys(self.MODEL_STATE)
             
-            with open(f'{self.model_dir}/features.json', 'r') as f:
-                self.feature_names = json.load(f)
+            if self.backend == 'distilled':
+                # Bin tables only: no forest is loaded at all
+                state['distilled'] = load_distilled(self.model_dir)
+                state['feature_names'] = state['distilled'].feature_names
+            elif artifact_path is not None:
+                # Memory-mapped tree arrays: no unpickling, pages shared across processes
+                state['flat_forest'], state['manifest'] = load_artifact(artifact_path)
+                state['feature_names'] = state['manifest']['feature_names']
+            else:
+                state['model'] = joblib.load(f'{self.model_dir}/matching_model.pkl')
+                state['scaler'] = joblib.load(f'{self.model_dir}/scaler.pkl')
+                
+                with open(f'{self.model_dir}/features.json', 'r') as f:
+                    state['feature_names'] = json.load(f)
+                
+                if self.backend == 'flat':
+                    # Scaler is folded into the thresholds, so it runs on raw features
+                    state['flat_forest'] = FlatForest.from_sklearn(state['model'], state['scaler'])
+            
+            state['model_signature'] = signature
+            state['loaded_at'] = time.time()
+            for name, value in state.items():
+                setattr(self, name, value)
+            return signature
                 
         except Exception as e:
             raise Exception(f"Failed to load model: {str(e)}")
     
+    def get_model_signature(self):
+        """
+        Fingerprint of the model files on disk (name, mtime, size)
+        Used by server mode to detect a retrained model
+        """
+        signature = []
+        for name in MODEL_FILES:
+            try:
+                stat = Path(self.model_dir, name).stat()
+                signature.append((name, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append((name, None, None))
+        return tuple(signature)
+    
+    def reload_if_changed(self):
+        """
+        Reload the model when the files in model_dir changed since the last load.
+        Keeps serving the previous model if the new files cannot be loaded yet
+        (e.g. training is still writing them) and retries on the next call.
+        Returns True if a reload happened.
+        """
+        if self.get_model_signature() == self.model_signature:
+            return False
+        
+        try:
+            self.reload()
+            return True
+        except Exception:
+            return False
+    
+    def reload(self):
+        """Load the model files now; on failure the previous model is restored and the error raised"""
+        previous = {name: getattr(self, name) for name in self.MODEL_STATE}
+        try:
+            self.load_model()
+        except Exception:
+            for name, value in previous.items():
+                setattr(self, name, value)
+            raise
+    
+    def current_history(self):
+        """History index in model_dir (reopened when the file is replaced), or None"""
+        if self.history is None or self.history.is_stale():
+            self.history = HistoryIndex.from_model_dir(self.model_dir)
+        return self.history
+    
+    def close(self):
+        """Shut down the worker pool (if any) and the prediction cache"""
+        if self.sharded is not None:
+            self.sharded.close()
+        if self.cache is not None:
+            self.cache.close()
+    
+    def join_history(self, data, X):
+        """
+        Fill past_allocation_count / past_avg_rating from the history index for
+        records that carry a studentId but no history fields of their own
+        """
+        rows = [k for k, item in enumerate(data) if 'studentId' in item and 'pastAllocations' not in item]
+        if not rows:
+            return X
+        
+        with self.stage('history_join', len(rows)):
+            history = self.current_history()
+            if history is None:
+                return X
+            
+            allocations, avg_rating = history.lookup([data[k]['studentId'] for k in rows])
+            for name, values in (('past_allocation_count', allocations), ('past_avg_rating', avg_rating)):
+                if name in self.feature_names:
+                    X[rows, self.feature_names.index(name)] = values
+        return X
+    
     def prepare_features(self, data):
         """
         Extract features from input data
         Must match the feature engineering in training
+        Returns: float64 matrix with columns in features.json order
         """
-        features = []
+        with self.stage('prepare_features', len(data)):
+            X = build_feature_matrix(data, self.feature_names)
+        return self.join_history(data, X)
+    
+    def scale_features(self, X):
+        """
+        Apply the fitted StandardScaler (same arithmetic as scaler.transform,
+        without sklearn's per-call validation)
+        """
+        X = np.array(X, dtype=np.float64)
+        if self.scaler.with_mean:
+            X -= self.scaler.mean_
+        if self.scaler.with_std:
+            X /= self.scaler.scale_
+        return X
+    
+    @property
+    def model_version(self):
+        """
+        Identifies the loaded model: artifact version, else the model file fingerprint
+        The distilled scorer approximates the forest, so it gets its own version
+        (cache entries are never shared with the sklearn / flat backends, which agree exactly)
+        """
+        if self.manifest is not None:
+            return self.manifest['version']
+        version = hashlib.sha1(repr(self.model_signature).encode()).hexdigest()
+        return f'{version}:distilled' if self.distilled is not None else version
+    
+    def use_shards(self, X):
+        """Whether X is large enough to be split across the worker pool"""
+        return self.sharded is not None and len(X) > self.sharded.shard_size
+    
+    def evaluate(self, X):
+        """Clipped scores for a feature matrix, bypassing the cache"""
+        if self.model is None and self.flat_forest is None and self.distilled is None:
+            raise Exception("Model not loaded")
         
-        for item in data:
-            feature_dict = {
-                # Skills matching features
-                'skill_overlap_count': item.get('skillOverlapCount', 0),
-                'skill_overlap_ratio': item.get('skillOverlapRatio', 0),
-                'avg_skill_level': item.get('avgSkillLevel', 0),
-                'max_skill_level': item.get('maxSkillLevel', 0),
-                
-                # Academic features
-                'gpa': item.get('gpa', 0),
-                'gpa_normalized': item.get('gpa', 0) / 10.0,
-                
-                # Domain/interest alignment
-                'domain_match': 1 if item.get('domainMatch', False) else 0,
-                
-                # Location features
-                'location_match': 1 if item.get('locationMatch', False) else 0,
-                'location_preference': item.get('locationPreference', 0),
-                
-                # Internship characteristics
-                'internship_duration': item.get('duration', 0),
-                'stipend_amount': item.get('stipend', 0) / 1000.0,
-                
-                # Student experience
-                'total_skills': item.get('totalSkills', 0),
-                'verified_skills': item.get('verifiedSkills', 0),
-                
-                # Historical performance
-                'past_allocation_count': item.get('pastAllocations', 0),
-                'past_avg_rating': item.get('pastAvgRating', 0),
-            }
-            features.append(feature_dict)
+        if self.use_shards(X):
+            with self.stage('evaluate', len(X)):
+                return self.sharded.score(X, self.model_version)[0]
+        
+        if self.distilled is not None:
+            with self.stage('evaluate', len(X)):
+                return np.clip(self.distilled.predict(X), 0, 1)
+        
+        if self.flat_forest is not None:
+            with self.stage('evaluate', len(X)):
+                return np.clip(self.flat_forest.predict(X), 0, 1)
+        
+        # Scale features
+        with self.stage('scale', len(X)):
+            X_scaled = self.scale_features(X)
+        
+        # Predict
+        with self.stage('evaluate', len(X)):
+            predictions = self.model.predict(X_scaled)
+        
+        # Clip predictions to valid range [0, 1]
+        return np.clip(predictions, 0, 1)
+    
+    def evaluate_with_std(self, X):
+        """Clipped scores and tree std-devs for a feature matrix, bypassing the cache"""
+        if self.model is None and self.flat_forest is None and self.distilled is None:
+            raise Exception("Model not loaded")
+        
+        if self.use_shards(X):
+            with self.stage('evaluate', len(X)):
+                return self.sharded.score(X, self.model_version, with_std=True)
+        
+        if self.distilled is not None:
+            # Distilled approximation of the tree std-dev
+            with self.stage('evaluate', len(X)):
+                predictions, std_dev = self.distilled.predict_mean_std(X)
+        elif self.flat_forest is not None:
+            with self.stage('evaluate', len(X)):
+                predictions, std_dev = self.flat_forest.predict_mean_std(X)
+        else:
+            with self.stage('scale', len(X)):
+                X_scaled = self.scale_features(X)
+            
+            # Mean and std of the individual tree predictions (chunked, multi-threaded)
+            with self.stage('evaluate', len(X)):
+                predictions, std_dev = tree_mean_std(self.model, X_scaled)
         
-        df = pd.DataFrame(features)
+        # Clip to valid range
+        return np.clip(predictions, 0, 1), std_dev
+    
+    def _through_cache(self, X, kind, compute):
+        """Serve cached rows and compute (then store) only the missing ones"""
+        with self.stage('cache_lookup', len(X)):
+            keys = self.cache.keys_for(self.model_version, kind, X)
+            found = self.cache.get_many(keys)
         
-        # Ensure all expected features are present
-        for feature in self.feature_names:
-            if feature not in df.columns:
-                df[feature] = 0
+        scores = np.empty(len(keys), dtype=np.float64)
+        std_dev = np.empty(len(keys), dtype=np.float64)
+        missing = []
+        for i, key in enumerate(keys):
+            cached = found.get(key)
+            if cached is None:
+                missing.append(i)
+            else:
+                scores[i], std_dev[i] = cached[0], np.nan if cached[1] is None else cached[1]
         
-        # Reorder columns to match training
-        df = df[self.feature_names]
+        if missing:
+            missing = np.array(missing, dtype=np.int64)
+            new_scores, new_std = compute(X[missing])
+            scores[missing] = new_scores
+            if new_std is not None:
+                std_dev[missing] = new_std
+            with self.stage('cache_store', len(missing)):
+                self.cache.put_many([keys[i] for i in missing], new_scores, new_std)
         
-        # Handle missing values
-        df = df.fillna(0)
+        return scores, std_dev
+    
+    def score_matrix(self, X):
+        """Clipped scores for a feature matrix (through the cache when enabled)"""
+        if self.cache is None:
+            return self.evaluate(X)
         
-        return df
+        scores, _ = self._through_cache(X, KIND_SCORE, lambda rows: (self.evaluate(rows), None))
+        return scores
+    
+    def score_matrix_with_std(self, X):
+        """Clipped scores and std-devs for a feature matrix (through the cache when enabled)"""
+        if self.cache is None:
+            return self.evaluate_with_std(X)
+        
+        return self._through_cache(X, KIND_CONFIDENCE, self.evaluate_with_std)
+    
+    def contributions(self, X):
+        """
+        Per-feature decomposition of the unclipped scores of a feature matrix
+        (see attribution.py). The sklearn forest is flattened on first use,
+        once per loaded model.
+        Returns: (baseline, (n_rows, n_features) contributions)
+        """
+        if self.model is None and self.flat_forest is None and self.distilled is None:
+            raise Exception("Model not loaded")
+        
+        with self.stage('explain', len(X)):
+            if self.distilled is not None:
+                return self.distilled.contributions(X)
+            
+            if self.flat_forest is not None:
+                return self.flat_forest.contributions(X)
+            
+            if self.path_forest is None:
+                self.path_forest = FlatForest.from_sklearn(self.model, self.scaler)
+            return self.path_forest.contributions(X)
     
     def predict(self, input_data):
         """
@@ -98,64 +372,398 @@ class MatchingPredictor:
         input_data: List of dicts with feature data
         Returns: List of predicted scores (0-1)
         """
-        if not self.model:
-            raise Exception("Model not loaded")
-        
         # Prepare features
         X = self.prepare_features(input_data)
         
-        # Scale features
-        X_scaled = self.scaler.transform(X)
-        
-        # Predict
-        predictions = self.model.predict(X_scaled)
-        
-        # Clip predictions to valid range [0, 1]
-        predictions = np.clip(predictions, 0, 1)
-        
-        return predictions.tolist()
+        return self.score_matrix(X).tolist()
     
     def predict_with_confidence(self, input_data):
         """
         Make predictions with confidence intervals using tree variance
         """
-        if not self.model:
-            raise Exception("Model not loaded")
-        
         X = self.prepare_features(input_data)
-        X_scaled = self.scaler.transform(X)
         
-        # Get predictions from all trees
-        tree_predictions = np.array([tree.predict(X_scaled) for tree in self.model.estimators_])
+        predictions, std_dev = self.score_matrix_with_std(X)
         
-        # Calculate mean and std
-        predictions = np.mean(tree_predictions, axis=0)
-        std_dev = np.std(tree_predictions, axis=0)
-        
-        # Clip to valid range
-        predictions = np.clip(predictions, 0, 1)
+        return format_confidence_results(predictions, std_dev)
+    
+    def explain(self, input_data, top_k=DEFAULT_TOP_K, include_confidence=False):
+        """
+        Predictions with each pair's baseline and top_k feature contributions
+        Features are prepared once for both the scores and the attributions.
+        """
+        X = self.prepare_features(input_data)
         
-        results = []
-        for pred, std in zip(predictions, std_dev):
-            results.append({
-                'score': float(pred),
-                'confidence': float(1 - min(std, 0.5) / 0.5),  # Normalize to 0-1
-                'std_dev': float(std)
-            })
+        if include_confidence:
+            predictions, std_dev = self.score_matrix_with_std(X)
+            results = format_confidence_results(predictions, std_dev)
+        else:
+            results = [{'score': score} for score in self.score_matrix(X).tolist()]
         
+        baseline, contributions = self.contributions(X)
+        for result, attribution in zip(results, attribution_payload(baseline, contributions,
+                                                                    self.feature_names, top_k)):
+            result.update(attribution)
         return results
 
+def run_fused_prediction(predictor, request):
+    """
+    Score a request carrying rule scores and return only the fused survivors
+    {data, ruleScores, fusion: {mlWeight, ruleWeight, cutoff, topN}, rows?, cols?}
+    Without rows / cols, rows are the pairs' positions in data (cols are 0).
+    """
+    prediction_data = request['data']
+    rule_scores = request.get('ruleScores')
+    if rule_scores is None or len(rule_scores) != len(prediction_data):
+        raise ValueError('Fusion needs one rule score per prediction record (ruleScores)')
+    
+    options = fusion_options(request.get('fusion'))
+    rows = request.get('rows', range(len(prediction_data)))
+    cols = request.get('cols', [0] * len(prediction_data))
+    if len(rows) != len(prediction_data) or len(cols) != len(prediction_data):
+        raise ValueError('rows and cols must have one entry per prediction record')
+    
+    X = predictor.prepare_features(prediction_data)
+    confidence = None
+    if request.get('includeConfidence', False):
+        scores, std_dev = predictor.score_matrix_with_std(X)
+        confidence = confidence_from_std(std_dev)
+    else:
+        scores = predictor.score_matrix(X)
+    
+    pairs = fuse(np.fromiter(rows, dtype=np.int64, count=len(prediction_data)), cols, scores, rule_scores,
+                 confidence, options['ml_weight'], options['rule_weight'], options['cutoff'])
+    return fused_payload(top_n_per_student(pairs, options['top_n']))
+
+def result_key(request):
+    """Response field of run_prediction's result: "fused" for fusion requests"""
+    return 'fused' if request.get('fusion') is not None else 'predictions'
+
+def run_prediction(predictor, request):
+    """
+    Score one request payload ({data, includeConfidence, explain}) with a loaded predictor
+    "explain": k (or true for DEFAULT_TOP_K) adds each pair's top feature contributions.
+    Requests with "fusion" return fused survivors instead (see run_fused_prediction).
+    """
+    prediction_data = request.get('data', [])
+    include_confidence = request.get('includeConfidence', False)
+    
+    if not prediction_data:
+        raise ValueError('No prediction data provided')
+    
+    if request.get('fusion') is not None:
+        return run_fused_prediction(predictor, request)
+    
+    explain = request.get('explain')
+    if explain:
+        top_k = DEFAULT_TOP_K if explain is True else int(explain)
+        return predictor.explain(prediction_data, top_k, include_confidence)
+    
+    if include_confidence:
+        return predictor.predict_with_confidence(prediction_data)
+    
+    scores = predictor.predict(prediction_data)
+    return [{'score': score} for score in scores]
+
+def encode_response(payload, timer=None, include_profile=True):
+    """
+    JSON text of a response payload
+    With a timer, serialization is timed as its own stage and, if requested,
+    the stage report is appended as "profile" (it has to be taken after json.dumps).
+    """
+    if timer is None:
+        return json.dumps(payload)
+    
+    with timer.stage('serialize'):
+        text = json.dumps(payload)
+    if not include_profile:
+        return text
+    return text[:-1] + ', "profile": ' + json.dumps(timer.report()) + '}'
+
+def stream_predictions(predictor, in_stream, out_stream, batch_size=2048, include_confidence=False):
+    """
+    Streaming mode - one feature record per input line (NDJSON)
+    Records are scored in fixed-size batches and each batch is written as soon
+    as it is ready, so memory stays flat regardless of the total pair count:
+        {"success": true, "offset": 0, "predictions": [...]}
+        ...
+        {"success": true, "done": true, "count": 10000}
+    With predictor.timer set, the done line carries the cumulative "profile".
+    Returns the number of records scored.
+    """
+    def emit(payload):
+        with predictor.stage('serialize'):
+            text = json.dumps(payload)
+        out_stream.write(text + '\n')
+        out_stream.flush()
+    
+    def score(batch, offset):
+        predictions = run_prediction(predictor, {
+            'data': batch,
+            'includeConfidence': include_confidence
+        })
+        emit({
+            'success': True,
+            'offset': offset,
+            'predictions': predictions
+        })
+    
+    offset = 0
+    batch = []
+    
+    for line in in_stream:
+        line = line.strip()
+        if not line:
+            continue
+        
+        with predictor.stage('parse'):
+            batch.append(json.loads(line))
+        if len(batch) >= batch_size:
+            score(batch, offset)
+            offset += len(batch)
+            batch = []
+    
+    if batch:
+        score(batch, offset)
+        offset += len(batch)
+    
+    done = {
+        'success': True,
+        'done': True,
+        'count': offset
+    }
+    if predictor.timer is not None:
+        done['profile'] = predictor.timer.report()
+    emit(done)
+    return offset
+
+def serve(model_dir='ml/models', in_stream=None, out_stream=None, backend='sklearn',
+          cache_path=None, cache_size=DEFAULT_MAX_ENTRIES, profile=False, profile_out=None,
+          workers=1, shard_size=DEFAULT_SHARD_SIZE):
+    """
+    Long-lived server mode - newline-delimited JSON over stdin/stdout
+    Loads the model once and answers one response line per request line:
+        {"id": 1, "op": "predict", "data": [...], "includeConfidence": true}
+        {"id": 2, "op": "ping"}
+        {"id": 3, "op": "reload"}
+        {"id": 4, "op": "stats"}
+        {"id": 5, "op": "predict", "data": [...], "explain": 3}
+    The model is reloaded automatically when the files in model_dir change.
+    Every predict request is timed per stage into cumulative counters (the
+    "stats" op); its own breakdown is returned as "profile" when the request
+    sets "profile": true or the server runs with profile=True.
+    """
+    in_stream = in_stream or sys.stdin
+    out_stream = out_stream or sys.stdout
+    
+    def respond(payload, timer=None, include_profile=False):
+        out_stream.write(encode_response(payload, timer, include_profile) + '\n')
+        out_stream.flush()
+    
+    counters = ServerCounters()
+    profiler = Profiler(profile_out)
+    timer = StageTimer()
+    predictor = MatchingPredictor(model_dir, backend=backend, cache_path=cache_path, cache_size=cache_size,
+                                  timer=timer, workers=workers, shard_size=shard_size)
+    counters.merge(timer)
+    requests_served = 0
+    
+    try:
+        for line in in_stream:
+            line = line.strip()
+            if not line:
+                continue
+            
+            request_id = None
+            predictor.timer = timer = StageTimer()
+            try:
+                with timer.stage('parse'):
+                    request = json.loads(line)
+                request_id = request.get('id')
+                op = request.get('op', 'predict')
+                
+                if op == 'ping':
+                    predictor.reload_if_changed()
+                    respond({
+                        'id': request_id,
+                        'success': True,
+                        'status': 'ok',
+                        'modelLoadedAt': predictor.loaded_at,
+                        'requestsServed': requests_served,
+                        'cache': predictor.cache.stats() if predictor.cache else None,
+                        'stats': counters.snapshot()
+                    })
+                elif op == 'stats':
+                    profiler.dump()
+                    respond({
+                        'id': request_id,
+                        'success': True,
+                        'stats': counters.snapshot(),
+                        'profileOut': profile_out
+                    })
+                elif op == 'reload':
+                    predictor.reload()
+                    respond({
+                        'id': request_id,
+                        'success': True,
+                        'modelLoadedAt': predictor.loaded_at
+                    })
+                elif op == 'predict':
+                    with profiler.collecting():
+                        predictor.reload_if_changed()
+                        predictions = run_prediction(predictor, request)
+                        requests_served += 1
+                        respond({
+                            'id': request_id,
+                            'success': True,
+                            result_key(request): predictions
+                        }, timer, include_profile=profile or bool(request.get('profile')))
+                    counters.record(timer, len(request.get('data', [])))
+                else:
+                    raise ValueError(f"Unknown op: {op}")
+                    
+            except Exception as e:
+                counters.record_error()
+                respond({
+                    'id': request_id,
+                    'success': False,
+                    'error': str(e)
+                })
+            finally:
+                predictor.timer = None
+    finally:
+        predictor.close()
+    
+    profiler.dump()
+
+def serve_binary(model_dir='ml/models', in_stream=None, out_stream=None, backend='sklearn',
+                 cache_path=None, cache_size=DEFAULT_MAX_ENTRIES, profile_out=None,
+                 workers=1, shard_size=DEFAULT_SHARD_SIZE):
+    """
+    Long-lived server mode over the binary wire protocol (see wire.py)
+    Each request frame carries a float64 feature matrix in features.json column
+    order; each response frame carries the scores (and std-devs). Responses
+    are written in request order. Returns the number of requests served.
+    The protocol has no room for stage profiles; profile_out still collects a
+    cProfile dump, written when the input closes.
+    """
+    in_stream = in_stream or sys.stdin.buffer
+    out_stream = out_stream or sys.stdout.buffer
+    
+    predictor = MatchingPredictor(model_dir, backend=backend, cache_path=cache_path, cache_size=cache_size,
+                                  workers=workers, shard_size=shard_size)
+    profiler = Profiler(profile_out)
+    requests_served = 0
+    
+    try:
+        while True:
+            frame = wire.read_request(in_stream)
+            if frame is None:
+                profiler.dump()
+                return requests_served
+            
+            flags, columns, X = frame
+            try:
+                predictor.reload_if_changed()
+                if columns != wire.column_hash(predictor.feature_names):
+                    raise ValueError('Feature column order does not match the loaded model')
+                if X.shape[1] != len(predictor.feature_names):
+                    raise ValueError(f"Expected {len(predictor.feature_names)} feature columns, got {X.shape[1]}")
+                
+                with profiler.collecting():
+                    if flags & wire.FLAG_CONFIDENCE:
+                        scores, std_dev = predictor.score_matrix_with_std(X)
+                        wire.write_response(out_stream, scores, std_dev)
+                    else:
+                        wire.write_response(out_stream, predictor.score_matrix(X))
+                requests_served += 1
+            
+            except Exception as e:
+                wire.write_error(out_stream, e)
+    finally:
+        predictor.close()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='InternMatch AI match quality prediction')
+    parser.add_argument('--serve', action='store_true',
+                        help='Run as a long-lived NDJSON server on stdin/stdout')
+    parser.add_argument('--binary', action='store_true',
+                        help='Run as a long-lived server speaking the binary feature-matrix protocol (wire.py)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Score NDJSON feature records from stdin in batches, emitting results incrementally')
+    parser.add_argument('--batch-size', type=int, default=2048,
+                        help='Records per batch in --stream mode')
+    parser.add_argument('--confidence', action='store_true',
+                        help='Include tree-variance confidence in --stream mode')
+    parser.add_argument('--model-dir', type=str, default='ml/models',
+                        help='Directory containing the trained model files')
+    parser.add_argument('--backend', choices=BACKENDS, default='sklearn',
+                        help='Inference backend (flat = flattened forest engine, '
+                             'distilled = approximate additive scorer from distilled.json)')
+    parser.add_argument('--cache', type=str, default=None,
+                        help='SQLite file for the persistent prediction cache (disabled if omitted)')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_ENTRIES,
+                        help='Maximum cached predictions before least-recently-used eviction')
+    parser.add_argument('--profile', action='store_true',
+                        help='Attach a per-stage timing breakdown ("profile") to responses')
+    parser.add_argument('--profile-out', type=str, default=None,
+                        help='Write a cProfile (pstats) dump of the prediction hot path to this file')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes for batches larger than --shard-size (0 = one per CPU, 1 = in-process)')
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE,
+                        help='Rows per worker shard in sharded prediction')
+    return parser.parse_args(argv)
+
 def main():
     """Main prediction function - expects JSON data from stdin"""
+    args = parse_args()
+    
+    # Interpreter start-up and imports, before any of our own code ran
+    timer = StageTimer() if args.profile else None
+    if timer is not None:
+        timer.add('startup', process_age_ms())
+    
+    if args.serve or args.stream or args.binary:
+        try:
+            if args.binary:
+                serve_binary(args.model_dir, backend=args.backend,
+                             cache_path=args.cache, cache_size=args.cache_size,
+                             profile_out=args.profile_out,
+                             workers=args.workers, shard_size=args.shard_size)
+            elif args.serve:
+                serve(args.model_dir, backend=args.backend,
+                      cache_path=args.cache, cache_size=args.cache_size,
+                      profile=args.profile, profile_out=args.profile_out,
+                      workers=args.workers, shard_size=args.shard_size)
+            else:
+                predictor = MatchingPredictor(args.model_dir, backend=args.backend,
+                                              cache_path=args.cache, cache_size=args.cache_size,
+                                              timer=timer, workers=args.workers, shard_size=args.shard_size)
+                try:
+                    with Profiler(args.profile_out):
+                        stream_predictions(
+                            predictor, sys.stdin, sys.stdout,
+                            batch_size=max(1, args.batch_size),
+                            include_confidence=args.confidence
+                        )
+                finally:
+                    predictor.close()
+        except Exception as e:
+            print(json.dumps({
+                'success': False,
+                'error': str(e)
+            }))
+            sys.exit(1)
+        return
+    
     try:
         # Read input from stdin
-        input_data = sys.stdin.read()
-        request = json.loads(input_data)
+        with timer.stage('read_input') if timer else nullcontext():
+            input_data = sys.stdin.read()
+        with timer.stage('parse') if timer else nullcontext():
+            request = json.loads(input_data)
         
-        prediction_data = request.get('data', [])
-        include_confidence = request.get('includeConfidence', False)
-        
-        if not prediction_data:
+        if not request.get('data', []):
             print(json.dumps({
                 'success': False,
                 'error': 'No prediction data provided'
@@ -163,20 +771,21 @@ def main():
             sys.exit(1)
         
         # Load model and predict
-        predictor = MatchingPredictor()
-        
-        if include_confidence:
-            predictions = predictor.predict_with_confidence(prediction_data)
-        else:
-            scores = predictor.predict(prediction_data)
-            predictions = [{'score': score} for score in scores]
-        
-        result = {
-            'success': True,
-            'predictions': predictions
-        }
-        
-        print(json.dumps(result))
+        with Profiler(args.profile_out):
+            predictor = MatchingPredictor(args.model_dir, backend=args.backend,
+                                          cache_path=args.cache, cache_size=args.cache_size,
+                                          timer=timer, workers=args.workers, shard_size=args.shard_size)
+            try:
+                predictions = run_prediction(predictor, request)
+            finally:
+                predictor.close()
+            
+            result = {
+                'success': True,
+                result_key(request): predictions
+            }
+            
+            print(encode_response(result, timer))
         
     except Exception as e:
         print(json.dumps({
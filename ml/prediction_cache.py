@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Persistent Prediction Cache
+SQLite store of model outputs keyed by model version + a hash of the feature
+vector, so repeated and incremental allocation cycles only score pairs whose
+features (or the model) changed. Size-bounded with least-recently-used eviction.
+"""
+
+import time
+import hashlib
+import sqlite3
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = 2_000_000
+
+# Evict down to this fraction of max_entries so eviction runs rarely
+EVICT_TO = 0.9
+
+# SQLite bound-parameter limit per statement (stays under the old default of 999)
+_QUERY_CHUNK = 900
+
+# Key prefixes: plain predict() scores and predict_with_confidence() (score, std) pairs
+KIND_SCORE = b's'
+KIND_CONFIDENCE = b'c'
+
+
+class PredictionCache:
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = str(path)
+        self.max_entries = int(max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # WAL lets several predictor processes read while one writes
+        self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS predictions ('
+            ' key BLOB PRIMARY KEY,'
+            ' score REAL NOT NULL,'
+            ' std_dev REAL,'
+            ' last_used REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS predictions_last_used ON predictions (last_used)')
+        self.entries = self.conn.execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+
+    @staticmethod
+    def keys_for(model_version, kind, X):
+        """One 16-byte key per feature row, bound to the model version and output kind"""
+        salt = hashlib.blake2b(f'{model_version}'.encode() + kind, digest_size=16).digest()
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        return [hashlib.blake2b(row.tobytes(), digest_size=16, key=salt).digest() for row in X]
+
+    def get_many(self, keys):
+        """Cached (score, std_dev) per key; refreshes their LRU position"""
+        found = {}
+        for start in range(0, len(keys), _QUERY_CHUNK):
+            chunk = keys[start:start + _QUERY_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.conn.execute(
+                f'SELECT key, score, std_dev FROM predictions WHERE key IN ({placeholders})', chunk
+            ).fetchall()
+            found.update((key, (score, std)) for key, score, std in rows)
+
+        if found:
+            now = time.time()
+            hit_keys = list(found)
+            for start in range(0, len(hit_keys), _QUERY_CHUNK):
+                chunk = hit_keys[start:start + _QUERY_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                self.conn.execute(
+                    f'UPDATE predictions SET last_used = ? WHERE key IN ({placeholders})', [now, *chunk]
+                )
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, keys, scores, std_devs=None):
+        """Store freshly computed outputs, then evict if over max_entries"""
+        now = time.time()
+        std_devs = std_devs if std_devs is not None else [None] * len(keys)
+        # Keyed by cache key so duplicate feature rows are stored (and counted) once
+        rows = list({
+            key: (key, float(score), None if std is None else float(std), now)
+            for key, score, std in zip(keys, scores, std_devs)
+        }.values())
+
+        # Overwritten keys (another process stored them since the lookup) do not add entries
+        self.conn.execute('BEGIN IMMEDIATE')
+        existing = 0
+        for start in range(0, len(rows), _QUERY_CHUNK):
+            chunk = [row[0] for row in rows[start:start + _QUERY_CHUNK]]
+            placeholders = ','.join('?' * len(chunk))
+            existing += self.conn.execute(
+                f'SELECT COUNT(*) FROM predictions WHERE key IN ({placeholders})', chunk
+            ).fetchone()[0]
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO predictions (key, score, std_dev, last_used) VALUES (?, ?, ?, ?)', rows
+        )
+        self.conn.execute('COMMIT')
+
+        self.entries += len(rows) - existing
+        if self.entries > self.max_entries:
+            self.evict()
+
+    def evict(self):
+        """Drop least-recently-used entries down to EVICT_TO * max_entries"""
+        # Other processes share the table, so recount before deleting
+        self.entries = self.conn.execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+        excess = self.entries - int(self.max_entries * EVICT_TO)
+        if excess <= 0:
+            return
+
+        self.conn.execute(
+            'DELETE FROM predictions WHERE key IN '
+            '(SELECT key FROM predictions ORDER BY last_used LIMIT ?)', (excess,)
+        )
+        self.evictions += excess
+        self.entries -= excess
+
+    def clear(self):
+        self.conn.execute('DELETE FROM predictions')
+        self.entries = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': self.entries,
+            'evictions': self.evictions,
+            'max_entries': self.max_entries
+        }
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Raw Profile Normalization
+Reads student and internship documents in either shape used by the project:
+- MongoDB documents as sent by the Node server
+  (skills [{name, level, isVerified}], requiredSkills [{skill, weight}], org.sector, vacancies, minGPA)
+- generate_full_sample_data.py records
+  (skillsRequired [{name, minLevel}], sector, capacity, requirements.minGPA)
+"""
+
+
+def _lower(value):
+    return value.lower() if isinstance(value, str) else ''
+
+
+def student_id(student):
+    """Document id as sent by mlService.serializeStudent (None for generator records)"""
+    student_id = student.get('id', student.get('_id'))
+    return None if student_id is None else str(student_id)
+
+
+def student_skills(student):
+    """[(skill name lowercased, level, isVerified)]"""
+    return [
+        (_lower(skill.get('name')), skill.get('level') or 1, bool(skill.get('isVerified', False)))
+        for skill in student.get('skills') or []
+    ]
+
+
+def internship_skills(internship):
+    """[(skill name lowercased, weight or None)]"""
+    required = internship.get('requiredSkills')
+    if required is not None:
+        return [(_lower(req.get('skill')), req.get('weight')) for req in required]
+
+    return [
+        (_lower(req.get('name')), req.get('minLevel'))
+        for req in internship.get('skillsRequired') or []
+    ]
+
+
+def student_gpa(student):
+    return (student.get('academic') or {}).get('gpa') or 0
+
+
+def student_domains(student):
+    """Lowercased preferred domains (rule-based domain score)"""
+    return {_lower(d) for d in (student.get('preferences') or {}).get('domains') or []}
+
+
+def student_locations(student):
+    """Lowercased preferred locations (rule-based location score)"""
+    return {_lower(loc) for loc in (student.get('preferences') or {}).get('locations') or []}
+
+
+def student_preferred_domain(student):
+    """Lowercased preferences.preferredDomain (ML domainMatch feature)"""
+    return _lower((student.get('preferences') or {}).get('preferredDomain'))
+
+
+def student_preferred_location(student):
+    """Lowercased preferences.preferredLocation (ML locationMatch feature)"""
+    return _lower((student.get('preferences') or {}).get('preferredLocation'))
+
+
+def internship_sector(internship):
+    org = internship.get('org')
+    sector = org.get('sector') if isinstance(org, dict) else None
+    return _lower(sector if sector is not None else internship.get('sector'))
+
+
+def internship_location(internship):
+    return _lower(internship.get('location'))
+
+
+def internship_min_gpa(internship):
+    if 'minGPA' in internship:
+        return internship.get('minGPA') or 0
+    return (internship.get('requirements') or {}).get('minGPA') or 0
+
+
+def internship_capacity(internship):
+    """Open positions: vacancies minus filled (Mongo) or capacity (generator)"""
+    if 'vacancies' in internship:
+        return max(0, (internship.get('vacancies') or 0) - (internship.get('filledCount') or 0))
+    return internship.get('capacity') or 0
+
+
+def pair_features(student, internship):
+    """
+    Model input record for one pair, mirroring mlService.extractFeatures
+    (including its use of preferences.preferredDomain / preferredLocation)
+    """
+    skills = {name: level for name, level, _ in student_skills(student)}
+    required = internship_skills(internship)
+
+    overlap_count = 0
+    total_level = 0
+    max_level = 0
+    for name, _ in required:
+        if name in skills:
+            overlap_count += 1
+            total_level += skills[name]
+            max_level = max(max_level, skills[name])
+
+    student_domain = student_preferred_domain(student)
+    student_location = student_preferred_location(student)
+    location = internship_location(internship)
+    location_match = (
+        student_location == location or
+        student_location == 'remote' or
+        location == 'remote'
+    )
+
+    return {
+        'skillOverlapCount': overlap_count,
+        'skillOverlapRatio': overlap_count / len(required) if required else 0,
+        'avgSkillLevel': total_level / overlap_count if overlap_count else 0,
+        'maxSkillLevel': max_level,
+        'gpa': student_gpa(student),
+        'domainMatch': student_domain == internship_sector(internship),
+        'locationMatch': location_match,
+        'locationPreference': 1 if location_match else 0,
+        'duration': internship.get('duration') or 0,
+        'stipend': internship.get('stipend') or 0,
+        'totalSkills': len(student.get('skills') or []),
+        'verifiedSkills': sum(1 for _, _, verified in student_skills(student) if verified),
+        'pastAllocations': 0,
+        'pastAvgRating': 0
+    }
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Hot-path Instrumentation for predict.py
+Opt-in per-stage breakdown of one request (wall ms, rows, calls), process
+memory, cumulative server counters, and cProfile dumps:
+
+    startup          interpreter start + imports, until main() runs (one-shot only)
+    read_input       reading stdin
+    parse            JSON decoding of the request
+    load_model       MatchingPredictor construction / reload
+    prepare_features records -> feature matrix
+    history_join     past_* columns from the history index
+    cache_lookup     prediction cache reads / cache_store: writes
+    scale            StandardScaler (sklearn backend)
+    evaluate         tree evaluation (and std-devs with confidence)
+    explain          per-feature contributions (requests with "explain")
+    serialize        JSON encoding of the response
+
+Dumps written with --profile-out are standard pstats files (snakeviz,
+flameprof, `python -m pstats`, gprof2dot).
+"""
+
+import os
+import sys
+import time
+import cProfile
+import resource
+from contextlib import contextmanager
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def current_rss_mb():
+    """Current resident set size, or None where /proc is not available"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def process_age_ms():
+    """Milliseconds since this process started (Linux), or None"""
+    try:
+        with open('/proc/self/stat', 'r') as f:
+            # Fields after the parenthesized command name; starttime is field 22
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime', 'r') as f:
+            uptime_s = float(f.read().split()[0])
+        return max(0.0, (uptime_s - start_ticks / os.sysconf('SC_CLK_TCK')) * 1000)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _merge_stage(stages, name, ms, calls=1, rows=None):
+    entry = stages.setdefault(name, {'ms': 0.0, 'calls': 0, 'rows': 0})
+    entry['ms'] += ms
+    entry['calls'] += calls
+    if rows is not None:
+        entry['rows'] += int(rows)
+
+
+class StageTimer:
+    """Wall time per named stage for one request (or one stream)"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            _merge_stage(self.stages, name, (time.perf_counter() - start) * 1000, rows=rows)
+
+    def add(self, name, ms, rows=None):
+        """Record a stage measured elsewhere (e.g. process startup)"""
+        if ms is not None:
+            _merge_stage(self.stages, name, ms, rows=rows)
+
+    def report(self):
+        return {
+            'stages': {name: dict(entry) for name, entry in self.stages.items()},
+            'total_ms': (time.perf_counter() - self.started) * 1000,
+            'rss_mb': current_rss_mb(),
+            'peak_rss_mb': peak_rss_mb()
+        }
+
+
+class ServerCounters:
+    """Cumulative counters of a long-lived server, returned by the 'stats' op"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.rows = 0
+        self.stages = {}
+
+    def merge(self, timer):
+        """Add a timer's stages without counting a request (e.g. the initial model load)"""
+        for name, entry in timer.stages.items():
+            _merge_stage(self.stages, name, entry['ms'], entry['calls'], entry['rows'])
+
+    def record(self, timer, rows=0):
+        self.requests += 1
+        self.rows += int(rows)
+        self.merge(timer)
+
+    def record_error(self):
+        self.errors += 1
+
+    def snapshot(self):
+        return {
+            'uptime_s': time.time() - self.started_at,
+            'requests': self.requests,
+            'errors': self.errors,
+            'rows': self.rows,
+            'stages': {name: dict(entry) for name, entry in self.stages.items()},
+            'rss_mb': current_rss_mb(),
+            'peak_rss_mb': peak_rss_mb()
+        }
+
+
+class Profiler:
+    """cProfile around the hot path, dumped as a pstats file (no-op without a path)"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.profile = cProfile.Profile() if path else None
+        self.active = False
+
+    def start(self):
+        if self.profile is not None:
+            self.profile.enable()
+            self.active = True
+
+    def stop(self):
+        if self.profile is not None:
+            self.profile.disable()
+            self.active = False
+
+    @contextmanager
+    def collecting(self):
+        """Profile a section without dumping (long-lived servers dump on demand)"""
+        self.start()
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        self.dump()
+        return False
+
+    def dump(self):
+        """Write everything collected so far (profiling continues if it was running)"""
+        if self.profile is not None:
+            # dump_stats disables the profiler
+            self.profile.dump_stats(self.path)
+            if self.active:
+                self.profile.enable()
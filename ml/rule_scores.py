@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Vectorized Rule-based Scores (TF-IDF + Cosine Similarity)
+Computes allocationService.calculateScore for every student x internship pair
+with sparse matrix products instead of one calculateSkillMatchTFIDF call per
+pair (server/utils/skillMatchingAlgorithms.js):
+
+    students     S x V   TF-IDF, tf = (level || 1) / 5
+    internships  I x V   TF-IDF, tf = (weight || 3) / 5
+    idf          ln((docs + 1) / (df + 1)) + 1 over both corpora (precomputeIDFMap)
+
+    cosine       = (students @ internships.T) / (|student| |internship|)
+    matched      = first student skill equal to, containing or contained in each
+                   required skill: (match @ required.T) counts, (level @ required.T) level sums
+    skill score  = 0.5 cosine + 0.3 matched / required + 0.2 avg matched level / 5
+    rule score   = 0.45 skill + 0.20 domain + 0.20 location + 0.15 min(gpa / 10, 1)
+
+Scores are rounded like Number.prototype.toFixed(3). The vectorized cosine sums
+in a different order than the JS loop (last-bit differences), so pairs whose
+score lies within ROUNDING_GUARD of a rounding boundary are recomputed exactly
+the way the JS does it; the rounded scores therefore match the JS output.
+
+Usage:
+  echo '{"students": [...], "internships": [...], "topN": 20}' | python3 ml/rule_scores.py
+"""
+
+import sys
+import json
+import math
+import argparse
+import numpy as np
+from decimal import Decimal, ROUND_HALF_UP
+from scipy.sparse import csr_matrix
+
+from profiles import student_skills, student_gpa, student_domains, internship_skills, internship_sector, \
+    internship_min_gpa
+
+# allocationService WEIGHTS
+SKILL_WEIGHT = 0.45
+DOMAIN_WEIGHT = 0.20
+LOCATION_WEIGHT = 0.20
+GPA_WEIGHT = 0.15
+
+# calculateSkillMatchTFIDF: cosine similarity, exact match ratio, average proficiency
+COSINE_WEIGHT = 0.5
+MATCH_RATIO_WEIGHT = 0.3
+PROFICIENCY_WEIGHT = 0.2
+
+# Required skill weight when none is given (calculateSkillMatchTFIDF: r.weight || 3)
+DEFAULT_REQUIRED_LEVEL = 3
+
+# Scaled scores closer than this to a .5 rounding boundary are recomputed exactly
+ROUNDING_GUARD = 1e-6
+
+# Students per block (bounds the block's n_students x n_internships matrices)
+DEFAULT_BLOCK_STUDENTS = 1024
+
+
+def to_fixed(values, digits=3):
+    """
+    parseFloat(x.toFixed(digits)) for non-negative values: round half up on the
+    exact binary value. Near-ties are decided with Decimal, everything else in numpy.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scale = 10.0 ** digits
+    scaled = values * scale
+    rounded = np.floor(scaled + 0.5)
+
+    near = np.abs(scaled - np.floor(scaled) - 0.5) < ROUNDING_GUARD
+    if near.any():
+        quantum = Decimal(1).scaleb(-digits)
+        flat_values, flat_rounded = values.reshape(-1), rounded.reshape(-1)
+        for k in np.flatnonzero(near.reshape(-1)):
+            flat_rounded[k] = float(Decimal(flat_values[k]).quantize(quantum, ROUND_HALF_UP).scaleb(digits))
+    return rounded / scale
+
+
+def idf_weights(students, internships):
+    """{skill: idf} as precomputeIDFMap builds it (documents with at least one skill)"""
+    documents = [{name for name, _, _ in student_skills(s)} for s in students if s.get('skills')]
+    documents += [{name for name, _ in internship_skills(i)} for i in internships if internship_skills(i)]
+
+    document_frequency = {}
+    for names in documents:
+        for name in names:
+            document_frequency[name] = document_frequency.get(name, 0) + 1
+
+    n_documents = len(documents)
+    return {name: math.log((n_documents + 1) / (count + 1)) + 1 for name, count in document_frequency.items()}
+
+
+def _tfidf_terms(entries, idf):
+    """Insertion-ordered {skill: tf-idf} like calculateTFIDF (a repeated skill keeps its first position)"""
+    terms = {}
+    for name, level in entries:
+        terms[name] = level / 5.0 * idf.get(name, 1.0)
+    return terms
+
+
+def _skills_match(student_name, required_name):
+    return student_name == required_name or required_name in student_name or student_name in required_name
+
+
+def js_skill_score(skills, required, idf):
+    """
+    calculateSkillMatchTFIDF(...).score for one pair, evaluated in the JS order
+    skills: [(name, level)], required: [(name, weight or None)]
+    """
+    if not required or not skills:
+        return 0.0
+
+    student_terms = _tfidf_terms(skills, idf)
+    required_terms = _tfidf_terms([(name, weight or DEFAULT_REQUIRED_LEVEL) for name, weight in required], idf)
+
+    dot = magnitude_a = magnitude_b = 0.0
+    for name in list(student_terms) + [name for name in required_terms if name not in student_terms]:
+        a = student_terms.get(name, 0)
+        b = required_terms.get(name, 0)
+        dot += a * b
+        magnitude_a += a * a
+        magnitude_b += b * b
+    magnitude_a = math.sqrt(magnitude_a)
+    magnitude_b = math.sqrt(magnitude_b)
+    similarity = 0 if magnitude_a == 0 or magnitude_b == 0 else dot / (magnitude_a * magnitude_b)
+
+    levels = []
+    for required_name, _ in required:
+        for name, level in skills:
+            if _skills_match(name, required_name):
+                levels.append(level)
+                break
+
+    match_ratio = len(levels) / len(required)
+    proficiency = sum(levels) / len(levels) / 5 if levels else 0
+    score = similarity * COSINE_WEIGHT + match_ratio * MATCH_RATIO_WEIGHT + proficiency * PROFICIENCY_WEIGHT
+    return float(to_fixed(min(score, 1.0)))
+
+
+class RuleScoreEngine:
+    """TF-IDF matrices, skill match matrices and the other rule components for fixed populations"""
+
+    def __init__(self, students, internships, idf=None):
+        self.n_students = len(students)
+        self.n_internships = len(internships)
+        self.idf = idf if idf is not None else idf_weights(students, internships)
+
+        # Per-pair inputs kept for the exact recomputation near rounding boundaries
+        self.skills = [[(name, level) for name, level, _ in student_skills(s)] for s in students]
+        self.required = [internship_skills(i) for i in internships]
+
+        vocabulary = {}
+        for entries in self.skills + self.required:
+            for name, _ in entries:
+                vocabulary.setdefault(name, len(vocabulary))
+        self.vocabulary = vocabulary
+        n_terms = len(vocabulary)
+
+        self.student_tfidf = self._tfidf_matrix(self.skills, n_terms)
+        self.internship_tfidf = self._tfidf_matrix(
+            [[(name, weight or DEFAULT_REQUIRED_LEVEL) for name, weight in entries] for entries in self.required],
+            n_terms
+        )
+        self.student_norm = np.sqrt(np.asarray(self.student_tfidf.multiply(self.student_tfidf).sum(axis=1)).ravel())
+        self.internship_norm = np.sqrt(
+            np.asarray(self.internship_tfidf.multiply(self.internship_tfidf).sum(axis=1)).ravel()
+        )
+
+        self._build_match_matrices(n_terms)
+
+        self.n_required = np.array([len(entries) for entries in self.required], dtype=np.float64)
+        self.has_skills = np.array([len(entries) > 0 for entries in self.skills], dtype=bool)
+        self.gpa = np.array([student_gpa(s) for s in students], dtype=np.float64)
+        self.gpa_score = np.minimum(self.gpa / 10, 1.0)
+        self.min_gpa = np.array([internship_min_gpa(i) for i in internships], dtype=np.float64)
+        self.domain_match = self._membership(
+            [student_domains(s) for s in students],
+            [internship_sector(i) for i in internships]
+        )
+        # calculateScore compares locations case-sensitively
+        self.location_match = self._membership(
+            [set((s.get('preferences') or {}).get('locations') or []) for s in students],
+            [i.get('location') or '' for i in internships]
+        )
+
+    def _tfidf_matrix(self, documents, n_terms):
+        rows, cols, values = [], [], []
+        for d, entries in enumerate(documents):
+            for name, value in _tfidf_terms(entries, self.idf).items():
+                rows.append(d)
+                cols.append(self.vocabulary[name])
+                values.append(value)
+        return csr_matrix((values, (rows, cols)), shape=(len(documents), n_terms), dtype=np.float64)
+
+    def _build_match_matrices(self, n_terms):
+        """
+        matched (S x V): 1 where a student skill matches required term v
+        matched_level (S x V): level of the first such student skill
+        required_count (I x V): requirement entries per term (repeats count)
+        """
+        required_terms = sorted({self.vocabulary[name] for entries in self.required for name, _ in entries})
+        names = sorted(self.vocabulary, key=self.vocabulary.get)
+
+        # Substring relation between skill names, computed once per distinct student skill
+        related = {}
+        for entries in self.skills:
+            for name, _ in entries:
+                if name not in related:
+                    related[name] = [v for v in required_terms if _skills_match(name, names[v])]
+
+        first = {}
+        for s, entries in enumerate(self.skills):
+            for name, level in entries:
+                for v in related[name]:
+                    first.setdefault((s, v), level)
+
+        keys = np.array(list(first.keys()), dtype=np.int64).reshape(-1, 2)
+        levels = np.array(list(first.values()), dtype=np.float64)
+        shape = (self.n_students, n_terms)
+        self.matched = csr_matrix((np.ones(len(levels)), (keys[:, 0], keys[:, 1])), shape=shape)
+        self.matched_level = csr_matrix((levels, (keys[:, 0], keys[:, 1])), shape=shape)
+
+        rows, cols = [], []
+        for i, entries in enumerate(self.required):
+            for name, _ in entries:
+                rows.append(i)
+                cols.append(self.vocabulary[name])
+        self.required_count = csr_matrix(
+            (np.ones(len(rows)), (rows, cols)), shape=(self.n_internships, n_terms), dtype=np.float64
+        )
+
+    def _membership(self, student_sets, internship_keys):
+        """(S x I) bool: internship key (non-empty) in the student's set"""
+        codes = {}
+        internship_codes = np.array([codes.setdefault(key, len(codes)) if key else -1 for key in internship_keys],
+                                    dtype=np.int64)
+        rows, cols = [], []
+        for s, keys in enumerate(student_sets):
+            for key in keys:
+                if key in codes:
+                    rows.append(s)
+                    cols.append(codes[key])
+        student_codes = csr_matrix((np.ones(len(rows), dtype=bool), (rows, cols)),
+                                   shape=(len(student_sets), max(len(codes), 1)), dtype=bool)
+        return student_codes, internship_codes
+
+    def _match_block(self, membership, start, stop):
+        student_codes, internship_codes = membership
+        block = student_codes[start:stop].toarray()
+        known = internship_codes >= 0
+        match = np.zeros((stop - start, self.n_internships), dtype=bool)
+        match[:, known] = block[:, internship_codes[known]]
+        return match
+
+    def cosine_similarity(self, start=0, stop=None):
+        """Sparse (stop - start) x I TF-IDF cosine similarity, one sparse matrix product"""
+        stop = self.n_students if stop is None else stop
+        dot = (self.student_tfidf[start:stop] @ self.internship_tfidf.T).tocoo()
+        dot.data = dot.data / (self.student_norm[start + dot.row] * self.internship_norm[dot.col])
+        return dot.tocsr()
+
+    def skill_scores(self, start, stop):
+        """Dense skill scores (calculateSkillMatchTFIDF score) of students [start, stop) x internships"""
+        similarity = self.cosine_similarity(start, stop).toarray()
+        matched = (self.matched[start:stop] @ self.required_count.T).toarray()
+        level_sum = (self.matched_level[start:stop] @ self.required_count.T).toarray()
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            match_ratio = np.where(self.n_required > 0, matched / self.n_required, 0)
+            proficiency = np.where(matched > 0, level_sum / matched / 5, 0)
+        score = np.minimum(
+            similarity * COSINE_WEIGHT + match_ratio * MATCH_RATIO_WEIGHT + proficiency * PROFICIENCY_WEIGHT, 1.0
+        )
+        score[:, self.n_required == 0] = 0
+        score[~self.has_skills[start:stop]] = 0
+
+        # Last-bit differences only matter next to a rounding boundary: redo those pairs in JS order
+        scaled = score * 1000
+        near = np.argwhere(np.abs(scaled - np.floor(scaled) - 0.5) < ROUNDING_GUARD)
+        rounded = to_fixed(score)
+        for s, i in near:
+            rounded[s, i] = js_skill_score(self.skills[start + s], self.required[i], self.idf)
+        return rounded
+
+    def block(self, start, stop):
+        """
+        Rule-based scores of students [start, stop) x all internships
+        Returns: (rule scores, skill scores), both rounded like calculateScore
+        """
+        skill = self.skill_scores(start, stop)
+        domain = self._match_block(self.domain_match, start, stop).astype(np.float64)
+        location = self._match_block(self.location_match, start, stop).astype(np.float64)
+        total = (skill * SKILL_WEIGHT + domain * DOMAIN_WEIGHT + location * LOCATION_WEIGHT +
+                 self.gpa_score[start:stop, None] * GPA_WEIGHT)
+        return to_fixed(total), skill
+
+    def pairs(self, rows, cols, block_students=DEFAULT_BLOCK_STUDENTS):
+        """Rule scores of arbitrary (student, internship) pairs, row-aligned with the index arrays"""
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        scores = np.zeros(len(rows), dtype=np.float64)
+        if len(rows) == 0:
+            return scores
+
+        for start in range(int(rows.min()), int(rows.max()) + 1, block_students):
+            stop = start + block_students
+            members = np.flatnonzero((rows >= start) & (rows < stop))
+            if len(members):
+                rule, _ = self.block(start, min(stop, self.n_students))
+                scores[members] = rule[rows[members] - start, cols[members]]
+        return scores
+
+    def eligible(self, start, stop):
+        """GPA hard constraint for students [start, stop) x internships (runBatchAllocation pre-filter)"""
+        return self.gpa[start:stop, None] >= self.min_gpa[None, :]
+
+    def iter_blocks(self, block_students=DEFAULT_BLOCK_STUDENTS, top_n=None, eligible_only=True):
+        """
+        Sparse rule scores in student blocks
+        top_n: keep only each student's top-N internships by rule score (ties by internship order)
+        Yields: (student indices, internship indices, rule scores, skill scores)
+        """
+        block_students = max(1, int(block_students))
+        for start in range(0, self.n_students, block_students):
+            stop = min(start + block_students, self.n_students)
+            rule, skill = self.block(start, stop)
+            keep = self.eligible(start, stop) if eligible_only else np.ones(rule.shape, dtype=bool)
+
+            if top_n is not None and top_n < self.n_internships:
+                ranked = np.where(keep, rule, -np.inf)
+                order = np.argsort(-ranked, axis=1, kind='stable')[:, :top_n]
+                top = np.zeros(rule.shape, dtype=bool)
+                np.put_along_axis(top, order, True, axis=1)
+                keep &= top
+
+            rows, cols = np.nonzero(keep)
+            yield start + rows, cols, rule[rows, cols], skill[rows, cols]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Rule-based (TF-IDF + cosine) scores for every student x internship pair')
+    parser.add_argument('--block-students', type=int, default=DEFAULT_BLOCK_STUDENTS,
+                        help='Students scored per output batch')
+    parser.add_argument('--top-n', type=int, default=None,
+                        help='Keep only the top-N internships per student by rule score (also set by "topN")')
+    parser.add_argument('--all-pairs', action='store_true',
+                        help='Include pairs that fail the minimum GPA constraint')
+    return parser.parse_args(argv)
+
+
+def main():
+    """
+    Score every eligible pair of a {students, internships, topN?} request.
+    One NDJSON line per student block, then a summary line:
+        {"success": true, "offset": 0, "rows": [...], "cols": [...], "ruleScores": [...], "skillScores": [...]}
+        {"success": true, "done": true, "count": 123}
+    """
+    args = parse_args()
+
+    try:
+        request = json.loads(sys.stdin.read())
+        students = request.get('students', [])
+        internships = request.get('internships', [])
+        if not students or not internships:
+            raise ValueError('Students and internships are required')
+
+        top_n = args.top_n if args.top_n is not None else request.get('topN')
+        engine = RuleScoreEngine(students, internships)
+
+        offset = 0
+        for rows, cols, rule, skill in engine.iter_blocks(args.block_students, top_n, not args.all_pairs):
+            sys.stdout.write(json.dumps({
+                'success': True,
+                'offset': offset,
+                'rows': rows.tolist(),
+                'cols': cols.tolist(),
+                'ruleScores': rule.tolist(),
+                'skillScores': skill.tolist()
+            }) + '\n')
+            sys.stdout.flush()
+            offset += len(rows)
+
+        print(json.dumps({
+            'success': True,
+            'done': True,
+            'count': offset
+        }))
+
+    except Exception as e:
+        print(json.dumps({
+            'success': False,
+            'error': str(e)
+        }))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+What-if Allocation Simulator
+Replays runBatchAllocation for many (ML_WEIGHT, RULE_WEIGHT, cutoff) settings
+on one cohort without rerunning the batch:
+
+1. ML and rule-based scores of every eligible pair are computed once
+   (feature_tensor.py + rule_scores.py, the same engines as the python
+   feature engine)
+2. per weight pair, hybrid = ML_WEIGHT * ml + RULE_WEIGHT * rule is sorted once
+   and the greedy sort-and-fill is run once over every pair. Greedy is
+   sequential, so stopping it at any cutoff gives exactly the assignment of
+   the matches above that cutoff, and every cutoff is read off the same pass
+3. per setting: matches above the cutoff, assigned students, fill rate of the
+   open positions, mean hybrid / ML / rule score of the assignment, waitlist
+
+Scoring shards and weight pairs run in parallel with --workers. --assignment optimal solves each
+setting with assignment.py instead (much slower, one solve per setting).
+
+Cohort: {"students": [...], "internships": [...]} in either profile shape
+(generate_full_sample_data.py --output, or mlService.exportCohort), or a
+generate_full_sample_data.py --output-dir directory of NDJSON shards.
+
+Usage:
+  python3 ml/simulate.py --cohort sample_data.json --ml-weights 0:1:0.05 --cutoffs 0.2:0.6:0.01
+"""
+
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+from profiles import internship_capacity
+from predict import MatchingPredictor, BACKENDS
+from feature_tensor import PairFeatureEngine, DEFAULT_BLOCK_PAIRS
+from rule_scores import RuleScoreEngine
+from assignment import solve_assignment
+from training_data import list_shards, iter_record_chunks
+from fusion import ML_WEIGHT, RULE_WEIGHT, MATCH_CUTOFF
+
+ASSIGNMENT_MODES = ('greedy', 'optimal')
+
+# Score arrays of the cohort in each worker process (set by _init_worker)
+_cohort = None
+
+
+def parse_range(text):
+    """"0.2:0.6:0.05" -> 0.2, 0.25, ..., 0.6 (inclusive); "0.3,0.5" -> 0.3, 0.5"""
+    if ':' in text:
+        start, stop, step = (float(part) for part in text.split(':'))
+        count = int(round((stop - start) / step)) + 1
+        return [round(start + k * step, 10) for k in range(max(count, 1))]
+    return [float(part) for part in text.split(',') if part]
+
+
+def load_cohort(path):
+    """(students, internships) from a cohort JSON file or a sharded --output-dir directory"""
+    path = Path(path)
+    if path.is_dir():
+        return tuple(
+            [record for shard in list_shards(path / part) for chunk in iter_record_chunks(shard)
+             for record in chunk]
+            for part in ('students', 'internships')
+        )
+
+    with open(path, 'r') as f:
+        cohort = json.load(f)
+    return cohort.get('students', []), cohort.get('internships', [])
+
+
+def score_cohort(students, internships, predictor, block_pairs=DEFAULT_BLOCK_PAIRS):
+    """
+    ML and rule-based scores of every eligible pair, in runBatchAllocation pair order
+    Returns: (rows, cols, ml scores, rule scores)
+    """
+    engine = PairFeatureEngine(students, internships, predictor.feature_names, predictor.current_history())
+    rules = RuleScoreEngine(students, internships)
+
+    rows, cols, ml, rule = [], [], [], []
+    for block_rows, block_cols, X in engine.iter_eligible(block_pairs):
+        rows.append(block_rows)
+        cols.append(block_cols)
+        ml.append(predictor.score_matrix(X))
+        rule.append(rules.pairs(block_rows, block_cols))
+
+    if not rows:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty.astype(np.float64), empty.astype(np.float64)
+    return (np.concatenate(rows).astype(np.int64), np.concatenate(cols).astype(np.int64),
+            np.concatenate(ml), np.concatenate(rule))
+
+
+def greedy_picks(order, rows, cols, n_students, capacities):
+    """
+    Greedy sort-and-fill over pairs in the given order (allocationService)
+    rows / cols: Python lists (indexing them is much faster than numpy scalars)
+    Returns: positions of the accepted pairs, in acceptance order
+    """
+    assigned = bytearray(n_students)
+    remaining = list(capacities)
+    open_students = n_students
+    open_seats = sum(remaining)
+    picks = []
+
+    for p in order:
+        if open_students == 0 or open_seats == 0:
+            break
+        s = rows[p]
+        j = cols[p]
+        if assigned[s] or remaining[j] <= 0:
+            continue
+        assigned[s] = 1
+        remaining[j] -= 1
+        open_students -= 1
+        open_seats -= 1
+        picks.append(p)
+
+    return np.array(picks, dtype=np.int64)
+
+
+def _metrics(ml_weight, rule_weight, cutoffs, n_matches, n_assigned, hybrid_sum, ml_sum, rule_sum,
+             n_students, seats):
+    """Result rows for one weight pair, one per cutoff"""
+    results = []
+    for k, cutoff in enumerate(cutoffs):
+        assigned = int(n_assigned[k])
+        results.append({
+            'mlWeight': ml_weight,
+            'ruleWeight': rule_weight,
+            'cutoff': cutoff,
+            'matches': int(n_matches[k]),
+            'assigned': assigned,
+            'fillRate': assigned / seats if seats else 0.0,
+            'placementRate': assigned / n_students if n_students else 0.0,
+            'waitlist': n_students - assigned,
+            'meanScore': float(hybrid_sum[k]) / assigned if assigned else 0.0,
+            'meanMlScore': float(ml_sum[k]) / assigned if assigned else 0.0,
+            'meanRuleScore': float(rule_sum[k]) / assigned if assigned else 0.0,
+            'totalScore': float(hybrid_sum[k])
+        })
+    return results
+
+
+def simulate_weights(cohort, ml_weight, rule_weight, cutoffs, assignment='greedy'):
+    """Every cutoff for one (ML_WEIGHT, RULE_WEIGHT) pair"""
+    ml, rule = cohort['ml'], cohort['rule']
+    hybrid = ml * ml_weight + rule * rule_weight
+    order = np.argsort(-hybrid, kind='stable')
+    ranked = -hybrid[order]
+
+    # Matches above each cutoff are a prefix of the sorted order
+    n_matches = np.searchsorted(ranked, -np.asarray(cutoffs, dtype=np.float64), side='left')
+
+    if assignment == 'optimal':
+        totals = np.zeros((len(cutoffs), 4), dtype=np.float64)
+        for k, count in enumerate(n_matches):
+            if count == 0:
+                continue
+            pairs = order[:count]
+            chosen = solve_assignment(cohort['n_students'], cohort['rows'][pairs], cohort['cols'][pairs],
+                                      hybrid[pairs], cohort['capacities'])['assignment']
+            students = np.flatnonzero(chosen >= 0)
+            picks = cohort['pair_index'](students, chosen[students])
+            totals[k] = len(picks), hybrid[picks].sum(), ml[picks].sum(), rule[picks].sum()
+        return _metrics(ml_weight, rule_weight, cutoffs, n_matches, *totals.T, cohort['n_students'], cohort['seats'])
+
+    picks = greedy_picks(order.tolist(), cohort['rows_list'], cohort['cols_list'], cohort['n_students'],
+                         cohort['capacities_list'])
+
+    # Picks are made in descending hybrid order: the assignment at a cutoff is a prefix of them
+    n_assigned = np.searchsorted(-hybrid[picks], -np.asarray(cutoffs, dtype=np.float64), side='left')
+    prefix = lambda values: np.concatenate([[0.0], np.cumsum(values)])[n_assigned]
+    return _metrics(ml_weight, rule_weight, cutoffs, n_matches, n_assigned, prefix(hybrid[picks]),
+                    prefix(ml[picks]), prefix(rule[picks]), cohort['n_students'], cohort['seats'])
+
+
+def build_cohort(rows, cols, ml, rule, n_students, capacities):
+    """Score arrays plus the lookups every simulation reuses"""
+    capacities = np.asarray(capacities, dtype=np.int64)
+    n_internships = len(capacities)
+    pair_keys = rows * n_internships + cols
+
+    def pair_index(students, internships):
+        """Positions of the given (student, internship) pairs (pair_keys is sorted: student-major order)"""
+        return np.searchsorted(pair_keys, students * n_internships + internships)
+
+    return {
+        'rows': rows,
+        'cols': cols,
+        'ml': ml,
+        'rule': rule,
+        'rows_list': rows.tolist(),
+        'cols_list': cols.tolist(),
+        'n_students': n_students,
+        'capacities': capacities,
+        'capacities_list': capacities.tolist(),
+        'seats': int(capacities.sum()),
+        'pair_index': pair_index
+    }
+
+
+def _init_worker(rows, cols, ml, rule, n_students, capacities):
+    global _cohort
+    _cohort = build_cohort(rows, cols, ml, rule, n_students, capacities)
+
+
+def _simulate_in_worker(ml_weight, rule_weight, cutoffs, assignment):
+    return simulate_weights(_cohort, ml_weight, rule_weight, cutoffs, assignment)
+
+
+def sweep(rows, cols, ml, rule, n_students, capacities, weight_pairs, cutoffs, assignment='greedy', workers=1):
+    """
+    Simulate every weight pair x cutoff
+    Returns: list of per-setting metrics, in weight_pairs then cutoffs order
+    """
+    if workers > 1 and len(weight_pairs) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(rows, cols, ml, rule, n_students, capacities)) as pool:
+            futures = [pool.submit(_simulate_in_worker, ml_weight, rule_weight, cutoffs, assignment)
+                       for ml_weight, rule_weight in weight_pairs]
+            return [result for future in futures for result in future.result()]
+
+    cohort = build_cohort(rows, cols, ml, rule, n_students, capacities)
+    return [result for ml_weight, rule_weight in weight_pairs
+            for result in simulate_weights(cohort, ml_weight, rule_weight, cutoffs, assignment)]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='What-if sweep of allocation weights and match cutoffs')
+    parser.add_argument('--cohort', type=str, required=True,
+                        help='Cohort JSON ({students, internships}) or a sharded sample data directory')
+    parser.add_argument('--model-dir', type=str, default='ml/models',
+                        help='Directory containing the trained model files')
+    parser.add_argument('--backend', choices=BACKENDS, default='flat',
+                        help='Inference backend used to score the cohort once')
+    parser.add_argument('--ml-weights', type=str, default='0:1:0.05',
+                        help='ML_WEIGHT values, "start:stop:step" or a comma list')
+    parser.add_argument('--rule-weights', type=str, default=None,
+                        help='RULE_WEIGHT values (default: 1 - ML_WEIGHT; given values are crossed with --ml-weights)')
+    parser.add_argument('--cutoffs', type=str, default='0.2:0.6:0.01',
+                        help='Match cutoffs (hybrid score must be above), "start:stop:step" or a comma list')
+    parser.add_argument('--assignment', choices=ASSIGNMENT_MODES, default='greedy',
+                        help='greedy sort-and-fill (allocationService) or optimal (assignment.py, one solve per setting)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Processes scoring the cohort (sharded.py) and simulating weight pairs in parallel')
+    parser.add_argument('--block-pairs', type=int, default=DEFAULT_BLOCK_PAIRS,
+                        help='Pairs featurized and scored at once')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Write the report to this file instead of stdout')
+    return parser.parse_args(argv)
+
+
+def main():
+    """Score the cohort once, sweep every setting and print a JSON report"""
+    args = parse_args()
+
+    try:
+        start = time.perf_counter()
+        students, internships = load_cohort(args.cohort)
+        if not students or not internships:
+            raise ValueError('Students and internships are required')
+
+        predictor = MatchingPredictor(args.model_dir, backend=args.backend, workers=max(1, args.workers))
+        try:
+            rows, cols, ml, rule = score_cohort(students, internships, predictor, max(1, args.block_pairs))
+        finally:
+            predictor.close()
+        capacities = [internship_capacity(i) for i in internships]
+        scoring_s = time.perf_counter() - start
+
+        ml_weights = parse_range(args.ml_weights)
+        if args.rule_weights is None:
+            weight_pairs = [(w, round(1 - w, 10)) for w in ml_weights]
+        else:
+            weight_pairs = [(w, r) for w in ml_weights for r in parse_range(args.rule_weights)]
+        cutoffs = parse_range(args.cutoffs)
+
+        start = time.perf_counter()
+        settings = sweep(rows, cols, ml, rule, len(students), capacities, weight_pairs, cutoffs,
+                         args.assignment, max(1, args.workers))
+        sweep_s = time.perf_counter() - start
+
+        report = {
+            'success': True,
+            'students': len(students),
+            'internships': len(internships),
+            'seats': int(sum(capacities)),
+            'eligiblePairs': len(rows),
+            'assignment': args.assignment,
+            'current': {'mlWeight': ML_WEIGHT, 'ruleWeight': RULE_WEIGHT, 'cutoff': MATCH_CUTOFF},
+            'scoring_s': scoring_s,
+            'sweep_s': sweep_s,
+            'settings': settings
+        }
+
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(json.dumps({'success': True, 'settings': len(settings), 'output': args.output,
+                              'scoring_s': scoring_s, 'sweep_s': sweep_s}))
+        else:
+            print(json.dumps(report))
+
+    except Exception as e:
+        print(json.dumps({
+            'success': False,
+            'error': str(e)
+        }))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,82 +2,107 @@
 """
 ML Model Training Script for InternMatch AI
 Trains a Random Forest model to predict student-internship match quality
+
+Usage:
+  python3 ml/train_model.py < training.json                 # full refit
+  python3 ml/train_model.py --incremental < training.json   # add trees for new samples only
+  python3 ml/train_model.py --data shards/ --workers 4       # NDJSON / Parquet shards on disk
+  python3 ml/train_model.py --data shards/ --max-samples 200000 --stratify-bins 10
 """
 
+import os
 import sys
 import json
+import shutil
+import argparse
 import numpy as np
-import pandas as pd
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 import joblib
 from pathlib import Path
 
+from features import FEATURE_NAMES, build_feature_matrix
+from flat_forest import FlatForest
+from artifact import save_artifact, training_data_hash
+from training_data import sample_ids, load_training_data, DEFAULT_CHUNK_SIZE
+from distill import DISTILLED_FILE, distill, save_distilled
+
+# Every sample trained on so far (features, targets, sample ids), next to the model
+SNAPSHOT_FILE = 'training_snapshot.npz'
+
+# Forest hyperparameters; tune_model.py --apply writes tuned ones next to the model
+FOREST_PARAMS = {
+    'n_estimators': 100,
+    'max_depth': 10,
+    'min_samples_split': 5,
+    'min_samples_leaf': 2
+}
+HYPERPARAMS_FILE = 'hyperparams.json'
+
+# Incremental mode: trees added per update, forest size cap (oldest trees are
+# dropped beyond it), and most recent samples the new trees are fit on
+TREES_PER_UPDATE = 20
+MAX_TREES = 300
+WINDOW_SIZE = 5000
+
+def load_params(model_dir):
+    """Forest hyperparameters: FOREST_PARAMS overridden by <model_dir>/hyperparams.json"""
+    params = dict(FOREST_PARAMS)
+    path = Path(model_dir) / HYPERPARAMS_FILE
+    if path.exists():
+        with open(path, 'r') as f:
+            params.update(json.load(f).get('params', {}))
+    return params
+
+def load_snapshot(model_dir):
+    """(X, y, ids) from the last training run, or None"""
+    path = Path(model_dir) / SNAPSHOT_FILE
+    if not path.exists():
+        return None
+    with np.load(path, allow_pickle=False) as snapshot:
+        return snapshot['X'], snapshot['y'], snapshot['ids']
+
 class MatchingModelTrainer:
-    def __init__(self):
+    def __init__(self, params=None):
+        self.params = dict(FOREST_PARAMS, **(params or {}))
         self.model = None
         self.scaler = StandardScaler()
         self.feature_names = None
+        self.metrics = None
+        self.data_hash = None
+        self.snapshot = None
         
     def prepare_features(self, data):
         """
         Extract features from allocation data
-        Returns: DataFrame with engineered features
+        Returns: float64 matrix with columns in FEATURE_NAMES order
         """
-        features = []
-        
-        for item in data:
-            feature_dict = {
-                # Skills matching features
-                'skill_overlap_count': item.get('skillOverlapCount', 0),
-                'skill_overlap_ratio': item.get('skillOverlapRatio', 0),
-                'avg_skill_level': item.get('avgSkillLevel', 0),
-                'max_skill_level': item.get('maxSkillLevel', 0),
-                
-                # Academic features
-                'gpa': item.get('gpa', 0),
-                'gpa_normalized': item.get('gpa', 0) / 10.0,  # Assuming 10-point scale
-                
-                # Domain/interest alignment
-                'domain_match': 1 if item.get('domainMatch', False) else 0,
-                
-                # Location features
-                'location_match': 1 if item.get('locationMatch', False) else 0,
-                'location_preference': item.get('locationPreference', 0),
-                
-                # Internship characteristics
-                'internship_duration': item.get('duration', 0),
-                'stipend_amount': item.get('stipend', 0) / 1000.0,  # Normalize
-                
-                # Student experience
-                'total_skills': item.get('totalSkills', 0),
-                'verified_skills': item.get('verifiedSkills', 0),
-                
-                # Historical performance (if available)
-                'past_allocation_count': item.get('pastAllocations', 0),
-                'past_avg_rating': item.get('pastAvgRating', 0),
-            }
-            features.append(feature_dict)
-        
-        df = pd.DataFrame(features)
-        self.feature_names = df.columns.tolist()
-        return df
+        self.feature_names = list(FEATURE_NAMES)
+        return build_feature_matrix(data, self.feature_names)
+    
+    def extract(self, training_data):
+        """Feature matrix, targets and sample ids of a list of training records"""
+        X = self.prepare_features(training_data)
+        y = np.array([item.get('targetScore', item.get('rating', 0.5)) for item in training_data],
+                     dtype=np.float64)
+        return X, y, sample_ids(training_data, X, y)
     
     def train(self, training_data):
         """
         Train the Random Forest model
         training_data: List of dicts with features and target (success score/rating)
         """
-        if len(training_data) < 10:
+        return self.fit(*self.extract(training_data))
+    
+    def fit(self, X, y, ids):
+        """Full refit on a prepared feature matrix (FEATURE_NAMES columns) and targets"""
+        if len(y) < 10:
             raise ValueError("Need at least 10 training samples")
         
-        # Extract features and target
-        X = self.prepare_features(training_data)
-        y = np.array([item.get('targetScore', item.get('rating', 0.5)) for item in training_data])
-        
-        # Handle missing values
-        X = X.fillna(0)
+        self.feature_names = list(FEATURE_NAMES)
+        self.data_hash = training_data_hash(X, y)
+        self.snapshot = (X, y, ids)
         
         # Split data
         X_train, X_test, y_train, y_test = train_test_split(
@@ -90,10 +115,7 @@ class MatchingModelTrainer:
         
         # Train Random Forest
         self.model = RandomForestRegressor(
-            n_estimators=100,
-            max_depth=10,
-            min_samples_split=5,
-            min_samples_leaf=2,
+            **self.params,
             random_state=42,
             n_jobs=-1
         )
@@ -107,32 +129,227 @@ class MatchingModelTrainer:
         # Feature importance
         feature_importance = dict(zip(self.feature_names, self.model.feature_importances_))
         
-        return {
+        self.metrics = {
             'train_score': float(train_score),
             'test_score': float(test_score),
-            'n_samples': len(training_data),
-            'feature_importance': {k: float(v) for k, v in feature_importance.items()}
+            'n_samples': len(y),
+            'feature_importance': {k: float(v) for k, v in feature_importance.items()},
+            'mode': 'full',
+            'n_trees': len(self.model.estimators_),
+            'params': self.params
         }
+        return self.metrics
+    
+    def train_incremental(self, training_data, model_dir='ml/models', **options):
+        """Incremental update from a list of training records (see update)"""
+        return self.update(*self.extract(training_data), model_dir=model_dir, **options)
     
-    def save_model(self, model_dir='ml/models'):
-        """Save trained model and scaler"""
-        Path(model_dir).mkdir(parents=True, exist_ok=True)
+    def update(self, X, y, ids, model_dir='ml/models', trees_per_update=TREES_PER_UPDATE,
+               max_trees=MAX_TREES, window_size=WINDOW_SIZE):
+        """
+        Grow the saved forest with warm_start instead of refitting it
+        Samples already in the snapshot with an unchanged target are skipped; new
+        trees are fit on the new samples plus the most recent snapshot samples
+        (up to window_size), so the cost follows the new data, not the history.
+        The scaler is kept, since the existing trees split on its output.
+        Falls back to a full refit when there is no compatible saved model.
+        """
+        snapshot = load_snapshot(model_dir)
+        try:
+            model = joblib.load(f'{model_dir}/matching_model.pkl')
+            scaler = joblib.load(f'{model_dir}/scaler.pkl')
+            with open(f'{model_dir}/features.json', 'r') as f:
+                feature_names = json.load(f)
+        except (FileNotFoundError, EOFError):
+            model = None
+        
+        if model is None or snapshot is None or feature_names != list(FEATURE_NAMES):
+            return self.fit(X, y, ids)
+        
+        self.feature_names = feature_names
         
-        joblib.dump(self.model, f'{model_dir}/matching_model.pkl')
-        joblib.dump(self.scaler, f'{model_dir}/scaler.pkl')
+        # New samples, and known samples whose target changed (e.g. a rating arrived)
+        X_old, y_old, ids_old = snapshot
+        position = {sample_id: k for k, sample_id in enumerate(ids_old.tolist())}
+        changed = np.array([
+            position.get(sample_id) is None or y_old[position[sample_id]] != target
+            for sample_id, target in zip(ids.tolist(), y.tolist())
+        ], dtype=bool)
         
-        # Save feature names for consistency
-        with open(f'{model_dir}/features.json', 'w') as f:
-            json.dump(self.feature_names, f)
+        self.model = model
+        self.scaler = scaler
+        if not changed.any():
+            self.snapshot = snapshot
+            self.data_hash = training_data_hash(X_old, y_old)
+            self.metrics = dict(self._incremental_metrics(0, None, None), n_samples=len(ids_old))
+            return self.metrics
+        
+        X_new, y_new, ids_new = X[changed], y[changed], ids[changed]
+        
+        # Snapshot: replaced rows dropped, new rows appended (most recent last)
+        keep = ~np.isin(ids_old, ids_new)
+        X_all = np.concatenate([X_old[keep], X_new])
+        y_all = np.concatenate([y_old[keep], y_new])
+        ids_all = np.concatenate([ids_old[keep], ids_new])
+        
+        # Out-of-sample check before the new trees see the data
+        X_new_scaled = scaler.transform(X_new)
+        score_before = float(model.score(X_new_scaled, y_new)) if len(y_new) > 1 else None
+        
+        window = slice(max(0, len(y_all) - max(window_size, len(y_new))), None)
+        X_window_scaled = scaler.transform(X_all[window])
+        
+        # sklearn seeds the new trees by skipping len(estimators_) draws of random_state;
+        # once the forest is at max_trees that count stops growing and every update
+        # would reuse the same seeds, so each update gets a random_state of its own
+        trees_grown = getattr(model, 'trees_grown_', len(model.estimators_))
+        model.set_params(
+            warm_start=True,
+            n_estimators=len(model.estimators_) + trees_per_update,
+            random_state=int(np.random.SeedSequence([42, trees_grown]).generate_state(1)[0])
+        )
+        model.fit(X_window_scaled, y_all[window])
+        model.trees_grown_ = trees_grown + trees_per_update
+        
+        # Rolling forest: drop the oldest trees beyond the cap
+        if len(model.estimators_) > max_trees:
+            model.estimators_ = model.estimators_[-max_trees:]
+            model.n_estimators = max_trees
+        
+        self.snapshot = (X_all, y_all, ids_all)
+        self.data_hash = training_data_hash(X_all, y_all)
+        self.metrics = self._incremental_metrics(
+            len(y_new), score_before,
+            float(model.score(X_window_scaled, y_all[window]))
+        )
+        self.metrics['n_samples'] = len(y_all)
+        self.metrics['window_samples'] = len(y_all[window])
+        return self.metrics
+    
+    def _incremental_metrics(self, n_new, score_before, train_score):
+        feature_importance = dict(zip(self.feature_names, self.model.feature_importances_))
+        return {
+            'train_score': train_score,
+            'test_score': score_before,  # Score on the new samples before the update
+            'feature_importance': {k: float(v) for k, v in feature_importance.items()},
+            'mode': 'incremental',
+            'n_new_samples': n_new,
+            'n_trees': len(self.model.estimators_)
+        }
+    
+    def save_model(self, model_dir='ml/models', distilled=True):
+        """
+        Save trained model and scaler, plus the versioned mmap-able artifact
+        and (unless distilled=False) the distilled single-pair scorer
+        Files are written to a temporary directory and renamed into place, so a
+        reader never opens a half-written file; the artifact's LATEST pointer is
+        swapped last.
+        """
+        model_path = Path(model_dir)
+        model_path.mkdir(parents=True, exist_ok=True)
+        tmp_dir = model_path / f'.tmp-train-{os.getpid()}'
+        tmp_dir.mkdir(exist_ok=True)
+        
+        try:
+            joblib.dump(self.model, tmp_dir / 'matching_model.pkl')
+            joblib.dump(self.scaler, tmp_dir / 'scaler.pkl')
+            
+            # Save feature names for consistency
+            with open(tmp_dir / 'features.json', 'w') as f:
+                json.dump(self.feature_names, f)
+            
+            if self.snapshot is not None:
+                X, y, ids = self.snapshot
+                np.savez(tmp_dir / SNAPSHOT_FILE, X=X, y=y, ids=ids)
+                
+                # Additive approximation fitted on the forest's outputs for the same rows
+                if distilled:
+                    scorer = distill(self.model, self.scaler, self.feature_names, X)
+                    save_distilled(tmp_dir, scorer)
+                    self.metrics['distilled'] = scorer.fidelity
+            
+            for name in ('features.json', 'scaler.pkl', 'matching_model.pkl', SNAPSHOT_FILE, DISTILLED_FILE):
+                if (tmp_dir / name).exists():
+                    os.replace(tmp_dir / name, model_path / name)
+            
+            # A scorer distilled from an older forest must not outlive it
+            if not distilled:
+                (model_path / DISTILLED_FILE).unlink(missing_ok=True)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        
+        # Flattened forest for the fast-loading 'flat' prediction backend
+        save_artifact(
+            model_dir,
+            FlatForest.from_sklearn(self.model, self.scaler),
+            self.feature_names,
+            self.scaler,
+            metrics=self.metrics,
+            data_hash=self.data_hash
+        )
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Train the InternMatch AI matching model')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Add trees for new samples to the saved model instead of refitting')
+    parser.add_argument('--trees-per-update', type=int, default=TREES_PER_UPDATE,
+                        help='Trees added per incremental update')
+    parser.add_argument('--max-trees', type=int, default=MAX_TREES,
+                        help='Forest size cap in incremental mode (oldest trees are dropped)')
+    parser.add_argument('--window', type=int, default=WINDOW_SIZE,
+                        help='Most recent samples the new trees are fit on')
+    parser.add_argument('--model-dir', type=str, default='ml/models',
+                        help='Directory the model files are written to')
+    parser.add_argument('--no-distill', action='store_true',
+                        help='Skip fitting the distilled single-pair scorer (distilled.json)')
+    parser.add_argument('--data', type=str, default=None,
+                        help='Training file or directory of shards (default: JSON array on stdin)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Processes featurizing shards (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='Records featurized at once per worker')
+    parser.add_argument('--sample-rate', type=float, default=1.0,
+                        help='Keep each row with this probability')
+    parser.add_argument('--max-samples', type=int, default=None,
+                        help='Uniform sample of at most this many rows')
+    parser.add_argument('--stratify-bins', type=int, default=1,
+                        help='With --max-samples: sample evenly across this many target bins')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Sampling seed')
+    return parser.parse_args(argv)
 
 def main():
     """Main training function - expects JSON data from stdin"""
+    args = parse_args()
+    
     try:
-        # Read training data from stdin
-        input_data = sys.stdin.read()
-        training_data = json.loads(input_data)
+        data_info = None
+        if args.data:
+            # Shards are streamed and featurized in worker processes
+            X, y, ids, data_info = load_training_data(
+                args.data,
+                workers=args.workers,
+                chunk_size=args.chunk_size,
+                sample_rate=args.sample_rate,
+                max_samples=args.max_samples,
+                stratify_bins=args.stratify_bins,
+                seed=args.seed
+            )
+        else:
+            # Read training data from stdin
+            input_data = sys.stdin.read()
+            training_data = json.loads(input_data)
+            
+            if not training_data or len(training_data) == 0:
+                print(json.dumps({
+                    'success': False,
+                    'error': 'No training data provided'
+                }))
+                sys.exit(1)
+            
+            X, y, ids = MatchingModelTrainer().extract(training_data)
         
-        if not training_data or len(training_data) == 0:
+        if len(y) == 0:
             print(json.dumps({
                 'success': False,
                 'error': 'No training data provided'
@@ -140,11 +357,23 @@ def main():
             sys.exit(1)
         
         # Train model
-        trainer = MatchingModelTrainer()
-        metrics = trainer.train(training_data)
+        trainer = MatchingModelTrainer(load_params(args.model_dir))
+        if args.incremental:
+            metrics = trainer.update(
+                X, y, ids, args.model_dir,
+                trees_per_update=args.trees_per_update,
+                max_trees=args.max_trees,
+                window_size=args.window
+            )
+        else:
+            metrics = trainer.fit(X, y, ids)
+        
+        if data_info is not None:
+            metrics['data'] = data_info
         
-        # Save model
-        trainer.save_model()
+        # Save model (unless an incremental run found nothing new)
+        if metrics.get('n_new_samples', 1) > 0:
+            trainer.save_model(args.model_dir, distilled=not args.no_distill)
         
         # Return results
         result = {
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Out-of-core Training Data Pipeline
+Loads training records from a file or a directory of shards and turns them
+into the (X, y, ids) arrays train_model.py fits on, without ever holding the
+whole history as JSON or dicts:
+
+- shards: *.ndjson / *.jsonl (optionally .gz), one record per line, or *.parquet
+  (needs pyarrow) or a plain JSON array file
+- each shard is read in chunks and featurized in a worker process
+- optional sampling: --sample-rate (keep each row with probability p),
+  --max-samples (uniform sample of at most N rows) and --stratify-bins
+  (at most N / bins rows per target bin, so rare target ranges are kept)
+
+Sampling uses bottom-k random keys per shard, which the parent merges exactly:
+the union of per-shard samples still holds a uniform sample of all rows.
+"""
+
+import os
+import gzip
+import json
+import zlib
+import hashlib
+import numpy as np
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+from features import FEATURE_NAMES, build_feature_matrix
+
+SHARD_SUFFIXES = ('.ndjson', '.jsonl', '.ndjson.gz', '.jsonl.gz', '.json', '.json.gz', '.parquet')
+
+# Records featurized at once inside a worker
+DEFAULT_CHUNK_SIZE = 50000
+
+
+def sample_ids(training_data, X, y):
+    """allocationId of each sample, or a hash of its features and target when absent"""
+    ids = []
+    for k, item in enumerate(training_data):
+        sample_id = item.get('allocationId')
+        if sample_id is None:
+            digest = hashlib.blake2b(X[k].tobytes() + y[k:k + 1].tobytes(), digest_size=12)
+            sample_id = f'row:{digest.hexdigest()}'
+        ids.append(str(sample_id))
+    return np.array(ids, dtype=np.str_)
+
+
+def list_shards(path):
+    """Shard files under path (a single file, or a directory searched recursively), sorted"""
+    path = Path(path)
+    if path.is_file():
+        return [path]
+    if not path.is_dir():
+        raise FileNotFoundError(f"Training data not found: {path}")
+
+    shards = sorted(
+        p for p in path.rglob('*')
+        if p.is_file() and not p.name.startswith('.') and p.name.endswith(SHARD_SUFFIXES)
+    )
+    if not shards:
+        raise FileNotFoundError(f"No training shards ({', '.join(SHARD_SUFFIXES)}) in {path}")
+    return shards
+
+
+def _open_text(path):
+    return gzip.open(path, 'rt') if path.name.endswith('.gz') else open(path, 'r')
+
+
+def iter_record_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Lists of at most chunk_size records from one shard"""
+    path = Path(path)
+
+    if path.name.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError('Reading .parquet shards requires pyarrow (pip install pyarrow)')
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pylist()
+        return
+
+    if path.name.endswith(('.json', '.json.gz')):
+        # Plain JSON array (the stdin format), loaded whole
+        with _open_text(path) as f:
+            records = json.load(f)
+        for start in range(0, len(records), chunk_size):
+            yield records[start:start + chunk_size]
+        return
+
+    chunk = []
+    with _open_text(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            chunk.append(json.loads(line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def _bottom_k(keys, bins, n_bins, per_bin):
+    """Indices of the per_bin smallest keys within each target bin"""
+    keep = []
+    for b in range(n_bins):
+        members = np.flatnonzero(bins == b)
+        if len(members) > per_bin:
+            members = members[np.argpartition(keys[members], per_bin - 1)[:per_bin]]
+        keep.append(members)
+    return np.sort(np.concatenate(keep)) if keep else np.zeros(0, dtype=np.int64)
+
+
+def target_bins(y, n_bins):
+    """Equal-width target bins over [0, 1] (targets are normalized ratings)"""
+    return np.minimum((np.clip(y, 0, 1) * n_bins).astype(np.int64), n_bins - 1)
+
+
+def load_shard(path, chunk_size=DEFAULT_CHUNK_SIZE, sample_rate=1.0, max_samples=None,
+               stratify_bins=1, seed=42):
+    """
+    Featurize one shard (runs in a worker process)
+    Returns: (X, y, ids, sampling keys, rows read)
+    """
+    # Per-shard seed, stable across runs and worker assignment
+    rng = np.random.default_rng([seed, zlib.crc32(str(path).encode())])
+    per_bin = max(1, max_samples // stratify_bins) if max_samples else None
+
+    parts = []
+    rows_read = 0
+    for chunk in iter_record_chunks(path, chunk_size):
+        rows_read += len(chunk)
+        X = build_feature_matrix(chunk, FEATURE_NAMES)
+        y = np.array([item.get('targetScore', item.get('rating', 0.5)) for item in chunk], dtype=np.float64)
+        ids = sample_ids(chunk, X, y)
+        keys = rng.random(len(y))
+
+        if sample_rate < 1.0:
+            keep = rng.random(len(y)) < sample_rate
+            X, y, ids, keys = X[keep], y[keep], ids[keep], keys[keep]
+
+        parts.append((X, y, ids, keys))
+
+        # Keep memory bounded: shrink to the running bottom-k sample after each chunk
+        if per_bin is not None:
+            parts = [_sample_parts(parts, per_bin, stratify_bins)]
+
+    if not parts:
+        n_features = len(FEATURE_NAMES)
+        return np.zeros((0, n_features)), np.zeros(0), np.zeros(0, dtype=np.str_), np.zeros(0), rows_read
+
+    X, y, ids, keys = _concat_parts(parts)
+    return X, y, ids, keys, rows_read
+
+
+def _concat_parts(parts):
+    return tuple(np.concatenate([part[k] for part in parts]) for k in range(4))
+
+
+def _sample_parts(parts, per_bin, n_bins):
+    X, y, ids, keys = _concat_parts(parts)
+    keep = _bottom_k(keys, target_bins(y, n_bins), n_bins, per_bin)
+    return X[keep], y[keep], ids[keep], keys[keep]
+
+
+def load_training_data(path, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, sample_rate=1.0,
+                       max_samples=None, stratify_bins=1, seed=42):
+    """
+    Load every shard under path in a process pool and merge them
+    Duplicate sample ids (the same allocation in two shards) keep the last occurrence.
+    Returns: (X, y, ids, info dict)
+    """
+    shards = list_shards(path)
+    stratify_bins = max(1, int(stratify_bins or 1))
+    workers = max(1, min(workers or os.cpu_count() or 1, len(shards)))
+    options = dict(chunk_size=chunk_size, sample_rate=sample_rate, max_samples=max_samples,
+                   stratify_bins=stratify_bins, seed=seed)
+
+    if workers == 1:
+        results = [load_shard(shard, **options) for shard in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(load_shard, shard, **options) for shard in shards]
+            results = [future.result() for future in futures]
+
+    rows_read = sum(result[4] for result in results)
+    parts = [result[:4] for result in results]
+    if max_samples:
+        X, y, ids, keys = _sample_parts(parts, max(1, max_samples // stratify_bins), stratify_bins)
+    else:
+        X, y, ids, keys = _concat_parts(parts)
+
+    # Shards in name order, rows in file order; a later duplicate id wins
+    _, last = np.unique(ids[::-1], return_index=True)
+    keep = np.sort(len(ids) - 1 - last)
+    X, y, ids = X[keep], y[keep], ids[keep]
+
+    info = {
+        'shards': len(shards),
+        'workers': workers,
+        'rows_read': rows_read,
+        'rows_used': int(len(y))
+    }
+    return X, y, ids, info
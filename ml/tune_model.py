@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Hyperparameter Search for the Matching Model
+Randomized or successive-halving search over RandomForestRegressor and
+HistGradientBoostingRegressor settings. Every candidate is scored with k-fold
+cross-validation, folds running in parallel across all cores, and stops
+starting new candidates once the wall-clock budget is spent. Next to R² each
+candidate reports its inference latency (ms per --latency-rows batch and for a
+single pair, measured single-threaded), so the winner can be picked under a
+latency SLO rather than on accuracy alone.
+
+Usage:
+  python3 ml/tune_model.py < training.json
+  python3 ml/tune_model.py --data shards/ --search halving --budget 900
+  python3 ml/tune_model.py --data shards/ --slo-ms 20 --apply     # retrain with the winner
+
+--apply writes the best random forest to <model_dir>/hyperparams.json (picked
+up by every later train_model.py run) and retrains on all of the training data,
+not only the --max-samples sample the search ran on. Gradient boosting
+candidates are reported for comparison only: the flat backend and the
+tree-variance confidence in predict.py need a random forest.
+"""
+
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+from threadpoolctl import threadpool_limits
+from joblib import Parallel, delayed, effective_n_jobs
+from sklearn.ensemble import RandomForestRegressor, HistGradientBoostingRegressor
+from sklearn.model_selection import KFold
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from training_data import load_training_data
+from train_model import MatchingModelTrainer, HYPERPARAMS_FILE, load_params
+
+MODELS = ('rf', 'hgb')
+SEARCHES = ('random', 'halving')
+
+# Candidate distributions: lists are sampled uniformly
+SEARCH_SPACE = {
+    'rf': {
+        'n_estimators': [50, 100, 150, 200, 300],
+        'max_depth': [6, 8, 10, 12, 16, None],
+        'min_samples_split': [2, 5, 10, 20],
+        'min_samples_leaf': [1, 2, 4, 8],
+        'max_features': [1.0, 0.7, 0.5, 'sqrt']
+    },
+    'hgb': {
+        'max_iter': [100, 200, 400],
+        'learning_rate': [0.03, 0.05, 0.1, 0.2],
+        'max_leaf_nodes': [15, 31, 63],
+        'min_samples_leaf': [10, 20, 50],
+        'l2_regularization': [0.0, 0.1, 1.0]
+    }
+}
+
+# Successive halving: keep 1/ETA of the candidates per round, ETA x more samples
+ETA = 3
+
+# Timed predict calls per latency measurement (best / median is reported)
+LATENCY_REPEATS = 5
+
+
+def build_model(kind, params, seed):
+    """Estimator for a candidate, scaled like the production model"""
+    if kind == 'rf':
+        # One thread per model: the folds already run in parallel
+        estimator = RandomForestRegressor(**params, random_state=seed, n_jobs=1)
+    elif kind == 'hgb':
+        estimator = HistGradientBoostingRegressor(**params, random_state=seed)
+    else:
+        raise ValueError(f"Unknown model: {kind} (expected one of {', '.join(MODELS)})")
+    return make_pipeline(StandardScaler(), estimator)
+
+
+def sample_candidates(models, n_candidates, rng):
+    """n_candidates distinct (model, params) settings, spread over the models"""
+    candidates = []
+    seen = set()
+    attempts = 0
+    while len(candidates) < n_candidates and attempts < n_candidates * 20:
+        attempts += 1
+        kind = models[len(candidates) % len(models)]
+        params = {name: values[rng.integers(len(values))] for name, values in SEARCH_SPACE[kind].items()}
+        key = (kind, json.dumps(params, sort_keys=True))
+        if key not in seen:
+            seen.add(key)
+            candidates.append((kind, params))
+    return candidates
+
+
+def measure_latency(model, X, latency_rows):
+    """(ms per latency_rows batch, ms per single pair) of model.predict"""
+    batch = X[np.arange(latency_rows) % len(X)]
+    single = X[:1]
+    model.predict(single)  # warm-up
+
+    batch_times = []
+    single_times = []
+    for _ in range(LATENCY_REPEATS):
+        start = time.perf_counter()
+        model.predict(batch)
+        batch_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        model.predict(single)
+        single_times.append(time.perf_counter() - start)
+
+    return min(batch_times) * 1000, float(np.median(single_times)) * 1000
+
+
+def fit_fold(kind, params, X, y, train_idx, test_idx, latency_rows, seed, with_latency):
+    """Fit one fold; returns (R², RMSE, fit seconds, latency or None)"""
+    model = build_model(kind, params, seed)
+
+    # Gradient boosting's OpenMP threads would compete with the other folds
+    with threadpool_limits(1):
+        start = time.perf_counter()
+        model.fit(X[train_idx], y[train_idx])
+        fit_s = time.perf_counter() - start
+
+        predictions = model.predict(X[test_idx])
+        residual = y[test_idx] - predictions
+        total = y[test_idx] - y[test_idx].mean()
+        r2 = 1 - (residual @ residual) / (total @ total) if total @ total > 0 else 0.0
+        rmse = float(np.sqrt(np.mean(residual ** 2)))
+
+        latency = measure_latency(model, X[test_idx], latency_rows) if with_latency else None
+    return float(r2), rmse, fit_s, latency
+
+
+class HyperparameterSearch:
+    """Cross-validated search over candidates under a wall-clock budget"""
+
+    def __init__(self, X, y, folds=5, budget_s=600, n_jobs=-1, latency_rows=1000, seed=42):
+        self.X = X
+        self.y = y
+        self.folds = folds
+        self.budget_s = budget_s
+        self.n_jobs = n_jobs
+        self.latency_rows = latency_rows
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.started = None
+        self.exhausted = False
+
+    def remaining(self):
+        return self.budget_s - (time.perf_counter() - self.started)
+
+    def evaluate(self, parallel, candidates, n_samples, round_index):
+        """
+        Cross-validate candidates on n_samples rows (a fixed random subset)
+        Candidates are submitted in waves sized to the worker pool, and no new
+        wave starts after the budget is spent.
+        Returns: result dicts of the candidates that were evaluated
+        """
+        subset = np.sort(self.rng.permutation(len(self.y))[:n_samples])
+        X, y = self.X[subset], self.y[subset]
+        splits = list(KFold(self.folds, shuffle=True, random_state=self.seed).split(X))
+
+        wave_size = max(1, -(-effective_n_jobs(self.n_jobs) // self.folds))
+
+        results = []
+        for start in range(0, len(candidates), wave_size):
+            if self.remaining() <= 0:
+                self.exhausted = True
+                break
+
+            wave = candidates[start:start + wave_size]
+            fold_results = parallel(
+                # Latency is measured on the first fold's model only
+                delayed(fit_fold)(kind, params, X, y, train_idx, test_idx,
+                                  self.latency_rows, self.seed, fold == 0)
+                for kind, params in wave
+                for fold, (train_idx, test_idx) in enumerate(splits)
+            )
+
+            for k, (kind, params) in enumerate(wave):
+                scores = fold_results[k * self.folds:(k + 1) * self.folds]
+                r2 = np.array([score[0] for score in scores])
+                batch_ms, single_ms = scores[0][3]
+                results.append({
+                    'model': kind,
+                    'params': params,
+                    'round': round_index,
+                    'n_samples': int(n_samples),
+                    'r2_mean': float(r2.mean()),
+                    'r2_std': float(r2.std()),
+                    'rmse_mean': float(np.mean([score[1] for score in scores])),
+                    'fit_s': float(np.mean([score[2] for score in scores])),
+                    'latency_ms': batch_ms,
+                    'pairs_per_sec': self.latency_rows / (batch_ms / 1000) if batch_ms > 0 else None,
+                    'single_pair_ms': single_ms
+                })
+        return results
+
+    def run(self, candidates, search='random', min_samples=None):
+        """
+        Evaluate candidates; 'halving' starts them all on a small sample and
+        promotes the best 1/ETA to ETA x more rows until the full data is used
+        Returns: (results of the last round reached, all results)
+        """
+        self.started = time.perf_counter()
+        self.exhausted = False
+        n_total = len(self.y)
+        history = []
+
+        with Parallel(n_jobs=self.n_jobs) as parallel:
+            if search == 'random':
+                results = self.evaluate(parallel, candidates, n_total, 0)
+                history.extend(results)
+                return results, history
+
+            # Rounds so that the survivors of the last one see every row
+            n_rounds = max(1, int(np.floor(np.log(max(len(candidates), 1)) / np.log(ETA))) + 1)
+            floor = max(self.folds * 20, min_samples or 0)
+            n_samples = max(floor, int(n_total / ETA ** (n_rounds - 1)))
+
+            results = []
+            for round_index in range(n_rounds):
+                n_samples = min(n_total, n_samples)
+                round_results = self.evaluate(parallel, candidates, n_samples, round_index)
+                if not round_results:
+                    break
+                history.extend(round_results)
+                results = round_results
+                if self.exhausted or len(round_results) <= 1 or n_samples >= n_total:
+                    break
+
+                ranked = sorted(round_results, key=lambda r: r['r2_mean'], reverse=True)
+                keep = ranked[:max(1, int(np.ceil(len(ranked) / ETA)))]
+                candidates = [(r['model'], r['params']) for r in keep]
+                n_samples *= ETA
+
+            return results, history
+
+
+def select_best(results, slo_ms=None, models=MODELS):
+    """Highest mean R² among results of the given models meeting the latency SLO
+    (the fastest one if none does); None when there are no such results"""
+    pool = [r for r in results if r['model'] in models]
+    if not pool:
+        return None
+    if slo_ms is not None:
+        within = [r for r in pool if r['latency_ms'] <= slo_ms]
+        if not within:
+            return min(pool, key=lambda r: r['latency_ms'])
+        pool = within
+    return max(pool, key=lambda r: r['r2_mean'])
+
+
+def save_params(model_dir, result):
+    """Persist a random forest winner for train_model.py"""
+    path = Path(model_dir) / HYPERPARAMS_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({
+            'params': result['params'],
+            'r2_mean': result['r2_mean'],
+            'latency_ms': result['latency_ms'],
+            'tuned_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+        }, f, indent=2)
+    return path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Hyperparameter search for the InternMatch AI matching model')
+    parser.add_argument('--data', type=str, default=None,
+                        help='Training file or directory of shards (default: JSON array on stdin)')
+    parser.add_argument('--max-samples', type=int, default=None,
+                        help='Uniform sample of at most this many training rows')
+    parser.add_argument('--search', choices=SEARCHES, default='random',
+                        help='Randomized search, or successive halving over sample sizes')
+    parser.add_argument('--models', nargs='+', choices=MODELS, default=list(MODELS),
+                        help='Model families to sample candidates from')
+    parser.add_argument('--candidates', type=int, default=20,
+                        help='Candidates to sample')
+    parser.add_argument('--folds', type=int, default=5,
+                        help='Cross-validation folds')
+    parser.add_argument('--budget', type=float, default=600,
+                        help='Wall-clock budget in seconds; no candidate starts after it')
+    parser.add_argument('--n-jobs', type=int, default=-1,
+                        help='Parallel fold fits (default: all cores)')
+    parser.add_argument('--latency-rows', type=int, default=1000,
+                        help='Batch size latency is measured on')
+    parser.add_argument('--slo-ms', type=float, default=None,
+                        help='Latency SLO per --latency-rows batch; best candidate must meet it')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--apply', action='store_true',
+                        help='Save the best random forest parameters and retrain the model with them '
+                             '(on all training rows, ignoring --max-samples)')
+    parser.add_argument('--model-dir', type=str, default='ml/models',
+                        help='Model directory for --apply')
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+
+    try:
+        trainer = MatchingModelTrainer(load_params(args.model_dir))
+        full = None
+        if args.data:
+            X, y, ids, _ = load_training_data(args.data, max_samples=args.max_samples, seed=args.seed)
+        else:
+            X, y, ids = trainer.extract(json.loads(sys.stdin.read()))
+            if args.max_samples and len(y) > args.max_samples:
+                full = X, y, ids
+                keep = np.sort(np.random.default_rng(args.seed).permutation(len(y))[:args.max_samples])
+                X, y, ids = X[keep], y[keep], ids[keep]
+
+        if len(y) < args.folds * 10:
+            raise ValueError(f"Need at least {args.folds * 10} training samples for {args.folds}-fold CV")
+
+        rng = np.random.default_rng(args.seed)
+        candidates = sample_candidates(args.models, args.candidates, rng)
+
+        search = HyperparameterSearch(
+            X, y,
+            folds=args.folds,
+            budget_s=args.budget,
+            n_jobs=args.n_jobs,
+            latency_rows=args.latency_rows,
+            seed=args.seed
+        )
+        start = time.perf_counter()
+        results, history = search.run(candidates, args.search)
+        elapsed = time.perf_counter() - start
+
+        for result in history:
+            result['meets_slo'] = args.slo_ms is None or result['latency_ms'] <= args.slo_ms
+
+        best = select_best(results, args.slo_ms)
+
+        # Halving may drop every forest before the last round: use the furthest round one reached
+        forests = [r for r in history if r['model'] == 'rf']
+        last_round = max((r['round'] for r in forests), default=0)
+        best_forest = select_best([r for r in forests if r['round'] == last_round], args.slo_ms)
+
+        report = {
+            'success': True,
+            'search': args.search,
+            'folds': args.folds,
+            'n_samples': int(len(y)),
+            'budget_s': args.budget,
+            'elapsed_s': elapsed,
+            'budget_exhausted': search.exhausted,
+            'candidates_sampled': len(candidates),
+            'candidates_evaluated': len(history),
+            'slo_ms': args.slo_ms,
+            'best': best,
+            'best_forest': best_forest,
+            'results': sorted(results, key=lambda r: r['r2_mean'], reverse=True),
+            'history': history
+        }
+
+        if args.apply:
+            if best_forest is None:
+                raise ValueError('No random forest candidate was evaluated; nothing to apply')
+            report['hyperparams_path'] = str(save_params(args.model_dir, best_forest))
+
+            # The search may have run on a --max-samples subsample; the model is fit on every row
+            if args.data and args.max_samples:
+                full = load_training_data(args.data, seed=args.seed)[:3]
+            X_full, y_full, ids_full = full if full is not None else (X, y, ids)
+
+            trainer = MatchingModelTrainer(best_forest['params'])
+            report['metrics'] = trainer.fit(X_full, y_full, ids_full)
+            report['train_samples'] = int(len(y_full))
+            trainer.save_model(args.model_dir)
+
+        print(json.dumps(report))
+
+    except Exception as e:
+        print(json.dumps({
+            'success': False,
+            'error': str(e)
+        }))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Binary Wire Protocol for predict.py --binary
+Length-prefixed frames on stdin/stdout instead of JSON lines, so the feature
+matrix and the results cross the process boundary as raw little-endian float64.
+
+float64 rather than float32: many split thresholds sit exactly on training
+values (e.g. gpa / 10), so rounding the inputs to float32 moves ~10% of pairs
+to the other side of a split. float64 keeps results identical to the JSON path.
+
+Request frame:
+    magic      4s   b'IMQ1'
+    flags      u32  bit 0 = include confidence (std-devs)
+    n_rows     u32
+    n_cols     u32
+    columns    8s   first 8 bytes of sha256(','.join(feature names)), column order check
+    payload    n_rows * n_cols float64, row-major
+
+Response frame:
+    magic      4s   b'IMR1'
+    status     u32  0 = ok, 1 = error
+    n_rows     u32
+    n_outputs  u32  1 = scores, 2 = scores + std-devs
+    n_bytes    u32  payload length
+    payload    ok: n_outputs float64 columns of n_rows (scores first), error: UTF-8 message
+"""
+
+import struct
+import hashlib
+import numpy as np
+
+REQUEST_MAGIC = b'IMQ1'
+RESPONSE_MAGIC = b'IMR1'
+
+REQUEST_HEADER = struct.Struct('<4sIII8s')
+RESPONSE_HEADER = struct.Struct('<4sIIII')
+
+FLAG_CONFIDENCE = 1
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+WIRE_DTYPE = np.dtype('<f8')
+
+
+class ProtocolError(Exception):
+    """Malformed frame; the stream cannot be resynchronized"""
+
+
+def column_hash(feature_names):
+    """8-byte fingerprint of the column order (mirrored in mlService.js)"""
+    return hashlib.sha256(','.join(feature_names).encode('utf-8')).digest()[:8]
+
+
+def _read_exact(stream, n_bytes):
+    """Exactly n_bytes from a binary stream; None on a clean EOF before the first byte"""
+    chunks = []
+    remaining = n_bytes
+    while remaining:
+        chunk = stream.read(remaining)
+        if not chunk:
+            if remaining == n_bytes:
+                return None
+            raise ProtocolError('Unexpected end of stream inside a frame')
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return chunks[0] if len(chunks) == 1 else b''.join(chunks)
+
+
+def read_request(stream):
+    """
+    Next request frame from a binary stream
+    Returns: (flags, column hash, (n_rows x n_cols) float64 view of the payload), or None at EOF
+    """
+    header = _read_exact(stream, REQUEST_HEADER.size)
+    if header is None:
+        return None
+
+    magic, flags, n_rows, n_cols, columns = REQUEST_HEADER.unpack(header)
+    if magic != REQUEST_MAGIC:
+        raise ProtocolError(f'Bad request magic: {magic!r}')
+
+    payload = _read_exact(stream, n_rows * n_cols * WIRE_DTYPE.itemsize) if n_rows * n_cols else b''
+    if payload is None:
+        raise ProtocolError('Unexpected end of stream inside a frame')
+
+    # Read-only view over the received bytes, no per-value parsing or copy
+    X = np.frombuffer(payload, dtype=WIRE_DTYPE).reshape(n_rows, n_cols)
+    return flags, columns, X
+
+
+def write_request(stream, X, columns, include_confidence=False):
+    """Encode a feature matrix as a request frame (used by clients and benchmarks)"""
+    X = np.ascontiguousarray(X, dtype=WIRE_DTYPE)
+    n_rows, n_cols = X.shape
+    flags = FLAG_CONFIDENCE if include_confidence else 0
+    stream.write(REQUEST_HEADER.pack(REQUEST_MAGIC, flags, n_rows, n_cols, columns))
+    stream.write(X.tobytes())
+    stream.flush()
+
+
+def write_response(stream, scores, std_dev=None):
+    """Scores (and std-devs) as float64 columns"""
+    outputs = [scores] if std_dev is None else [scores, std_dev]
+    payload = b''.join(np.ascontiguousarray(column, dtype=WIRE_DTYPE).tobytes() for column in outputs)
+    stream.write(RESPONSE_HEADER.pack(RESPONSE_MAGIC, STATUS_OK, len(scores), len(outputs), len(payload)))
+    stream.write(payload)
+    stream.flush()
+
+
+def write_error(stream, message):
+    payload = str(message).encode('utf-8')
+    stream.write(RESPONSE_HEADER.pack(RESPONSE_MAGIC, STATUS_ERROR, 0, 0, len(payload)))
+    stream.write(payload)
+    stream.flush()
+
+
+def read_response(stream):
+    """
+    Next response frame from a binary stream
+    Returns: (scores, std-devs or None); raises Exception with the server's message on error
+    """
+    header = _read_exact(stream, RESPONSE_HEADER.size)
+    if header is None:
+        raise ProtocolError('Prediction server closed the stream')
+
+    magic, status, n_rows, n_outputs, n_bytes = RESPONSE_HEADER.unpack(header)
+    if magic != RESPONSE_MAGIC:
+        raise ProtocolError(f'Bad response magic: {magic!r}')
+
+    payload = _read_exact(stream, n_bytes) if n_bytes else b''
+    if status != STATUS_OK:
+        raise Exception(payload.decode('utf-8'))
+
+    outputs = np.frombuffer(payload, dtype=WIRE_DTYPE).reshape(n_outputs, n_rows)
+    return outputs[0], (outputs[1] if n_outputs > 1 else None)
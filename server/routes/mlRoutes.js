@@ -5,14 +5,14 @@ const { protect, authorize } = require('../middleware/authMiddleware');
 
 /**
  * @route   POST /api/ml/train
- * @desc    Train ML model with historical data
+ * @desc    Train ML model with historical data ({ incremental: true } adds trees for new allocations)
  * @access  Admin only
  */
 router.post('/train', protect, authorize('ADMIN'), async (req, res) => {
     try {
         console.log('[ML API] Training request received from admin');
 
-        const result = await mlService.trainModel();
+        const result = await mlService.trainModel({ incremental: req.body?.incremental });
 
         res.json({
             success: true,
@@ -19,6 +19,16 @@ const WEIGHTS = {
 const USE_ML_SCORING = process.env.USE_ML_SCORING === 'true' || false;
 const ML_WEIGHT = 0.6; // Weight for ML score
 const RULE_WEIGHT = 0.4; // Weight for rule-based score
+// Top-K candidate internships per student for ML scoring (0 = score every pair)
+const ML_CANDIDATE_K = parseInt(process.env.ML_CANDIDATE_K, 10) || 0;
+// Where ML pair features are computed: 'node' (extractFeatures per pair) or 'python' (ml/feature_tensor.py)
+const ML_FEATURE_ENGINE = process.env.ML_FEATURE_ENGINE || 'node';
+// Python engine: keep only each student's top-N hybrid matches (0 = every match above the cutoff)
+const ML_FUSION_TOP_N = parseInt(process.env.ML_FUSION_TOP_N, 10) || 0;
+
+// Assignment: 'greedy' (sort-and-fill) or 'optimal' (ml/assignment.py, max total score)
+const ASSIGNMENT_MODE = process.env.ASSIGNMENT_MODE || 'greedy';
+const ASSIGNMENT_TIME_BUDGET = parseFloat(process.env.ASSIGNMENT_TIME_BUDGET) || 30; // seconds
 
 class AllocationEngine {
 
@@ -52,97 +62,132 @@ class AllocationEngine {
         console.log(`[Batch: ${batchId}] Precomputing IDF map for TF-IDF skill matching...`);
         const idfMap = precomputeIDFMap(candidates, internships);
 
-        // 3. Generate Scoring Matrix (All-to-All)
+        // 3. Generate Scoring Matrix (All-to-All, or Top-K candidates per student)
         let potentialMatches = [];
 
-        // Prepare pairs for ML prediction if enabled
-        const mlPairs = [];
-        const mlPairIndices = [];
+        const candidateK = options.candidateK !== undefined ? options.candidateK : ML_CANDIDATE_K;
+        let candidateLists = null;
 
-        for (const student of candidates) {
-            for (const internship of internships) {
+        if (useML && mlService.isModelTrained && candidateK > 0) {
+            try {
+                candidateLists = await mlService.generateCandidates(candidates, internships, candidateK);
+                console.log(`[Batch: ${batchId}] Candidate generation: top ${candidateK} internships per student`);
+            } catch (error) {
+                console.error(`[Batch: ${batchId}] Candidate generation failed, scoring all pairs:`, error.message);
+            }
+        }
 
-                // Pre-filter: Check hard constraints (e.g. Min GPA)
-                if (student.academic.gpa < internship.minGPA) continue;
+        // Pairs that pass the hard constraints (e.g. Min GPA), generated on demand
+        // so the full cross product is never materialized
+        const eligiblePairs = function* () {
+            for (let s = 0; s < candidates.length; s++) {
+                const student = candidates[s];
+                const studentInternships = candidateLists
+                    ? candidateLists[s].map(j => internships[j])
+                    : internships;
+
+                for (const internship of studentInternships) {
+                    if (student.academic.gpa < internship.minGPA) continue;
+                    yield { student, internship };
+                }
+            }
+        };
 
+        const scoreRuleBased = () => {
+            const matches = [];
+            for (const { student, internship } of eligiblePairs()) {
                 // Calculate Rule-based Score using TF-IDF + Cosine Similarity
                 const ruleAnalysis = this.calculateScore(student, internship, idfMap);
-
-                // Store pair for ML prediction
-                if (useML && mlService.isModelTrained) {
-                    mlPairs.push({ student, internship });
-                    mlPairIndices.push({ student, internship, ruleAnalysis });
-                } else {
-                    // Use rule-based score only
-                    if (ruleAnalysis.totalScore > 0.3) {
-                        potentialMatches.push({
-                            studentId: student._id,
-                            internshipId: internship._id,
-                            score: ruleAnalysis.totalScore,
-                            breakdown: ruleAnalysis.breakdown,
-                            explanation: ruleAnalysis.explanation,
-                            studentInfo: student,
-                            internshipInfo: internship
-                        });
-                    }
+                if (ruleAnalysis.totalScore > 0.3) {
+                    matches.push(this.buildRuleMatch(student, internship, ruleAnalysis));
                 }
             }
-        }
+            return matches;
+        };
+
+        if (useML && mlService.isModelTrained) {
+            try {
+                // Past allocation / rating features for every student, in two bulk queries
+                await mlService.refreshHistory();
+            } catch (error) {
+                console.error(`[Batch: ${batchId}] History refresh failed, using previous history:`, error.message);
+            }
+
+            console.log(`[Batch: ${batchId}] Streaming ML predictions...`);
+            const statsBefore = await mlService.getPredictionStats();
+
+            // Hybrid score: weighted average of ML and rule-based
+            const addMLMatch = (student, internship, mlPrediction) => {
+                const ruleAnalysis = this.calculateScore(student, internship, idfMap);
+
+                const hybridScore = (mlPrediction.score * ML_WEIGHT) + 
+                                  (ruleAnalysis.totalScore * RULE_WEIGHT);
+
+                if (hybridScore > 0.3) {
+                    potentialMatches.push({
+                        studentId: student._id,
+                        internshipId: internship._id,
+                        score: hybridScore,
+                        mlScore: mlPrediction.score,
+                        mlConfidence: mlPrediction.confidence,
+                        ruleScore: ruleAnalysis.totalScore,
+                        breakdown: {
+                            ...ruleAnalysis.breakdown,
+                            mlPrediction: parseFloat(mlPrediction.score.toFixed(2)),
+                            mlConfidence: parseFloat(mlPrediction.confidence.toFixed(2))
+                        },
+                        explanation: `ML: ${Math.round(mlPrediction.score * 100)}% (${Math.round(mlPrediction.confidence * 100)}% conf), ${ruleAnalysis.explanation}`,
+                        studentInfo: student,
+                        internshipInfo: internship
+                    });
+                }
+            };
 
-        // Get ML predictions if enabled
-        if (useML && mlService.isModelTrained && mlPairs.length > 0) {
-            console.log(`[Batch: ${batchId}] Generating ML predictions for ${mlPairs.length} pairs...`);
-            
             try {
-                const mlPredictions = await mlService.predict(mlPairs, true);
-
-                // Combine ML and rule-based scores
-                for (let i = 0; i < mlPairIndices.length; i++) {
-                    const { student, internship, ruleAnalysis } = mlPairIndices[i];
-                    const mlPrediction = mlPredictions[i];
-
-                    // Hybrid score: weighted average of ML and rule-based
-                    const hybridScore = (mlPrediction.score * ML_WEIGHT) + 
-                                      (ruleAnalysis.totalScore * RULE_WEIGHT);
-
-                    if (hybridScore > 0.3) {
-                        potentialMatches.push({
-                            studentId: student._id,
-                            internshipId: internship._id,
-                            score: hybridScore,
-                            mlScore: mlPrediction.score,
-                            mlConfidence: mlPrediction.confidence,
-                            ruleScore: ruleAnalysis.totalScore,
-                            breakdown: {
-                                ...ruleAnalysis.breakdown,
-                                mlPrediction: parseFloat(mlPrediction.score.toFixed(2)),
-                                mlConfidence: parseFloat(mlPrediction.confidence.toFixed(2))
-                            },
-                            explanation: `ML: ${Math.round(mlPrediction.score * 100)}% (${Math.round(mlPrediction.confidence * 100)}% conf), ${ruleAnalysis.explanation}`,
-                            studentInfo: student,
-                            internshipInfo: internship
+                let scoredPairs;
+                const engine = options.featureEngine || ML_FEATURE_ENGINE;
+
+                if (engine === 'python') {
+                    // Features, rule scores and the hybrid cutoff all computed in Python;
+                    // only the surviving pairs come back, with their student / internship indices
+                    const fusion = {
+                        mlWeight: ML_WEIGHT,
+                        ruleWeight: RULE_WEIGHT,
+                        cutoff: 0.3,
+                        topN: options.fusionTopN !== undefined ? options.fusionTopN : ML_FUSION_TOP_N
+                    };
+                    scoredPairs = await mlService.predictProfilesFused(candidates, internships, true, fusion, (fused) => {
+                        fused.rows.forEach((row, k) => {
+                            addMLMatch(candidates[row], internships[fused.cols[k]], {
+                                score: fused.mlScores[k],
+                                confidence: fused.confidence[k]
+                            });
                         });
-                    }
+                    }, candidateLists);
+                } else {
+                    // Predictions arrive in pair order, so walk the same pair sequence alongside them
+                    const pairCursor = eligiblePairs();
+
+                    scoredPairs = await mlService.predictStream(eligiblePairs(), true, (mlPredictions) => {
+                        for (const mlPrediction of mlPredictions) {
+                            const { student, internship } = pairCursor.next().value;
+                            addMLMatch(student, internship, mlPrediction);
+                        }
+                    });
                 }
 
-                console.log(`[Batch: ${batchId}] ML predictions integrated successfully`);
+                console.log(`[Batch: ${batchId}] ML predictions integrated successfully (${scoredPairs} pairs)`);
+
+                const serverWork = mlService.describeStatsDelta(statsBefore, await mlService.getPredictionStats());
+                if (serverWork) console.log(`[Batch: ${batchId}] ML server: ${serverWork}`);
             } catch (error) {
                 console.error(`[Batch: ${batchId}] ML prediction failed, falling back to rule-based:`, error.message);
                 // Fall back to rule-based scores
-                for (const { student, internship, ruleAnalysis } of mlPairIndices) {
-                    if (ruleAnalysis.totalScore > 0.3) {
-                        potentialMatches.push({
-                            studentId: student._id,
-                            internshipId: internship._id,
-                            score: ruleAnalysis.totalScore,
-                            breakdown: ruleAnalysis.breakdown,
-                            explanation: ruleAnalysis.explanation,
-                            studentInfo: student,
-                            internshipInfo: internship
-                        });
-                    }
-                }
+                potentialMatches = scoreRuleBased();
             }
+        } else {
+            // Use rule-based score only
+            potentialMatches = scoreRuleBased();
         }
 
         // 3. Rank by Merit (Global Sort)
@@ -151,8 +196,22 @@ class AllocationEngine {
 
         console.log(`[Batch: ${batchId}] Generated ${potentialMatches.length} potential matches. Processing assignments...`);
 
+        // Optional optimal assignment: the solver returns a feasible subset of the
+        // matches, which the greedy pass below then takes as-is
+        const assignmentMode = options.assignment || ASSIGNMENT_MODE;
+        let matchesToAssign = potentialMatches;
+
+        if (assignmentMode === 'optimal' && potentialMatches.length > 0) {
+            try {
+                matchesToAssign = await this.solveOptimalAssignment(batchId, potentialMatches, internships);
+            } catch (error) {
+                console.error(`[Batch: ${batchId}] Optimal assignment failed, using greedy:`, error.message);
+            }
+        }
+
         // 4. Greedy Assignment (Stable Marriage Approximation)
         const assignments = [];
+        const assignedMatches = []; // match behind each assignment
         const studentAssigned = new Set();
         const vacancyTracker = {};
         const waitlist = []; // Track who missed out for analytics
@@ -165,7 +224,7 @@ class AllocationEngine {
             };
         });
 
-        for (const match of potentialMatches) {
+        for (const match of matchesToAssign) {
             const { studentId, internshipId } = match;
 
             // Rule a: One Student -> One Internship
@@ -194,6 +253,12 @@ class AllocationEngine {
                 explanation: match.explanation, // Save explanation
                 status: 'PROPOSED'
             });
+            assignedMatches.push(match);
+        }
+
+        // ML attributions only for the proposed pairs (at most one per student), in one batch
+        if (useML) {
+            await this.addMLExplanations(batchId, assignments, assignedMatches);
         }
 
         // Identify Waitlisted Candidates (Available but not assigned)
@@ -230,6 +295,84 @@ class AllocationEngine {
         };
     }
 
+    /**
+     * Maximum-total-score assignment of the potential matches under
+     * one-internship-per-student and vacancy constraints (ml/assignment.py)
+     * Returns: the chosen subset of potentialMatches
+     */
+    async solveOptimalAssignment(batchId, potentialMatches, internships) {
+        const internshipIndex = new Map(internships.map((i, idx) => [i._id.toString(), idx]));
+        const studentIndex = new Map();
+        const rows = [];
+        const cols = [];
+        const scores = [];
+
+        for (const match of potentialMatches) {
+            const studentKey = match.studentId.toString();
+            if (!studentIndex.has(studentKey)) studentIndex.set(studentKey, studentIndex.size);
+
+            rows.push(studentIndex.get(studentKey));
+            cols.push(internshipIndex.get(match.internshipId.toString()));
+            scores.push(match.score);
+        }
+
+        const result = await mlService.solveAssignment({
+            nStudents: studentIndex.size,
+            rows,
+            cols,
+            scores,
+            capacities: internships.map(i => Math.max(0, i.vacancies - (i.filledCount || 0))),
+            method: 'auto',
+            timeBudget: ASSIGNMENT_TIME_BUDGET
+        });
+
+        console.log(`[Batch: ${batchId}] Optimal assignment (${result.method}): total score ${result.objective.toFixed(3)} vs greedy ${result.greedy.objective.toFixed(3)}, ${Math.round(result.runtime_ms)}ms`);
+
+        return result.selected.map(p => potentialMatches[p]);
+    }
+
+    /**
+     * Append the features that drove each ML-scored assignment's prediction to
+     * its explanation ("ML drivers: skill overlap ratio +0.12, ..."). On failure
+     * the rule-based explanations are kept.
+     */
+    async addMLExplanations(batchId, assignments, assignedMatches) {
+        const explained = [];
+        assignedMatches.forEach((match, i) => {
+            if (match.mlScore !== undefined) explained.push(i);
+        });
+        if (explained.length === 0) return;
+
+        try {
+            const attributions = await mlService.explain(explained.map(i => ({
+                student: assignedMatches[i].studentInfo,
+                internship: assignedMatches[i].internshipInfo
+            })));
+
+            explained.forEach((i, k) => {
+                const drivers = mlService.describeContributions(attributions[k]);
+                if (drivers) assignments[i].explanation += `; ML drivers: ${drivers}`;
+            });
+        } catch (error) {
+            console.error(`[Batch: ${batchId}] ML explanations failed, keeping rule-based explanations:`, error.message);
+        }
+    }
+
+    /**
+     * Potential match entry for a rule-based (non-ML) score
+     */
+    buildRuleMatch(student, internship, ruleAnalysis) {
+        return {
+            studentId: student._id,
+            internshipId: internship._id,
+            score: ruleAnalysis.totalScore,
+            breakdown: ruleAnalysis.breakdown,
+            explanation: ruleAnalysis.explanation,
+            studentInfo: student,
+            internshipInfo: internship
+        };
+    }
+
     /**
      * Core Explainable Scoring Logic
      * IMPT: Implements BLIND RESUME logic by ignoring name/gender/college.
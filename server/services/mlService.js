@@ -1,14 +1,117 @@
 const { PythonShell } = require('python-shell');
+const { spawn } = require('child_process');
+const crypto = require('crypto');
+const fs = require('fs');
+const os = require('os');
 const path = require('path');
+const { once } = require('events');
 const Student = require('../models/Student');
 const Internship = require('../models/Internship');
 const Allocation = require('../models/Allocation');
 const Rating = require('../models/Rating');
+const PredictionCoalescer = require('./predictionCoalescer');
+
+// Keep one long-lived predict.py process (--serve) instead of spawning one per call
+const USE_ML_SERVER = process.env.ML_SERVER_MODE !== 'false';
+
+// Inference backend for predict.py: 'sklearn' (default) or 'flat' (flattened forest engine)
+const ML_BACKEND = process.env.ML_BACKEND || 'sklearn';
+
+// Streaming prediction: pairs per scored batch, and batches in flight to the server
+const STREAM_BATCH_SIZE = parseInt(process.env.ML_STREAM_BATCH_SIZE, 10) || 2048;
+const STREAM_MAX_IN_FLIGHT = 4;
+
+// Persistent prediction cache (SQLite file) shared by predict.py processes; unset = disabled
+const ML_CACHE_PATH = process.env.ML_CACHE_PATH || '';
+const ML_CACHE_SIZE = parseInt(process.env.ML_CACHE_SIZE, 10) || 0;
+
+// Sharded prediction: worker processes for large batches (0 = one per CPU, 1 = in-process)
+// and rows per worker shard; see ml/sharded.py
+const ML_WORKERS = process.env.ML_WORKERS || '';
+const ML_SHARD_SIZE = parseInt(process.env.ML_SHARD_SIZE, 10) || 0;
+
+// Per-stage timing breakdown from predict.py / feature_tensor.py (--profile), logged per call
+const ML_PROFILE = process.env.ML_PROFILE === 'true';
+
+// predictSingle micro-batching: concurrent calls are scored as one batch of at most
+// ML_COALESCE_MAX_BATCH pairs, sent when full or ML_COALESCE_MAX_WAIT_MS after the first call
+const ML_COALESCE = process.env.ML_COALESCE !== 'false';
+const ML_COALESCE_MAX_BATCH = parseInt(process.env.ML_COALESCE_MAX_BATCH, 10) || 256;
+const ML_COALESCE_MAX_WAIT_MS = process.env.ML_COALESCE_MAX_WAIT_MS !== undefined
+    ? parseFloat(process.env.ML_COALESCE_MAX_WAIT_MS) || 0
+    : 2;
+const ML_COALESCE_MAX_IN_FLIGHT = parseInt(process.env.ML_COALESCE_MAX_IN_FLIGHT, 10) || 2;
+
+// Features listed per pair in ML explanations (ml/attribution.py)
+const ML_EXPLAIN_TOP_K = parseInt(process.env.ML_EXPLAIN_TOP_K, 10) || 3;
+
+// Training: 'true' grows the saved forest with trees for new allocations instead of refitting
+const ML_INCREMENTAL_TRAINING = process.env.ML_INCREMENTAL_TRAINING === 'true';
+
+// Training: allocations read per cursor batch, and samples per NDJSON shard handed to train_model.py
+const TRAINING_BATCH_SIZE = 1000;
+const TRAINING_SHARD_ROWS = 100000;
+
+// predictSingle: 'forest' (full model through predict.py) or 'distilled' (ml/models/distilled.json
+// evaluated in-process, no Python round trip; approximate, see ml/distill.py)
+const ML_SINGLE_PAIR_MODEL = process.env.ML_SINGLE_PAIR_MODEL || 'forest';
+
+// Prediction server protocol: 'json' (NDJSON records) or 'binary' (raw float64 matrix, see ml/wire.py)
+const ML_WIRE_PROTOCOL = process.env.ML_WIRE_PROTOCOL || 'json';
+
+// Model input columns in ml/features.py FEATURE_SPECS order: [feature name, record key, transform]
+// transform: null = raw value, 'flag' = 0/1, number = divide by it
+const FEATURE_COLUMNS = [
+    ['skill_overlap_count', 'skillOverlapCount', null],
+    ['skill_overlap_ratio', 'skillOverlapRatio', null],
+    ['avg_skill_level', 'avgSkillLevel', null],
+    ['max_skill_level', 'maxSkillLevel', null],
+    ['gpa', 'gpa', null],
+    ['gpa_normalized', 'gpa', 10.0],
+    ['domain_match', 'domainMatch', 'flag'],
+    ['location_match', 'locationMatch', 'flag'],
+    ['location_preference', 'locationPreference', null],
+    ['internship_duration', 'duration', null],
+    ['stipend_amount', 'stipend', 1000.0],
+    ['total_skills', 'totalSkills', null],
+    ['verified_skills', 'verifiedSkills', null],
+    ['past_allocation_count', 'pastAllocations', null],
+    ['past_avg_rating', 'pastAvgRating', null]
+];
+
+// Binary frame layout (ml/wire.py); the column hash lets predict.py reject a mismatched column order
+const WIRE_REQUEST_MAGIC = 'IMQ1';
+const WIRE_RESPONSE_MAGIC = 'IMR1';
+const WIRE_REQUEST_HEADER_SIZE = 24;
+const WIRE_RESPONSE_HEADER_SIZE = 20;
+const WIRE_FLAG_CONFIDENCE = 1;
+const WIRE_COLUMN_HASH = crypto.createHash('sha256')
+    .update(FEATURE_COLUMNS.map(([name]) => name).join(','))
+    .digest()
+    .subarray(0, 8);
 
 class MLService {
     constructor() {
         this.mlDir = path.join(__dirname, '../../ml');
         this.isModelTrained = false;
+        this.predictionServer = null;
+        this.pendingRequests = new Map();
+        this.nextRequestId = 1;
+        this.binaryServer = null;
+        this.binaryPending = [];
+        this.history = new Map();
+        this.historyLoadedAt = null;
+        this.historyLoading = null;
+        this.lastTrainedAt = null;
+        this.distilled = null;
+        this.coalescer = new PredictionCoalescer(
+            (records, includeConfidence) => this.scoreRecords(records, includeConfidence),
+            {
+                maxBatchSize: ML_COALESCE_MAX_BATCH,
+                maxWaitMs: ML_COALESCE_MAX_WAIT_MS,
+                maxInFlight: ML_COALESCE_MAX_IN_FLIGHT
+            }
+        );
         this.checkModelExists();
     }
 
@@ -16,7 +119,6 @@ class MLService {
      * Check if ML model files exist
      */
     checkModelExists() {
-        const fs = require('fs');
         const modelPath = path.join(this.mlDir, 'models', 'matching_model.pkl');
         this.isModelTrained = fs.existsSync(modelPath);
     }
@@ -83,35 +185,197 @@ class MLService {
             stipend: internship.stipend || 0,
             totalSkills: student.skills.length,
             verifiedSkills,
-            pastAllocations: 0, // TODO: Query from Allocation model
-            pastAvgRating: 0    // TODO: Query from Rating model
+            ...this.historyFeatures(student._id)
+        };
+    }
+
+    /**
+     * Aggregate per-student history in two bulk queries (no per-pair lookups):
+     * accepted allocation counts and the sum / count of org ratings of the student
+     */
+    async loadHistory() {
+        const [allocationCounts, ratingStats] = await Promise.all([
+            Allocation.aggregate([
+                { $match: { status: 'ACCEPTED' } },
+                { $group: { _id: '$student', count: { $sum: 1 } } }
+            ]),
+            Rating.aggregate([
+                { $match: { 'studentRating.overallScore': { $exists: true, $ne: null } } },
+                { $group: { _id: '$student', sum: { $sum: '$studentRating.overallScore' }, count: { $sum: 1 } } }
+            ])
+        ]);
+
+        const history = new Map();
+        const entry = (id) => {
+            const key = String(id);
+            if (!history.has(key)) history.set(key, { allocations: 0, ratingSum: 0, ratingCount: 0 });
+            return history.get(key);
+        };
+
+        allocationCounts.forEach(({ _id, count }) => { entry(_id).allocations = count; });
+        ratingStats.forEach(({ _id, sum, count }) => {
+            const stats = entry(_id);
+            stats.ratingSum = sum;
+            stats.ratingCount = count;
+        });
+
+        this.history = history;
+        this.historyLoadedAt = Date.now();
+        return history;
+    }
+
+    /**
+     * Load the history once per process before features are extracted outside a
+     * batch allocation (which refreshes it itself); without it every student
+     * would get pastAllocations = pastAvgRating = 0, unlike the training data
+     */
+    async ensureHistory() {
+        if (this.historyLoadedAt !== null) return;
+
+        if (!this.historyLoading) {
+            this.historyLoading = this.loadHistory().finally(() => { this.historyLoading = null; });
+        }
+        await this.historyLoading;
+    }
+
+    /**
+     * pastAllocations / pastAvgRating for a student from the loaded history.
+     * exclude: { allocations, ratingSum, ratingCount } to leave out (the training
+     * sample's own allocation and rating, so the features do not leak the target)
+     */
+    historyFeatures(studentId, exclude = null) {
+        const stats = this.history.get(String(studentId));
+        if (!stats) return { pastAllocations: 0, pastAvgRating: 0 };
+
+        const allocations = stats.allocations - (exclude?.allocations || 0);
+        const ratingSum = stats.ratingSum - (exclude?.ratingSum || 0);
+        const ratingCount = stats.ratingCount - (exclude?.ratingCount || 0);
+
+        return {
+            pastAllocations: Math.max(0, allocations),
+            pastAvgRating: ratingCount > 0 ? ratingSum / ratingCount : 0
         };
     }
 
+    /**
+     * Reload history and write the index predict.py / feature_tensor.py mmap
+     * (ml/models/history.npy, see ml/history.py)
+     */
+    async refreshHistory() {
+        const history = await this.loadHistory();
+
+        const students = [];
+        history.forEach((_, id) => students.push({ id, ...this.historyFeatures(id) }));
+        await this.runPythonScript('history.py', { students });
+
+        console.log(`[ML Service] History index updated (${students.length} students)`);
+        return history;
+    }
+
     /**
      * Train ML model with historical data
+     * options.incremental: only allocations changed since the last training in this
+     * process are sent, and train_model.py adds trees for them (--incremental)
      */
-    async trainModel() {
+    async trainModel(options = {}) {
         try {
-            console.log('[ML Service] Starting model training...');
+            const incremental = options.incremental !== undefined ? options.incremental : ML_INCREMENTAL_TRAINING;
+            const startedAt = new Date();
+            console.log(`[ML Service] Starting ${incremental ? 'incremental' : 'full'} model training...`);
 
-            // Gather training data from historical allocations and ratings
-            const allocations = await Allocation.find({ 
-                status: 'ACCEPTED' 
-            })
+            // Incremental: allocations accepted or rated since the last run
+            // (train_model.py skips samples its snapshot already has)
+            const filter = { status: 'ACCEPTED' };
+            if (incremental && this.lastTrainedAt) {
+                const ratedAllocations = await Rating.distinct('allocation', {
+                    updatedAt: { $gte: this.lastTrainedAt }
+                });
+                filter.$or = [
+                    { updatedAt: { $gte: this.lastTrainedAt } },
+                    { _id: { $in: ratedAllocations } }
+                ];
+            }
+
+            // History features first: each sample's history is computed from it
+            await this.refreshHistory();
+
+            // Stream every matching allocation into NDJSON shards on disk; the
+            // trainer featurizes them in worker processes instead of reading one array
+            const dataDir = await fs.promises.mkdtemp(path.join(os.tmpdir(), 'internmatch-train-'));
+
+            try {
+                const { samples, shards } = await this.writeTrainingShards(filter, dataDir);
+
+                if (incremental && this.lastTrainedAt && samples === 0) {
+                    console.log('[ML Service] No new allocations since the last training');
+                    return { success: true, metrics: null, message: 'Model is up to date' };
+                }
+
+                if (samples < 10 && !(incremental && this.lastTrainedAt)) {
+                    throw new Error('Insufficient training data. Need at least 10 accepted allocations.');
+                }
+
+                console.log(`[ML Service] Prepared ${samples} training samples in ${shards} shards`);
+
+                // Call Python training script
+                const args = ['--data', dataDir];
+                if (incremental) args.push('--incremental');
+                const result = await this.runPythonScript('train_model.py', null, args);
+
+                this.isModelTrained = true;
+                this.lastTrainedAt = startedAt;
+                this.reloadPredictionServer();
+                console.log('[ML Service] Model trained successfully');
+                console.log('Metrics:', result.metrics);
+                return result;
+            } finally {
+                await fs.promises.rm(dataDir, { recursive: true, force: true });
+            }
+
+        } catch (error) {
+            console.error('[ML Service] Training failed:', error);
+            throw error;
+        }
+    }
+
+    /**
+     * Write training samples for the allocations matching filter as NDJSON shards in dir
+     * Allocations are read with a cursor and their ratings loaded per batch, so
+     * memory stays bounded by TRAINING_BATCH_SIZE whatever the history size.
+     * Returns: { samples, shards }
+     */
+    async writeTrainingShards(filter, dir) {
+        const cursor = Allocation.find(filter)
             .populate('student')
             .populate({
                 path: 'internship',
                 populate: { path: 'org' }
             })
-            .limit(1000); // Limit for performance
+            .batchSize(TRAINING_BATCH_SIZE)
+            .cursor();
 
-            if (allocations.length < 10) {
-                throw new Error('Insufficient training data. Need at least 10 accepted allocations.');
-            }
+        let stream = null;
+        let shards = 0;
+        let shardRows = 0;
+        let samples = 0;
+
+        const closeShard = async () => {
+            if (!stream) return;
+            stream.end();
+            await once(stream, 'finish');
+            stream = null;
+        };
+
+        const writeBatch = async (allocations) => {
+            // Ratings for the whole batch in one query instead of one per allocation
+            const ratings = await Rating.find({
+                allocation: { $in: allocations.map(allocation => allocation._id) },
+                'studentRating.overallScore': { $exists: true }
+            }).select('allocation studentRating.overallScore');
 
-            // Build training dataset
-            const trainingData = [];
+            const ratingByAllocation = new Map(
+                ratings.map(rating => [String(rating.allocation), rating.studentRating?.overallScore])
+            );
 
             for (const allocation of allocations) {
                 if (!allocation.student || !allocation.internship) continue;
@@ -125,60 +389,55 @@ class MLService {
                 // Get target score from ratings or allocation score
                 let targetScore = allocation.score || 0.5;
 
-                // Try to get actual rating if available
-                const rating = await Rating.findOne({
-                    allocation: allocation._id,
-                    'studentRating.overallScore': { $exists: true }
-                });
-
-                if (rating && rating.studentRating?.overallScore) {
+                const overallScore = ratingByAllocation.get(String(allocation._id));
+                if (overallScore) {
                     // Normalize rating from 1-5 to 0-1
-                    targetScore = (rating.studentRating.overallScore - 1) / 4;
+                    targetScore = (overallScore - 1) / 4;
                 }
 
-                trainingData.push({
-                    ...features,
-                    targetScore
-                });
-            }
-
-            console.log(`[ML Service] Prepared ${trainingData.length} training samples`);
+                // History without this allocation and its own rating (the target)
+                Object.assign(features, this.historyFeatures(allocation.student._id, {
+                    allocations: 1,
+                    ratingSum: overallScore || 0,
+                    ratingCount: overallScore ? 1 : 0
+                }));
 
-            // Call Python training script
-            const options = {
-                mode: 'json',
-                pythonPath: 'python3',
-                scriptPath: this.mlDir,
-                args: []
-            };
+                if (!stream || shardRows >= TRAINING_SHARD_ROWS) {
+                    await closeShard();
+                    const name = `part-${String(shards).padStart(5, '0')}.ndjson`;
+                    stream = fs.createWriteStream(path.join(dir, name));
+                    shards++;
+                    shardRows = 0;
+                }
 
-            return new Promise((resolve, reject) => {
-                const pyshell = new PythonShell('train_model.py', options);
-
-                // Send training data via stdin
-                pyshell.send(JSON.stringify(trainingData));
-                pyshell.end(() => {});
-
-                pyshell.on('message', (result) => {
-                    if (result.success) {
-                        this.isModelTrained = true;
-                        console.log('[ML Service] Model trained successfully');
-                        console.log('Metrics:', result.metrics);
-                        resolve(result);
-                    } else {
-                        reject(new Error(result.error));
-                    }
-                });
+                const line = JSON.stringify({
+                    ...features,
+                    targetScore,
+                    allocationId: String(allocation._id)
+                }) + '\n';
 
-                pyshell.on('error', (err) => {
-                    reject(err);
-                });
-            });
+                // Respect backpressure so a large history is never buffered in memory
+                if (!stream.write(line)) await once(stream, 'drain');
+                shardRows++;
+                samples++;
+            }
+        };
 
-        } catch (error) {
-            console.error('[ML Service] Training failed:', error);
-            throw error;
+        try {
+            let batch = [];
+            for await (const allocation of cursor) {
+                batch.push(allocation);
+                if (batch.length >= TRAINING_BATCH_SIZE) {
+                    await writeBatch(batch);
+                    batch = [];
+                }
+            }
+            if (batch.length) await writeBatch(batch);
+        } finally {
+            await closeShard();
         }
+
+        return { samples, shards };
     }
 
     /**
@@ -190,63 +449,820 @@ class MLService {
         }
 
         try {
+            await this.ensureHistory();
+
             // Extract features for all pairs
             const predictionData = pairs.map(pair => 
                 this.extractFeatures(pair.student, pair.internship)
             );
 
-            // Call Python prediction script
-            const options = {
-                mode: 'json',
-                pythonPath: 'python3',
-                scriptPath: this.mlDir,
-                args: []
-            };
+            return this.scoreRecords(predictionData, includeConfidence);
 
-            return new Promise((resolve, reject) => {
-                const pyshell = new PythonShell('predict.py', options);
+        } catch (error) {
+            console.error('[ML Service] Prediction failed:', error);
+            throw error;
+        }
+    }
 
-                // Send prediction request
-                pyshell.send(JSON.stringify({
-                    data: predictionData,
-                    includeConfidence
-                }));
-                pyshell.end(() => {});
-
-                pyshell.on('message', (result) => {
-                    if (result.success) {
-                        resolve(result.predictions);
-                    } else {
-                        reject(new Error(result.error));
-                    }
-                });
+    /**
+     * Score feature records on the prediction server, or with a one-shot
+     * predict.py run when server mode is disabled
+     */
+    scoreRecords(records, includeConfidence = false) {
+        if (USE_ML_SERVER) {
+            return this.scoreFeatureBatch(records, includeConfidence);
+        }
 
-                pyshell.on('error', (err) => {
-                    reject(err);
-                });
+        return this.runPredictionScript({
+            data: records,
+            includeConfidence
+        });
+    }
+
+    /**
+     * Predictions with feature attributions for student-internship pairs:
+     * each result carries its baseline and the topK features that moved the
+     * score most ([{feature, value}], see ml/attribution.py)
+     */
+    async explain(pairs, topK = ML_EXPLAIN_TOP_K) {
+        if (!this.isModelTrained) {
+            throw new Error('ML model not trained. Please train the model first.');
+        }
+
+        await this.ensureHistory();
+        const request = {
+            data: pairs.map(pair => this.extractFeatures(pair.student, pair.internship)),
+            explain: topK
+        };
+
+        if (USE_ML_SERVER) {
+            const result = await this.sendToPredictionServer({ op: 'predict', ...request });
+            return result.predictions;
+        }
+
+        return this.runPredictionScript(request);
+    }
+
+    /**
+     * One-shot predict.py run for a single request payload
+     * Resolves with the response's predictions
+     */
+    runPredictionScript(request) {
+        const options = {
+            mode: 'json',
+            pythonPath: 'python3',
+            scriptPath: this.mlDir,
+            args: this.predictorArgs()
+        };
+
+        return new Promise((resolve, reject) => {
+            const pyshell = new PythonShell('predict.py', options);
+
+            // Send prediction request (json mode encodes it)
+            pyshell.send(request);
+            pyshell.end(() => {});
+
+            pyshell.on('message', (result) => {
+                if (result.success) {
+                    if (result.profile) this.logProfile('Prediction', result.profile);
+                    resolve(result.predictions);
+                } else {
+                    reject(new Error(result.error));
+                }
+            });
+
+            pyshell.on('error', (err) => {
+                reject(err);
+            });
+        });
+    }
+
+    /**
+     * Short text of one attribution: "skill overlap ratio +0.12, gpa -0.03"
+     * (contributions that round to 0.00 are left out)
+     */
+    describeContributions(attribution) {
+        return (attribution.contributions || [])
+            .filter(({ value }) => Math.abs(value) >= 0.005)
+            .map(({ feature, value }) => `${feature.replace(/_/g, ' ')} ${value >= 0 ? '+' : '-'}${Math.abs(value).toFixed(2)}`)
+            .join(', ');
+    }
+
+    /**
+     * Plain student payload for the Python side (only the fields it reads)
+     */
+    serializeStudent(student) {
+        return {
+            id: String(student._id),
+            skills: (student.skills || []).map(skill => ({
+                name: skill.name,
+                level: skill.level,
+                isVerified: skill.isVerified
+            })),
+            academic: { gpa: student.academic?.gpa || 0 },
+            preferences: {
+                locations: student.preferences?.locations || [],
+                domains: student.preferences?.domains || [],
+                preferredDomain: student.preferences?.preferredDomain,
+                preferredLocation: student.preferences?.preferredLocation
+            }
+        };
+    }
+
+    /**
+     * Plain internship payload for the Python side (only the fields it reads)
+     */
+    serializeInternship(internship) {
+        return {
+            requiredSkills: (internship.requiredSkills || []).map(req => ({
+                skill: req.skill,
+                weight: req.weight
+            })),
+            org: { sector: internship.org?.sector || '' },
+            location: internship.location,
+            minGPA: internship.minGPA || 0,
+            duration: internship.duration || 0,
+            stipend: internship.stipend || 0,
+            vacancies: internship.vacancies,
+            filledCount: internship.filledCount || 0
+        };
+    }
+
+    /**
+     * Write the cohort the next batch allocation would see (available PENDING
+     * students, OPEN internships) as {students, internships} JSON, the input
+     * of ml/simulate.py's what-if sweeps
+     * Returns: the number of students and internships written
+     */
+    async exportCohort(filePath) {
+        const students = await Student.find({ availability: true, allocationStatus: 'PENDING' });
+        const internships = await Internship.find({ status: 'OPEN' }).populate('org');
+
+        await fs.promises.writeFile(filePath, JSON.stringify({
+            students: students.map(s => this.serializeStudent(s)),
+            internships: internships.map(i => this.serializeInternship(i))
+        }));
+
+        return { students: students.length, internships: internships.length };
+    }
+
+    /**
+     * Top-K plausible internships per student (candidates.py), so only those
+     * pairs go through full ML scoring.
+     * Returns: one array of internship indices per student, in input order
+     */
+    async generateCandidates(students, internships, k) {
+        const result = await this.runPythonScript('candidates.py', {
+            students: students.map(s => this.serializeStudent(s)),
+            internships: internships.map(i => this.serializeInternship(i)),
+            k
+        });
+        return result.candidates;
+    }
+
+    /**
+     * Optimal capacitated assignment over a sparse score matrix (assignment.py)
+     * request: { nStudents, rows, cols, scores, capacities, method, timeBudget }
+     * Returns: result with `selected` (indices of the chosen pairs) and greedy comparison
+     */
+    async solveAssignment(request) {
+        return this.runPythonScript('assignment.py', request);
+    }
+
+    /**
+     * Run a one-shot ml/ script: send one JSON request, resolve with its JSON result
+     * (payload null: the script reads its input from args, stdin is just closed)
+     */
+    runPythonScript(script, payload, args = []) {
+        const options = {
+            mode: 'json',
+            pythonPath: 'python3',
+            scriptPath: this.mlDir,
+            args
+        };
+
+        return new Promise((resolve, reject) => {
+            const pyshell = new PythonShell(script, options);
+
+            if (payload !== null) pyshell.send(payload);
+            pyshell.end(() => {});
+
+            pyshell.on('message', (result) => {
+                if (result.success) {
+                    resolve(result);
+                } else {
+                    reject(new Error(result.error));
+                }
+            });
+
+            pyshell.on('error', (err) => {
+                reject(err);
+            });
+        });
+    }
+
+    /**
+     * Stream predictions for a (possibly lazy) sequence of pairs.
+     * Pairs are featurized and sent in fixed-size batches, and onBatch(predictions, offset)
+     * is called in pair order as each batch is scored, so neither side ever holds
+     * the full cross product. Resolves with the number of pairs scored.
+     */
+    async predictStream(pairs, includeConfidence, onBatch, batchSize = STREAM_BATCH_SIZE) {
+        if (!this.isModelTrained) {
+            throw new Error('ML model not trained. Please train the model first.');
+        }
+
+        if (USE_ML_SERVER) {
+            return this.streamThroughServer(pairs, includeConfidence, onBatch, batchSize);
+        }
+        return this.streamThroughProcess(pairs, includeConfidence, onBatch, batchSize);
+    }
+
+    /**
+     * Streaming over the persistent server: one predict request per batch,
+     * with at most STREAM_MAX_IN_FLIGHT batches outstanding
+     */
+    async streamThroughServer(pairs, includeConfidence, onBatch, batchSize) {
+        const inFlight = [];
+        let batch = [];
+        let count = 0;
+
+        const drainOne = async () => {
+            const { offset, predictions } = await inFlight.shift();
+            onBatch(predictions, offset);
+        };
+
+        const submit = async () => {
+            const offset = count - batch.length;
+            const request = this.scoreFeatureBatch(batch, includeConfidence)
+                .then(predictions => ({ offset, predictions }));
+            request.catch(() => {}); // Surfaced when drained, in order
+
+            inFlight.push(request);
+            batch = [];
+
+            if (inFlight.length >= STREAM_MAX_IN_FLIGHT) await drainOne();
+        };
+
+        for (const pair of pairs) {
+            batch.push(this.extractFeatures(pair.student, pair.internship));
+            count++;
+            if (batch.length >= batchSize) await submit();
+        }
+        if (batch.length > 0) await submit();
+
+        while (inFlight.length > 0) await drainOne();
+        return count;
+    }
+
+    /**
+     * Score raw profiles with the vectorized feature engine (feature_tensor.py):
+     * features for all eligible pairs are computed in Python with sparse matrix
+     * products instead of extractFeatures per pair. onBatch(predictions, rows, cols)
+     * receives student / internship indices of each scored pair, in
+     * runBatchAllocation pair order. Resolves with the number of pairs scored.
+     */
+    async predictProfilesStream(students, internships, includeConfidence, onBatch, candidateLists = null) {
+        return this.streamFeatureEngine(students, internships, includeConfidence, candidateLists, null,
+            (message) => onBatch(message.predictions, message.rows, message.cols));
+    }
+
+    /**
+     * Like predictProfilesStream, but feature_tensor.py also computes the rule-based
+     * scores (ml/rule_scores.py), fuses them with the ML scores and only returns the
+     * pairs above the cutoff (optionally each student's top-N), as parallel arrays.
+     * fusion: { mlWeight, ruleWeight, cutoff, topN }
+     * onBatch({ rows, cols, scores, mlScores, confidence }) per block of survivors
+     * Resolves with the number of pairs scored.
+     */
+    async predictProfilesFused(students, internships, includeConfidence, fusion, onBatch, candidateLists = null) {
+        return this.streamFeatureEngine(students, internships, includeConfidence, candidateLists, fusion, onBatch);
+    }
+
+    async streamFeatureEngine(students, internships, includeConfidence, candidateLists, fusion, onMessage) {
+        if (!this.isModelTrained) {
+            throw new Error('ML model not trained. Please train the model first.');
+        }
+
+        const args = this.predictorArgs();
+        if (includeConfidence) args.push('--confidence');
+
+        const pyshell = new PythonShell('feature_tensor.py', {
+            mode: 'json',
+            pythonPath: 'python3',
+            scriptPath: this.mlDir,
+            args
+        });
+
+        const done = new Promise((resolve, reject) => {
+            pyshell.on('message', (message) => {
+                if (!message.success) return reject(new Error(message.error));
+                if (message.done) {
+                    if (message.profile) this.logProfile('Prediction stream', message.profile);
+                    return resolve(message.count);
+                }
+                onMessage(message);
+            });
+            pyshell.on('error', reject);
+            pyshell.on('close', () => reject(new Error('Feature engine closed before completion')));
+        });
+        done.catch(() => {}); // Awaited below
+
+        pyshell.send({
+            students: students.map(s => this.serializeStudent(s)),
+            internships: internships.map(i => this.serializeInternship(i)),
+            candidates: candidateLists,
+            ...(fusion && { fusion })
+        });
+        pyshell.end(() => {});
+
+        return done;
+    }
+
+    /**
+     * Streaming through a dedicated `predict.py --stream` process:
+     * one NDJSON feature record per line in, one result line per scored batch out
+     */
+    async streamThroughProcess(pairs, includeConfidence, onBatch, batchSize) {
+        const args = ['--stream', '--batch-size', String(batchSize), ...this.predictorArgs()];
+        if (includeConfidence) args.push('--confidence');
+
+        const pyshell = new PythonShell('predict.py', {
+            mode: 'json',
+            pythonPath: 'python3',
+            scriptPath: this.mlDir,
+            args
+        });
+
+        const done = new Promise((resolve, reject) => {
+            pyshell.on('message', (message) => {
+                if (!message.success) return reject(new Error(message.error));
+                if (message.done) {
+                    if (message.profile) this.logProfile('Prediction stream', message.profile);
+                    return resolve(message.count);
+                }
+                onBatch(message.predictions, message.offset);
             });
+            pyshell.on('error', reject);
+            pyshell.on('close', () => reject(new Error('Prediction stream closed before completion')));
+        });
+        done.catch(() => {}); // Awaited below
+
+        for (const pair of pairs) {
+            const line = JSON.stringify(this.extractFeatures(pair.student, pair.internship)) + '\n';
 
+            // Respect backpressure instead of buffering every pair in the pipe
+            if (!pyshell.stdin.write(line)) {
+                await Promise.race([
+                    new Promise(resolve => pyshell.stdin.once('drain', resolve)),
+                    done
+                ]);
+            }
+        }
+        pyshell.end(() => {});
+
+        return done;
+    }
+
+    /**
+     * Backend and cache options shared by every predict.py invocation
+     */
+    predictorArgs() {
+        const args = ['--backend', ML_BACKEND];
+        if (ML_CACHE_PATH) {
+            args.push('--cache', ML_CACHE_PATH);
+            if (ML_CACHE_SIZE) args.push('--cache-size', String(ML_CACHE_SIZE));
+        }
+        if (ML_WORKERS) {
+            args.push('--workers', ML_WORKERS);
+            if (ML_SHARD_SIZE) args.push('--shard-size', String(ML_SHARD_SIZE));
+        }
+        if (ML_PROFILE) args.push('--profile');
+        return args;
+    }
+
+    /**
+     * One-line summary of predict.py stage timings, slowest stage first
+     * stages: { name: { ms, calls, rows } }
+     */
+    formatStages(stages) {
+        return Object.entries(stages)
+            .filter(([, entry]) => entry.calls > 0)
+            .sort((a, b) => b[1].ms - a[1].ms)
+            .map(([name, entry]) => `${name} ${entry.ms.toFixed(1)}ms` + (entry.rows ? ` (${entry.rows} rows)` : ''))
+            .join(', ');
+    }
+
+    logProfile(label, profile) {
+        const memory = profile.peak_rss_mb ? `, peak RSS ${Math.round(profile.peak_rss_mb)}MB` : '';
+        console.log(`[ML Service] ${label} profile: ${profile.total_ms.toFixed(1)}ms total${memory} - ` +
+            this.formatStages(profile.stages));
+    }
+
+    /**
+     * Start (or reuse) the persistent prediction server.
+     * The model is loaded once; predict.py reloads it itself when ml/models changes.
+     */
+    getPredictionServer() {
+        if (this.predictionServer) return this.predictionServer;
+
+        const options = {
+            mode: 'json',
+            pythonPath: 'python3',
+            scriptPath: this.mlDir,
+            args: ['--serve', ...this.predictorArgs()]
+        };
+
+        const pyshell = new PythonShell('predict.py', options);
+
+        pyshell.on('message', (response) => {
+            const pending = this.pendingRequests.get(response.id);
+            if (!pending) {
+                if (!response.success) {
+                    console.error('[ML Service] Prediction server error:', response.error);
+                }
+                return;
+            }
+
+            this.pendingRequests.delete(response.id);
+            if (response.success) {
+                pending.resolve(response);
+            } else {
+                pending.reject(new Error(response.error));
+            }
+        });
+
+        const shutdown = (err) => {
+            if (this.predictionServer !== pyshell) return;
+            this.predictionServer = null;
+
+            // Fail everything still in flight; the next call starts a fresh server
+            const error = err || new Error('Prediction server exited');
+            this.pendingRequests.forEach(pending => pending.reject(error));
+            this.pendingRequests.clear();
+        };
+
+        pyshell.on('error', (err) => {
+            console.error('[ML Service] Prediction server failed:', err.message);
+            shutdown(err);
+        });
+        pyshell.on('close', () => shutdown());
+
+        this.predictionServer = pyshell;
+        return pyshell;
+    }
+
+    /**
+     * Send one request to the prediction server and wait for its response
+     */
+    sendToPredictionServer(payload) {
+        const pyshell = this.getPredictionServer();
+        const id = this.nextRequestId++;
+
+        return new Promise((resolve, reject) => {
+            this.pendingRequests.set(id, { resolve, reject });
+            pyshell.send({ id, ...payload });
+        });
+    }
+
+    /**
+     * Score one batch of feature records on the persistent server, over the
+     * configured wire protocol. Resolves with [{score}] or [{score, confidence, std_dev}].
+     */
+    async scoreFeatureBatch(records, includeConfidence) {
+        if (ML_WIRE_PROTOCOL === 'binary') {
+            return this.sendToBinaryServer(records, includeConfidence);
+        }
+
+        const result = await this.sendToPredictionServer({
+            op: 'predict',
+            data: records,
+            includeConfidence
+        });
+        return result.predictions;
+    }
+
+    /**
+     * Feature records -> binary request frame (header + row-major float64 matrix),
+     * with the same column transforms as ml/features.py build_feature_matrix
+     */
+    encodeFeatureFrame(records, includeConfidence) {
+        const nCols = FEATURE_COLUMNS.length;
+        const matrix = new Float64Array(records.length * nCols);
+
+        records.forEach((record, i) => {
+            matrix.set(this.featureVector(record), i * nCols);
+        });
+
+        const header = Buffer.alloc(WIRE_REQUEST_HEADER_SIZE);
+        header.write(WIRE_REQUEST_MAGIC, 0, 'latin1');
+        header.writeUInt32LE(includeConfidence ? WIRE_FLAG_CONFIDENCE : 0, 4);
+        header.writeUInt32LE(records.length, 8);
+        header.writeUInt32LE(nCols, 12);
+        WIRE_COLUMN_HASH.copy(header, 16);
+
+        // Float64Array is host-endian; every supported server platform is little-endian
+        return Buffer.concat([header, Buffer.from(matrix.buffer)]);
+    }
+
+    /**
+     * Model input vector of one feature record, in FEATURE_COLUMNS order
+     * (same transforms as ml/features.py build_feature_matrix)
+     */
+    featureVector(record) {
+        return FEATURE_COLUMNS.map(([, key, transform]) => {
+            const raw = record[key];
+            let value;
+            if (transform === 'flag') {
+                value = raw ? 1 : 0;
+            } else {
+                value = raw === null || raw === undefined ? 0 : Number(raw);
+                if (transform) value /= transform;
+            }
+            return Number.isNaN(value) ? 0 : value;
+        });
+    }
+
+    /**
+     * Binary response payload -> the same result objects as the JSON protocol
+     */
+    decodePredictions(payload, nRows, nOutputs) {
+        // Copy into a fresh (8-byte aligned) buffer before viewing it as float64
+        const aligned = Buffer.alloc(payload.length);
+        payload.copy(aligned);
+        const values = new Float64Array(aligned.buffer, aligned.byteOffset, nRows * nOutputs);
+
+        const predictions = new Array(nRows);
+        for (let i = 0; i < nRows; i++) {
+            const score = values[i];
+            if (nOutputs < 2) {
+                predictions[i] = { score };
+                continue;
+            }
+
+            // Same normalization as ml/confidence.py confidence_from_std
+            const stdDev = values[nRows + i];
+            predictions[i] = {
+                score,
+                confidence: 1 - Math.min(stdDev, 0.5) / 0.5,
+                std_dev: stdDev
+            };
+        }
+        return predictions;
+    }
+
+    /**
+     * Start (or reuse) the persistent `predict.py --binary` server.
+     * Responses come back in request order, so pending requests are a FIFO queue.
+     */
+    getBinaryPredictionServer() {
+        if (this.binaryServer) return this.binaryServer;
+
+        const child = spawn('python3', [path.join(this.mlDir, 'predict.py'), '--binary', ...this.predictorArgs()], {
+            stdio: ['pipe', 'pipe', 'inherit']
+        });
+
+        let buffered = Buffer.alloc(0);
+        child.stdout.on('data', (chunk) => {
+            buffered = buffered.length ? Buffer.concat([buffered, chunk]) : chunk;
+
+            while (buffered.length >= WIRE_RESPONSE_HEADER_SIZE) {
+                const nBytes = buffered.readUInt32LE(16);
+                const frameSize = WIRE_RESPONSE_HEADER_SIZE + nBytes;
+                if (buffered.length < frameSize) break;
+
+                const magic = buffered.toString('latin1', 0, 4);
+                const status = buffered.readUInt32LE(4);
+                const nRows = buffered.readUInt32LE(8);
+                const nOutputs = buffered.readUInt32LE(12);
+                const payload = buffered.subarray(WIRE_RESPONSE_HEADER_SIZE, frameSize);
+                buffered = buffered.subarray(frameSize);
+
+                if (magic !== WIRE_RESPONSE_MAGIC) {
+                    child.kill();
+                    shutdown(new Error('Malformed response from binary prediction server'));
+                    return;
+                }
+
+                const pending = this.binaryPending.shift();
+                if (!pending) continue;
+
+                if (status === 0) {
+                    pending.resolve(this.decodePredictions(payload, nRows, nOutputs));
+                } else {
+                    pending.reject(new Error(payload.toString('utf8')));
+                }
+            }
+        });
+
+        const shutdown = (err) => {
+            if (this.binaryServer !== child) return;
+            this.binaryServer = null;
+
+            // Fail everything still in flight; the next call starts a fresh server
+            const error = err || new Error('Prediction server exited');
+            this.binaryPending.forEach(pending => pending.reject(error));
+            this.binaryPending = [];
+        };
+
+        child.on('error', (err) => {
+            console.error('[ML Service] Binary prediction server failed:', err.message);
+            shutdown(err);
+        });
+        child.stdin.on('error', (err) => shutdown(err));
+        child.on('close', () => shutdown());
+
+        this.binaryServer = child;
+        return child;
+    }
+
+    /**
+     * Send one feature batch to the binary server and wait for its scores
+     */
+    sendToBinaryServer(records, includeConfidence) {
+        const child = this.getBinaryPredictionServer();
+        const frame = this.encodeFeatureFrame(records, includeConfidence);
+
+        return new Promise((resolve, reject) => {
+            this.binaryPending.push({ resolve, reject });
+            child.stdin.write(frame);
+        });
+    }
+
+    /**
+     * Health check for the prediction server
+     */
+    async pingPredictionServer() {
+        return this.sendToPredictionServer({ op: 'ping' });
+    }
+
+    /**
+     * Cumulative counters of the running prediction server (requests, rows,
+     * per-stage time, memory), or null when no server is running
+     */
+    async getPredictionStats() {
+        if (!USE_ML_SERVER || !this.predictionServer) return null;
+
+        try {
+            const response = await this.sendToPredictionServer({ op: 'stats' });
+            return response.stats;
         } catch (error) {
-            console.error('[ML Service] Prediction failed:', error);
-            throw error;
+            console.error('[ML Service] Prediction server stats failed:', error.message);
+            return null;
         }
     }
 
+    /**
+     * What the prediction server did between two getPredictionStats() snapshots
+     */
+    describeStatsDelta(before, after) {
+        if (!after) return null;
+
+        const stages = {};
+        for (const [name, entry] of Object.entries(after.stages)) {
+            const previous = (before && before.stages[name]) || { ms: 0, calls: 0, rows: 0 };
+            stages[name] = {
+                ms: entry.ms - previous.ms,
+                calls: entry.calls - previous.calls,
+                rows: entry.rows - previous.rows
+            };
+        }
+
+        const requests = after.requests - (before ? before.requests : 0);
+        const rows = after.rows - (before ? before.rows : 0);
+        const memory = after.peak_rss_mb ? `, peak RSS ${Math.round(after.peak_rss_mb)}MB` : '';
+        return `${requests} requests, ${rows} rows${memory} - ${this.formatStages(stages)}`;
+    }
+
+    /**
+     * Ask a running prediction server to reload the model (e.g. after training)
+     */
+    reloadPredictionServer() {
+        if (!this.predictionServer) return;
+
+        this.sendToPredictionServer({ op: 'reload' }).catch(err => {
+            console.error('[ML Service] Prediction server reload failed:', err.message);
+        });
+    }
+
+    /**
+     * Stop the prediction server
+     */
+    stopPredictionServer() {
+        if (this.binaryServer) this.binaryServer.stdin.end();
+        if (!this.predictionServer) return;
+
+        const pyshell = this.predictionServer;
+        pyshell.end(() => {});
+    }
+
     /**
      * Predict single match score
+     * Concurrent calls are coalesced into one batch (see predictionCoalescer.js)
      */
     async predictSingle(student, internship, includeConfidence = false) {
+        if (ML_SINGLE_PAIR_MODEL === 'distilled') {
+            if (!this.isModelTrained) {
+                throw new Error('ML model not trained. Please train the model first.');
+            }
+            await this.ensureHistory();
+            return this.scoreDistilled(this.extractFeatures(student, internship), includeConfidence);
+        }
+
+        if (ML_COALESCE) {
+            if (!this.isModelTrained) {
+                throw new Error('ML model not trained. Please train the model first.');
+            }
+            await this.ensureHistory();
+            // Scored together with the other pairs requested at the same moment
+            return this.coalescer.submit(this.extractFeatures(student, internship), includeConfidence);
+        }
+
         const predictions = await this.predict([{ student, internship }], includeConfidence);
         return predictions[0];
     }
 
+    /**
+     * Distilled scorer tables (ml/models/distilled.json), re-read when training replaces the file
+     */
+    loadDistilledModel() {
+        const file = path.join(this.mlDir, 'models', 'distilled.json');
+        let stat;
+        try {
+            stat = fs.statSync(file);
+        } catch (error) {
+            throw new Error('Distilled model not found. Retrain the model to create it.');
+        }
+
+        if (!this.distilled || this.distilled.mtimeMs !== stat.mtimeMs) {
+            const model = JSON.parse(fs.readFileSync(file, 'utf8'));
+            const columns = FEATURE_COLUMNS.map(([name]) => name).join(',');
+            if (model.feature_names.join(',') !== columns) {
+                throw new Error('Distilled model feature columns do not match FEATURE_COLUMNS');
+            }
+
+            // Offset of each feature's bins within the flat tables
+            const offsets = [];
+            let offset = 0;
+            for (const edges of model.edges) {
+                offsets.push(offset);
+                offset += edges.length + 1;
+            }
+            this.distilled = { ...model, offsets, mtimeMs: stat.mtimeMs };
+        }
+        return this.distilled;
+    }
+
+    /**
+     * Score one feature record with the distilled scorer (same arithmetic as
+     * DistilledScorer.predict_mean_std in ml/distill.py)
+     */
+    scoreDistilled(record, includeConfidence = false) {
+        const model = this.loadDistilledModel();
+        const x = this.featureVector(record);
+
+        let scoreSum = 0;
+        let stdSum = 0;
+        x.forEach((value, f) => {
+            // Bin = number of edges <= value (searchsorted side='right')
+            const edges = model.edges[f];
+            let lo = 0;
+            let hi = edges.length;
+            while (lo < hi) {
+                const mid = (lo + hi) >> 1;
+                if (edges[mid] <= value) lo = mid + 1;
+                else hi = mid;
+            }
+            scoreSum += model.score_table[model.offsets[f] + lo];
+            stdSum += model.std_table[model.offsets[f] + lo];
+        });
+
+        const score = Math.min(Math.max(model.score_intercept + scoreSum, 0), 1);
+        if (!includeConfidence) {
+            return { score };
+        }
+
+        const stdDev = Math.max(model.std_intercept + stdSum, 0);
+        return {
+            score,
+            confidence: 1 - Math.min(stdDev, 0.5) / 0.5,
+            std_dev: stdDev
+        };
+    }
+
     /**
      * Get model status and info
      */
     getStatus() {
         return {
             isModelTrained: this.isModelTrained,
-            modelPath: path.join(this.mlDir, 'models')
+            modelPath: path.join(this.mlDir, 'models'),
+            predictionServer: USE_ML_SERVER
+                ? ((this.predictionServer || this.binaryServer) ? 'RUNNING' : 'STOPPED')
+                : 'DISABLED',
+            wireProtocol: ML_WIRE_PROTOCOL,
+            singlePairModel: ML_SINGLE_PAIR_MODEL,
+            singlePairBatching: ML_COALESCE ? this.coalescer.stats() : 'DISABLED'
         };
     }
 }
@@ -0,0 +1,202 @@
+/**
+ * Micro-batching front for single-pair predictions
+ *
+ * Concurrent predictSingle calls are queued and scored together: the queue is
+ * flushed as one batch when it reaches maxBatchSize, or maxWaitMs after its
+ * first request arrived. While maxInFlight batches are being scored, new
+ * requests keep accumulating, so batches grow with load instead of the queue.
+ * Each caller gets back its own row of the batch result.
+ */
+
+// Upper bounds (ms) of the latency histogram buckets
+const LATENCY_BOUNDS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000];
+
+/**
+ * Powers of two up to (and including) the first one >= max
+ */
+function powerOfTwoBounds(max) {
+    const bounds = [1];
+    while (bounds[bounds.length - 1] < max) bounds.push(bounds[bounds.length - 1] * 2);
+    return bounds;
+}
+
+/**
+ * Counts of observed values per bucket (value <= bound), plus an overflow bucket
+ */
+class Histogram {
+    constructor(bounds) {
+        this.bounds = bounds;
+        this.counts = new Array(bounds.length + 1).fill(0);
+        this.count = 0;
+        this.sum = 0;
+        this.max = 0;
+    }
+
+    record(value) {
+        let bucket = this.bounds.findIndex(bound => value <= bound);
+        if (bucket === -1) bucket = this.bounds.length;
+        this.counts[bucket]++;
+        this.count++;
+        this.sum += value;
+        this.max = Math.max(this.max, value);
+    }
+
+    /**
+     * Upper bound of the bucket holding the given quantile (0-1), or max for the overflow bucket
+     */
+    quantile(q) {
+        const rank = Math.ceil(q * this.count);
+        let seen = 0;
+        for (let bucket = 0; bucket < this.counts.length; bucket++) {
+            seen += this.counts[bucket];
+            if (seen >= rank && seen > 0) {
+                return bucket < this.bounds.length ? this.bounds[bucket] : this.max;
+            }
+        }
+        return 0;
+    }
+
+    snapshot() {
+        return {
+            buckets: this.counts.map((count, bucket) => ({
+                le: bucket < this.bounds.length ? this.bounds[bucket] : '+Inf',
+                count
+            })),
+            count: this.count,
+            mean: this.count ? this.sum / this.count : 0,
+            p50: this.quantile(0.5),
+            p99: this.quantile(0.99),
+            max: this.max
+        };
+    }
+}
+
+class PredictionCoalescer {
+    /**
+     * @param {Function} scoreBatch - (records, includeConfidence) => Promise of one prediction per record
+     * @param {Object} options - { maxBatchSize, maxWaitMs, maxInFlight }
+     */
+    constructor(scoreBatch, options = {}) {
+        this.scoreBatch = scoreBatch;
+        this.maxBatchSize = Math.max(1, options.maxBatchSize || 256);
+        this.maxWaitMs = Math.max(0, options.maxWaitMs ?? 2);
+        this.maxInFlight = Math.max(1, options.maxInFlight || 2);
+
+        this.queue = [];
+        this.timer = null;
+        this.inFlightBatches = 0;
+        this.inFlightRequests = 0;
+
+        this.requests = 0;
+        this.batches = 0;
+        this.errors = 0;
+        this.flushes = { full: 0, timer: 0, drain: 0 };
+        this.batchSizes = new Histogram(powerOfTwoBounds(this.maxBatchSize));
+        this.queueDepths = new Histogram(powerOfTwoBounds(this.maxBatchSize * this.maxInFlight * 4));
+        this.latencies = new Histogram(LATENCY_BOUNDS_MS);
+    }
+
+    /**
+     * Queue one feature record; resolves with its prediction ({score} or
+     * {score, confidence, std_dev} when includeConfidence is set)
+     */
+    submit(record, includeConfidence = false) {
+        return new Promise((resolve, reject) => {
+            // Requests already waiting or being scored when this one arrives
+            this.queueDepths.record(this.queue.length + this.inFlightRequests);
+            this.queue.push({ record, includeConfidence, resolve, reject, queuedAt: Date.now() });
+            this.requests++;
+
+            if (this.queue.length >= this.maxBatchSize) {
+                this.flush('full');
+            } else if (!this.timer) {
+                this.timer = setTimeout(() => this.flush('timer'), this.maxWaitMs);
+            }
+        });
+    }
+
+    /**
+     * Send up to maxBatchSize queued requests as one batch (deferred until a
+     * batch completes when maxInFlight batches are already running)
+     */
+    flush(reason) {
+        if (this.timer) {
+            clearTimeout(this.timer);
+            this.timer = null;
+        }
+        if (this.queue.length === 0 || this.inFlightBatches >= this.maxInFlight) return;
+
+        const batch = this.queue.splice(0, this.maxBatchSize);
+        this.flushes[reason]++;
+        this.batches++;
+        this.batchSizes.record(batch.length);
+        this.inFlightBatches++;
+        this.inFlightRequests += batch.length;
+
+        // A batch needs confidence if any of its callers asked for it; the others get the score only
+        const includeConfidence = batch.some(request => request.includeConfidence);
+
+        Promise.resolve()
+            .then(() => this.scoreBatch(batch.map(request => request.record), includeConfidence))
+            .then((predictions) => {
+                if (!predictions || predictions.length !== batch.length) {
+                    throw new Error(`Expected ${batch.length} predictions, got ${predictions ? predictions.length : 0}`);
+                }
+                const now = Date.now();
+                batch.forEach((request, i) => {
+                    this.latencies.record(now - request.queuedAt);
+                    request.resolve(request.includeConfidence ? predictions[i] : { score: predictions[i].score });
+                });
+            })
+            .catch((error) => {
+                this.errors++;
+                batch.forEach(request => request.reject(error));
+            })
+            .finally(() => {
+                this.inFlightBatches--;
+                this.inFlightRequests -= batch.length;
+                this.schedule();
+            });
+
+        this.schedule();
+    }
+
+    /**
+     * What the remaining queue needs: a full batch goes now, requests left over
+     * after a completed batch have waited already, anything else gets a timer
+     */
+    schedule() {
+        if (this.queue.length === 0 || this.inFlightBatches >= this.maxInFlight) return;
+
+        if (this.queue.length >= this.maxBatchSize) {
+            this.flush('full');
+        } else if (Date.now() - this.queue[0].queuedAt >= this.maxWaitMs) {
+            this.flush('drain');
+        } else if (!this.timer) {
+            const remaining = this.maxWaitMs - (Date.now() - this.queue[0].queuedAt);
+            this.timer = setTimeout(() => this.flush('timer'), remaining);
+        }
+    }
+
+    /**
+     * Counters and histograms (batch size, queue depth seen on arrival, latency in ms)
+     */
+    stats() {
+        return {
+            maxBatchSize: this.maxBatchSize,
+            maxWaitMs: this.maxWaitMs,
+            maxInFlight: this.maxInFlight,
+            requests: this.requests,
+            batches: this.batches,
+            errors: this.errors,
+            flushes: { ...this.flushes },
+            queueDepth: this.queue.length,
+            inFlight: this.inFlightRequests,
+            batchSize: this.batchSizes.snapshot(),
+            queueDepthOnArrival: this.queueDepths.snapshot(),
+            latencyMs: this.latencies.snapshot()
+        };
+    }
+}
+
+module.exports = PredictionCoalescer;
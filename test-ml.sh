@@ -111,6 +111,23 @@ else
 fi
 echo ""
 
+# Test 8: Incremental updates past the tree cap keep distinct tree seeds
+echo "8️⃣ Testing incremental updates past the tree cap..."
+INC_DIR=$(mktemp -d)
+python3 ml/generate_sample_data.py | python3 ml/train_model.py --model-dir "$INC_DIR" --no-distill > /dev/null 2>&1
+for i in $(seq 1 12); do
+    python3 ml/generate_sample_data.py | python3 ml/train_model.py --incremental --max-trees 120 \
+        --model-dir "$INC_DIR" --no-distill > /dev/null 2>&1
+done
+SEEDS=$(python3 -c "import joblib; m = joblib.load('$INC_DIR/matching_model.pkl'); seeds = [t.random_state for t in m.estimators_]; print(f'{len(set(seeds))}/{len(seeds)}')" 2>/dev/null)
+if [ "$SEEDS" = "120/120" ]; then
+    echo "   ✅ Every tree has its own seed ($SEEDS distinct)"
+else
+    echo "   ❌ Trees share seeds after the cap (${SEEDS:-no model} distinct)"
+fi
+rm -rf "$INC_DIR"
+echo ""
+
 # Summary
 echo "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
 echo "📊 Test Summary"